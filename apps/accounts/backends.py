@@ -0,0 +1,22 @@
+from django.contrib.auth.backends import ModelBackend
+
+from allauth.account.auth_backends import AuthenticationBackend
+
+from accounts import caching
+
+
+class CachedUserMixin(object):
+    """
+    Load the logged in user from the cache, see accounts.caching
+    """
+
+    def get_user(self, user_id):
+        return caching.get_user(user_id)
+
+
+class CachedModelBackend(CachedUserMixin, ModelBackend):
+    pass
+
+
+class CachedAuthenticationBackend(CachedUserMixin, AuthenticationBackend):
+    pass
@@ -0,0 +1,71 @@
+"""
+Cached lookups of users for authentication.
+
+Users (for sessions, see accounts.backends) and auth tokens (for the API)
+are cached with the user's timezone loaded, for USER_CACHE_TIMEOUT
+seconds. Entries are dropped when the user is saved or the token deleted,
+see the receivers in accounts.models. The cache has to be shared by all
+processes (see CACHES), or other processes keep using dropped entries.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+USER_KEY = 'auth:user:%s'
+TOKEN_KEY = 'auth:token:%s'
+USER_TOKEN_KEY = 'auth:user-token:%s'
+
+
+def cache_timeout():
+    return getattr(settings, 'USER_CACHE_TIMEOUT', 300)
+
+
+def get_user(user_id):
+    """
+    The user with its timezone loaded, None if there isn't one
+    """
+    from accounts.models import LocalUser
+
+    user = cache.get(USER_KEY % user_id)
+    if user is None:
+        try:
+            user = LocalUser.objects.select_related('timezone').get(
+                pk=user_id
+            )
+        except LocalUser.DoesNotExist:
+            return None
+        cache.set(USER_KEY % user_id, user, cache_timeout())
+    return user
+
+
+def get_token(key):
+    """
+    The Token for a key with its user and timezone loaded, None if there
+    isn't one
+    """
+    from rest_framework.authtoken.models import Token
+
+    token = cache.get(TOKEN_KEY % key)
+    if token is None:
+        try:
+            token = Token.objects.select_related(
+                'user__timezone'
+            ).get(key=key)
+        except Token.DoesNotExist:
+            return None
+        cache.set_many({
+            TOKEN_KEY % key: token,
+            USER_TOKEN_KEY % token.user_id: key,
+        }, cache_timeout())
+    return token
+
+
+def forget_token(key):
+    cache.delete(TOKEN_KEY % key)
+
+
+def forget_user(user_id):
+    keys = [USER_KEY % user_id]
+    key = cache.get(USER_TOKEN_KEY % user_id)
+    if key is not None:
+        keys.extend([TOKEN_KEY % key, USER_TOKEN_KEY % user_id])
+    cache.delete_many(keys)
@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.checks import Error, register
+
+# Cache backends that only live inside one process
+LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register()
+def shared_cache_check(app_configs, **kwargs):
+    """
+    Sessions, users and auth tokens are cached (see accounts.caching). That
+    is only safe when every process shares the cache, otherwise a process
+    that didn't see a change keeps serving the old user.
+    """
+    if settings.DEBUG:
+        return []
+    backend = settings.CACHES['default']['BACKEND']
+    if backend in LOCAL_CACHES:
+        return [Error(
+            'The default cache %s is local to each process.' % backend,
+            hint='Set CACHE_URL to a cache all processes share, '
+                 'e.g. memcache://127.0.0.1:11211',
+            id='accounts.E001',
+        )]
+    return []
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9 on 2026-10-19 06:48
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.utils.crypto import get_random_string
+
+
+def create_calendar_tokens(apps, schema_editor):
+    LocalUser = apps.get_model('accounts', 'LocalUser')
+    for pk in LocalUser.objects.filter(
+            calendar_token=None).values_list('id', flat=True).iterator():
+        LocalUser.objects.filter(pk=pk).update(
+            calendar_token=get_random_string(32)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='localuser',
+            name='calendar_token',
+            field=models.CharField(blank=True, max_length=40, null=True, unique=True),
+        ),
+        migrations.RunPython(
+            create_calendar_tokens, migrations.RunPython.noop
+        ),
+    ]
@@ -1,10 +1,12 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
-from django.db.models.signals import post_save
+from django.utils.crypto import get_random_string
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
 from rest_framework.authtoken.models import Token
 
+from accounts import caching
 from base.models import TimeStampedModel
 from timezones.models import Timezone
 
@@ -13,13 +15,33 @@ class LocalUser(AbstractUser, TimeStampedModel):
     timezone = models.ForeignKey(Timezone, null=True)
     is_new = models.BooleanField(default=True)
     show_welcome_message = models.BooleanField(default=True)
+    # Secret for the user's calendar feed, see reminders.feed
+    calendar_token = models.CharField(
+        max_length=40, unique=True, null=True, blank=True
+    )
 
     def __unicode__(self):
         return self.username
 
+    def save(self, *args, **kwargs):
+        if self.calendar_token is None:
+            self.calendar_token = get_random_string(32)
+        super(LocalUser, self).save(*args, **kwargs)
+
 
 # Create an auth token on initial save
 @receiver(post_save, sender=LocalUser)
 def create_auth_token(sender, instance=None, created=False, **kwargs):
     if created:
         Token.objects.create(user=instance)
+
+
+# Drop cached authentication lookups when they change
+@receiver(post_save, sender=LocalUser)
+def forget_cached_user(sender, instance=None, **kwargs):
+    caching.forget_user(instance.pk)
+
+
+@receiver(post_delete, sender=Token)
+def forget_cached_token(sender, instance=None, **kwargs):
+    caching.forget_token(instance.key)
@@ -7,6 +7,9 @@ from django.test import TestCase, Client
 from django.core.urlresolvers import reverse
 from django.test.client import RequestFactory
 from django.core import mail
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.http import HttpResponseRedirect
 
 from allauth.account.models import EmailAddress, EmailConfirmation
@@ -17,6 +20,7 @@ from allauth.socialaccount.views import SignupView
 from allauth.socialaccount.models import SocialAccount, SocialLogin
 from allauth.socialaccount.helpers import complete_social_login
 
+from accounts.checks import shared_cache_check
 from accounts.models import LocalUser
 from timezones.models import Timezone
 
@@ -46,6 +50,72 @@ class BaseTest(TestCase):
         self.client.logout()
 
 
+class CachedUserTest(BaseTest):
+    """
+    Test logged in users and their sessions are loaded from the cache
+    """
+
+    def setUp(self):
+        super(CachedUserTest, self).setUp()
+        cache.clear()
+        self.user_login()
+
+    def auth_queries(self):
+        """
+        Queries for the session, user and timezone made by a request
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('upcoming'))
+        self.assertEqual(response.status_code, 200)
+        tables = ('django_session', LocalUser._meta.db_table,
+                  Timezone._meta.db_table)
+        return [q['sql'] for q in queries
+                if any('"%s"' % t in q['sql'].split('WHERE')[0]
+                       for t in tables)]
+
+    def test_warm_cache_makes_no_auth_queries(self):
+        self.assertNotEqual(self.auth_queries(), [])
+        self.assertEqual(self.auth_queries(), [])
+
+    def test_user_save_invalidates(self):
+        self.auth_queries()
+        self.user.timezone = Timezone.objects.get(name='Europe/Paris')
+        self.user.save()
+        self.assertNotEqual(self.auth_queries(), [])
+        response = self.client.get(reverse('upcoming'))
+        self.assertEqual(
+            response.wsgi_request.user.timezone.name, 'Europe/Paris'
+        )
+
+
+class SharedCacheCheckTest(TestCase):
+    """
+    Test deployments can't cache users in a cache local to each process
+    """
+
+    def caches(self, backend):
+        return {'default': {'BACKEND': backend}}
+
+    def test_local_cache(self):
+        with self.settings(
+                DEBUG=False,
+                CACHES=self.caches(
+                    'django.core.cache.backends.locmem.LocMemCache')):
+            errors = shared_cache_check(None)
+        self.assertEqual([e.id for e in errors], ['accounts.E001'])
+
+    def test_shared_cache(self):
+        with self.settings(
+                DEBUG=False,
+                CACHES=self.caches(
+                    'django.core.cache.backends.db.DatabaseCache')):
+            self.assertEqual(shared_cache_check(None), [])
+
+    def test_debug(self):
+        with self.settings(DEBUG=True):
+            self.assertEqual(shared_cache_check(None), [])
+
+
 class SignUpTest(BaseTest):
     fixtures = ['socialapp.json', 'timezones.json']
 
@@ -0,0 +1,25 @@
+from django.utils.translation import ugettext_lazy as _
+
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+from accounts import caching
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Token authentication that looks tokens up in the cache before the
+    database, see accounts.caching
+    """
+
+    def authenticate_credentials(self, key):
+        token = caching.get_token(key)
+        if token is None:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.')
+            )
+
+        return (token.user, token)
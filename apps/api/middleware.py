@@ -0,0 +1,72 @@
+import re
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_sequence, compress_string
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+re_accepts_gzip = re.compile(r'\bgzip\b')
+re_accepts_brotli = re.compile(r'\bbr\b')
+
+
+class CompressionMiddleware(object):
+    """
+    Compress API responses of API_COMPRESS_MIN_SIZE bytes or more, with
+    brotli when it is installed and the client accepts it, otherwise gzip.
+
+    Only responses under API_COMPRESS_PREFIX are compressed, pages carrying
+    CSRF tokens are left alone (see BREACH).
+    """
+
+    def encoding(self, accept):
+        if brotli is not None and re_accepts_brotli.search(accept):
+            return 'br'
+        if re_accepts_gzip.search(accept):
+            return 'gzip'
+        return None
+
+    def compress(self, content, encoding):
+        if encoding == 'br':
+            return brotli.compress(
+                content, quality=settings.API_COMPRESS_BROTLI_QUALITY
+            )
+        return compress_string(content)
+
+    def process_response(self, request, response):
+        if not request.path.startswith(settings.API_COMPRESS_PREFIX):
+            return response
+        if response.has_header('Content-Encoding'):
+            return response
+        if not response.streaming and \
+                len(response.content) < settings.API_COMPRESS_MIN_SIZE:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        accept = request.META.get('HTTP_ACCEPT_ENCODING', '')
+
+        if response.streaming:
+            # Streams are gzipped as they go out, their size isn't known
+            if not re_accepts_gzip.search(accept):
+                return response
+            encoding = 'gzip'
+            response.streaming_content = compress_sequence(
+                response.streaming_content
+            )
+        else:
+            encoding = self.encoding(accept)
+            if encoding is None:
+                return response
+            compressed = self.compress(response.content, encoding)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(response.content))
+
+        if response.has_header('ETag'):
+            response['ETag'] = re.sub(r'^"', 'W/"', response['ETag'])
+        response['Content-Encoding'] = encoding
+        return response
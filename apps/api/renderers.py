@@ -0,0 +1,40 @@
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+else:
+    # Older ujson quietly writes datetimes as timestamps instead of failing
+    if int(ujson.__version__.split('.')[0]) < 2:
+        ujson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    Renders JSON with ujson when it is installed, falling back to
+    JSONRenderer for data ujson can't encode (e.g. datetimes, lazy strings)
+    and for pretty printed output
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if ujson is None or data is None or self.get_indent(
+                accepted_media_type, renderer_context or {}) is not None:
+            return super(FastJSONRenderer, self).render(
+                data, accepted_media_type, renderer_context
+            )
+        try:
+            ret = ujson.dumps(
+                data, ensure_ascii=self.ensure_ascii,
+                escape_forward_slashes=False
+            )
+        except (TypeError, OverflowError):
+            return super(FastJSONRenderer, self).render(
+                data, accepted_media_type, renderer_context
+            )
+        if isinstance(ret, unicode):
+            ret = ret.encode('utf-8')
+        # Keep the output a strict javascript subset like JSONRenderer does
+        return ret.replace('\xe2\x80\xa8', '\\u2028').replace(
+            '\xe2\x80\xa9', '\\u2029'
+        )
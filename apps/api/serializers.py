@@ -4,6 +4,7 @@ import pytz
 
 from django.utils import timezone
 from django.conf import settings
+from django.core.urlresolvers import reverse
 
 from rest_framework import serializers
 from rest_framework import fields
@@ -12,6 +13,7 @@ from rest_framework.authtoken.models import Token
 from utils.date_parser import match_date
 from utils.time_parser import match_time
 from utils.delta_parser import match_delta
+from utils.reminder_parser import parse_reminder
 
 from reminders.models import Reminder
 from accounts.models import LocalUser
@@ -21,7 +23,7 @@ from timezones.models import Timezone
 class ReminderSerializer(serializers.ModelSerializer):
     user = fields.ReadOnlyField(source='user.id')
     url = fields.CharField(source='get_full_url')
-    localised_start = fields.SerializerMethodField()
+    localised_start = fields.DateTimeField(read_only=True)
 
     class Meta:
         model = Reminder
@@ -34,8 +36,50 @@ class ReminderSerializer(serializers.ModelSerializer):
             'last_update', 'localised_start', 'deleted'
         )
 
-    def get_localised_start(self, obj):
-        return obj.localised_start()
+
+class DynamicFieldsMixin(object):
+    """
+    Takes a `fields` argument naming the only fields to serialize
+    """
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super(DynamicFieldsMixin, self).__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class ReminderListSerializer(DynamicFieldsMixin, ReminderSerializer):
+    """
+    A ReminderSerializer limited to the fields the client asks for, see
+    api.views.requested_fields
+    """
+    COMPACT_FIELDS = ('id', 'content', 'status', 'full_start_datetime')
+
+    # Columns the computed fields are worked out from
+    COMPUTED_COLUMNS = {
+        'url': (),
+        'localised_start': ('full_start_datetime',),
+        'short_content': ('content',),
+        'user': ('user',),
+    }
+
+    @classmethod
+    def columns(cls, fields):
+        """
+        The model fields to load from the database for `fields`
+        """
+        model_fields = set(
+            f.name for f in Reminder._meta.concrete_fields
+        )
+        columns = set(['id'])
+        for name in fields:
+            if name in cls.COMPUTED_COLUMNS:
+                columns.update(cls.COMPUTED_COLUMNS[name])
+            elif name in model_fields:
+                columns.add(name)
+        return sorted(columns)
 
 
 class ErrorHandler(object):
@@ -66,39 +110,14 @@ class QuickReminderSerializer(serializers.ModelSerializer, ErrorHandler):
             err = 'Please enter something we can remind you about'
             raise serializers.ValidationError(detail={'content': err})
 
-        # Try to work out a reminder time
-        time_match = match_time(attrs['content'])
-        if time_match is None:
-            err = 'Please enter a reminder time'
-            raise serializers.ValidationError(detail={'content': err})
-
-        remind_at = time_match[0]
-        attrs['content'] = time_match[1]
-
-        # Try to find a reminder date (fall back to today if none found)
-        date_match = match_date(attrs['content'])
-        if date_match is None:
-            # if the time is > now set the date to today
-            date_match = [datetime.now(usertz).date(), attrs['content']]
-
-        remind_on = date_match[0]
-        attrs['content'] = date_match[1]
-
-        ro = remind_on
-        ra = remind_at.split(':')
-
-        dstr = '%s/%s/%s %s:%s:00' % (ro.day, ro.month, ro.year, ra[0], ra[1])
-        dt = datetime.strptime(dstr, '%d/%m/%Y %H:%M:%S')
+        try:
+            start, attrs['content'] = parse_reminder(attrs['content'], usertz)
+        except ValueError as e:
+            raise serializers.ValidationError(detail={'content': str(e)})
 
-        dt = usertz.localize(dt)
-
-        if dt > datetime.now(usertz):
-            # Save the dates as UTC
-            attrs['start_date'] = dt.astimezone(pytz.timezone('UTC')).date()
-            attrs['start_time'] = dt.astimezone(pytz.timezone('UTC')).time()
-        else:
-            err = 'Please pick a date in the future'
-            raise serializers.ValidationError(detail={'content': err})
+        # Save the dates as UTC
+        attrs['start_date'] = start.date()
+        attrs['start_time'] = start.time()
 
         return attrs
 
@@ -211,7 +230,7 @@ class UserRegisterSerializer(serializers.ModelSerializer, ErrorHandler):
 
     class Meta:
         model = LocalUser
-        fields = ('reminders', 'email', 'timezone', 'timezone_name',
+        fields = ('email', 'timezone', 'timezone_name',
                   'confirm_password', 'password')
 
     def __init__(self, *args, **kwargs):
@@ -259,16 +278,41 @@ class UserRegisterSerializer(serializers.ModelSerializer, ErrorHandler):
 
 
 class UserSerializer(serializers.ModelSerializer, ErrorHandler):
-    reminders = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
+    reminder_counts = serializers.SerializerMethodField()
+    reminders_url = serializers.SerializerMethodField()
+    calendar_url = serializers.SerializerMethodField()
     token = serializers.SerializerMethodField('get_auth_token')
 
     class Meta:
         model = LocalUser
-        fields = ('id', 'reminders', 'email', 'timezone',
-                  'created', 'token')
+        fields = ('id', 'email', 'timezone', 'created', 'token',
+                  'reminder_counts', 'reminders_url', 'calendar_url')
+
+    def get_reminder_counts(self, obj):
+        return Reminder.objects.status_counts(obj)
+
+    def get_reminders_url(self, obj):
+        url = '%s?page=1' % reverse('reminder_list')
+        request = self.context.get('request')
+        if request is not None:
+            return request.build_absolute_uri(url)
+        return url
+
+    def get_calendar_url(self, obj):
+        url = reverse('calendar_feed', args=(obj.calendar_token,))
+        request = self.context.get('request')
+        if request is not None:
+            return request.build_absolute_uri(url)
+        return url
 
     def get_auth_token(self, obj):
-        try: return Token.objects.get(user=obj).key
+        # Token authenticated requests already have the token loaded
+        request = self.context.get('request')
+        token = getattr(request, 'auth', None)
+        if isinstance(token, Token) and token.user_id == obj.id:
+            return token.key
+        try:
+            return obj.auth_token.key
         except Token.DoesNotExist:
             return None
 
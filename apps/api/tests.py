@@ -1,17 +1,31 @@
 from datetime import datetime, timedelta
+import gzip
 import json
+import time
 import urllib
+from StringIO import StringIO
+from unittest import skipIf
 
+from django.conf import settings
 from django.test import TestCase, Client
 from django.core.urlresolvers import reverse
 from django.core import mail
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
 
 from freezegun import freeze_time
+import pytz
+
 from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
 
 from accounts.models import LocalUser
-from reminders.models import Reminder
+from reminders.models import Reminder, ReminderHistory
 from timezones.models import Timezone
+from api import middleware
+from api.renderers import FastJSONRenderer
+from api.serializers import ReminderSerializer
 
 
 FROZEN_TIME = '2014-01-05 07:43:22'
@@ -3123,6 +3137,16 @@ class ReminderEditTest(BaseTest):
         self.assertEqual(form['content'], content['content'])
         self.assertEqual(rcount, Reminder.objects.all().count())
 
+    @freeze_time(FROZEN_TIME)
+    def test_edit_content_history(self):
+        form = self.get_form()
+        form['content'] = 'updated content'
+        self._make_request(form)
+        entry = ReminderHistory.objects.get(
+            reminder=self.reminder, description='Reminder content updated'
+        )
+        self.assertEqual(entry.content, 'updated content')
+
     @freeze_time(FROZEN_TIME)
     def test_edit_deleted(self):
         self.reminder.delete()
@@ -3286,6 +3310,368 @@ class UserDetailTest(BaseTest):
         self.assertEqual(content['email'], self.user.username)
         self.assertEqual(content['id'], self.user.id)
         self.assertEqual(content['email'], self.user.email)
+        self.assertEqual(
+            content['token'], Token.objects.get(user=self.user).key
+        )
+        self.assertNotIn('reminders', content)
+
+    @freeze_time(FROZEN_TIME)
+    def test_user_reminder_counts(self):
+        self.create_reminder(self.tomorrow, self.now.time())
+        self.create_reminder(self.tomorrow, self.now.time()).pause()
+        self.create_reminder(self.tomorrow, self.now.time()).soft_delete()
+        status_code, content = self.get(reverse('user'))
+        self.assertEqual(content['reminder_counts']['total'], 2)
+        self.assertEqual(content['reminder_counts']['live'], 1)
+        self.assertEqual(content['reminder_counts']['paused'], 1)
+        self.assertEqual(content['reminder_counts']['overdue'], 0)
+        self.assertTrue(content['reminders_url'].endswith(
+            reverse('reminder_list') + '?page=1'
+        ))
+
+    @freeze_time(FROZEN_TIME)
+    def test_user_calendar_url(self):
+        status_code, content = self.get(reverse('user'))
+        self.assertTrue(content['calendar_url'].endswith(reverse(
+            'calendar_feed', args=(self.user.calendar_token,)
+        )))
+
+    @freeze_time(FROZEN_TIME)
+    def test_user_queries_independent_of_reminders(self):
+        self.create_reminder(self.tomorrow, self.now.time())
+        # Warm the session and user caches so both requests compare alike
+        self.get(reverse('user'))
+        with CaptureQueriesContext(connection) as few:
+            self.get(reverse('user'))
+        for i in range(20):
+            self.create_reminder(self.tomorrow, self.now.time())
+        with CaptureQueriesContext(connection) as many:
+            status_code, content = self.get(reverse('user'))
+        self.assertEqual(len(few), len(many))
+        self.assertEqual(content['reminder_counts']['total'], 21)
+
+    @freeze_time(FROZEN_TIME)
+    def test_reminder_list_paged(self):
+        for i in range(3):
+            self.create_reminder(self.tomorrow, self.now.time())
+        status_code, content = self.get(
+            reverse('reminder_list'), {'page': 1, 'page_size': 2}
+        )
+        self.assertEqual(status_code, 200)
+        self.assertEqual(content['count'], 3)
+        self.assertEqual(len(content['results']), 2)
+        self.assertIsNotNone(content['next'])
+
+
+class ReminderFieldsTest(BaseTest):
+    """
+    Test clients can ask for only some of a reminder's fields
+    """
+
+    @freeze_time(FROZEN_TIME)
+    def setUp(self):
+        super(ReminderFieldsTest, self).setUp()
+        self.reminder = self.create_reminder(self.tomorrow, self.now.time())
+
+    def reminder_selects(self, queries):
+        return [
+            q['sql'] for q in queries
+            if q['sql'].startswith('SELECT') and
+            'FROM "remindmelatr_reminder"' in q['sql']
+        ]
+
+    @freeze_time(FROZEN_TIME)
+    def test_fields(self):
+        with CaptureQueriesContext(connection) as queries:
+            status_code, content = self.get(
+                reverse('reminder_list'), {'fields': 'id,localised_start'}
+            )
+        self.assertEqual(status_code, 200)
+        self.assertEqual(sorted(content[0]), ['id', 'localised_start'])
+        self.assertEqual(
+            content[0]['localised_start'], '2014-01-06T07:43:22Z'
+        )
+        select = self.reminder_selects(queries)[0]
+        self.assertIn('"full_start_datetime"', select)
+        self.assertNotIn('"content"', select)
+
+    @freeze_time(FROZEN_TIME)
+    def test_unknown_fields_ignored(self):
+        status_code, content = self.get(
+            reverse('reminder_list'), {'fields': 'id,nope'}
+        )
+        self.assertEqual(content, [{'id': self.reminder.id}])
+
+    @freeze_time(FROZEN_TIME)
+    def test_compact(self):
+        status_code, content = self.get(
+            reverse('reminder_list'), {'compact': 1, 'page': 1}
+        )
+        self.assertEqual(
+            sorted(content['results'][0]),
+            ['content', 'full_start_datetime', 'id', 'status']
+        )
+
+    @freeze_time(FROZEN_TIME)
+    def test_all_fields_by_default(self):
+        status_code, content = self.get(reverse('reminder_list'))
+        self.assertEqual(
+            sorted(content[0]), sorted(ReminderSerializer.Meta.fields)
+        )
+
+    @freeze_time(FROZEN_TIME)
+    def test_queries_independent_of_reminders(self):
+        # Warm the session and user caches so both requests compare alike
+        self.get(reverse('reminder_list'))
+        with CaptureQueriesContext(connection) as few:
+            self.get(reverse('reminder_list'))
+        for i in range(5):
+            self.create_reminder(self.tomorrow, self.now.time())
+        with CaptureQueriesContext(connection) as many:
+            status_code, content = self.get(reverse('reminder_list'))
+        self.assertEqual(len(content), 6)
+        self.assertEqual(len(few), len(many))
+
+    @freeze_time(FROZEN_TIME)
+    def test_detail_fields(self):
+        status_code, content = self.get(
+            reverse('reminder_detail', args=(self.reminder.id,)),
+            {'fields': 'id,url'}
+        )
+        self.assertEqual(sorted(content), ['id', 'url'])
+
+
+class CompressionTest(BaseTest):
+    """
+    Test large API responses are compressed for clients that accept it
+    """
+
+    @freeze_time(FROZEN_TIME)
+    def setUp(self):
+        super(CompressionTest, self).setUp()
+        for i in range(5):
+            self.create_reminder(self.tomorrow, self.now.time())
+        self.url = reverse('reminder_list')
+
+    @freeze_time(FROZEN_TIME)
+    def test_gzip(self):
+        plain = self.client.get(self.url)
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(
+            int(response['Content-Length']), len(response.content)
+        )
+        content = gzip.GzipFile(fileobj=StringIO(response.content)).read()
+        self.assertEqual(content, plain.content)
+        self.assertLess(len(response.content), len(plain.content))
+
+    @skipIf(middleware.brotli is None, 'brotli is not installed')
+    @freeze_time(FROZEN_TIME)
+    def test_brotli(self):
+        plain = self.client.get(self.url)
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(
+            middleware.brotli.decompress(response.content), plain.content
+        )
+
+    @freeze_time(FROZEN_TIME)
+    def test_not_accepted(self):
+        response = self.client.get(self.url)
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+    @freeze_time(FROZEN_TIME)
+    def test_small_responses_left_alone(self):
+        with self.settings(API_COMPRESS_MIN_SIZE=1024 * 1024):
+            response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    @freeze_time(FROZEN_TIME)
+    def test_streaming(self):
+        response = self.client.get(
+            reverse('reminder_export', args=('csv',)),
+            HTTP_ACCEPT_ENCODING='gzip, br'
+        )
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        content = gzip.GzipFile(
+            fileobj=StringIO(''.join(response.streaming_content))
+        ).read()
+        self.assertEqual(len(content.splitlines()), 6)
+
+    def test_web_pages_left_alone(self):
+        response = self.client.get(
+            reverse('upcoming'), HTTP_ACCEPT_ENCODING='gzip'
+        )
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+
+class FastJSONRendererTest(TestCase):
+    """
+    Test the fast renderer gives the same JSON as DRF's
+    """
+
+    def render(self, data, **kwargs):
+        return (
+            json.loads(FastJSONRenderer().render(data, **kwargs)),
+            json.loads(JSONRenderer().render(data, **kwargs)),
+        )
+
+    def test_same_as_drf(self):
+        fast, drf = self.render(
+            {'a': [1, 2.5, None, True], 'b': u'caf\xe9 </x> \u2028'}
+        )
+        self.assertEqual(fast, drf)
+        self.assertNotIn(
+            '\xe2\x80\xa8', FastJSONRenderer().render({'b': u'\u2028'})
+        )
+
+    def test_datetimes(self):
+        fast, drf = self.render(
+            {'a': pytz.utc.localize(datetime(2014, 1, 5, 7, 43, 22))}
+        )
+        self.assertEqual(fast, drf)
+        self.assertEqual(fast['a'], '2014-01-05T07:43:22Z')
+
+    def test_indent(self):
+        content = FastJSONRenderer().render(
+            {'a': 1}, 'application/json; indent=4'
+        )
+        self.assertEqual(content, '{\n    "a": 1\n}')
+
+
+THROTTLED = dict(
+    settings.REST_FRAMEWORK,
+    DEFAULT_THROTTLE_RATES={'poll': '3/min', 'write': '2/min'}
+)
+
+
+@override_settings(REST_FRAMEWORK=THROTTLED)
+class ThrottleTest(BaseTest):
+    """
+    Test clients are limited in how often they poll and write
+    """
+
+    def setUp(self):
+        super(ThrottleTest, self).setUp()
+        cache.clear()
+        self.url = reverse('new_reminders', args=('2014-01-05 07:00:00',))
+
+    def token_get(self, url, user=None):
+        token = Token.objects.get(user=user or self.user)
+        return self.client.get(url, HTTP_AUTHORIZATION='Token %s' % token.key)
+
+    @freeze_time(FROZEN_TIME)
+    def test_polling_limited(self):
+        for i in range(3):
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 429)
+        self.assertTrue(int(response['Retry-After']) > 0)
+
+    @freeze_time(FROZEN_TIME)
+    def test_rejected_requests_not_counted(self):
+        for i in range(5):
+            self.client.get(self.url)
+        self.assertEqual(
+            cache.get('throttle:poll:user:%s:%d' % (
+                self.user.pk, int(time.time() // 60)
+            )), 3
+        )
+
+    @freeze_time(FROZEN_TIME)
+    def test_keyed_by_token(self):
+        self.user_logout()
+        user2 = self.create_user('user2', 'user2@test.com')
+        for i in range(3):
+            self.assertEqual(self.token_get(self.url).status_code, 200)
+        self.assertEqual(self.token_get(self.url).status_code, 429)
+        self.assertEqual(self.token_get(self.url, user2).status_code, 200)
+
+    @freeze_time(FROZEN_TIME)
+    def test_writes_limited_separately(self):
+        url = reverse('reminder_list')
+        for i in range(2):
+            status_code, content = self.post(url, {'content': 'test at 8pm'})
+            self.assertEqual(status_code, 201)
+        status_code, content = self.post(url, {'content': 'test at 8pm'})
+        self.assertEqual(status_code, 429)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    @freeze_time(FROZEN_TIME)
+    def test_writes_limited_everywhere(self):
+        reminder = self.create_reminder(self.tomorrow, self.now.time())
+        url = reverse('reminder_pause', args=(reminder.id,))
+        for i in range(2):
+            self.assertEqual(self.put(url, {})[0], 200)
+        self.assertEqual(self.put(url, {})[0], 429)
+
+    def test_sliding_window(self):
+        start = 60 * 1000
+        for i in range(3):
+            with freeze_time(datetime.utcfromtimestamp(start + 50)):
+                self.assertEqual(self.client.get(self.url).status_code, 200)
+        # A sixth of the way into the next window five sixths of the last
+        # one's requests still count, 2.5 + 1 is over the limit
+        with freeze_time(datetime.utcfromtimestamp(start + 70)):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 429)
+        # Once a third of the last window has slid out there's room for one
+        self.assertEqual(response['Retry-After'], '10')
+        with freeze_time(datetime.utcfromtimestamp(start + 90)):
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+            self.assertEqual(self.client.get(self.url).status_code, 429)
+
+
+class CachedTokenAuthenticationTest(BaseTest):
+    """
+    Test token lookups are cached and dropped when they change
+    """
+
+    def setUp(self):
+        super(CachedTokenAuthenticationTest, self).setUp()
+        cache.clear()
+        self.user_logout()
+        self.token = Token.objects.get(user=self.user)
+
+    def request(self, key=None):
+        return self.client.get(
+            reverse('user'),
+            HTTP_AUTHORIZATION='Token %s' % (key or self.token.key)
+        )
+
+    def token_queries(self, queries):
+        return [q for q in queries if 'authtoken_token' in q['sql']]
+
+    @freeze_time(FROZEN_TIME)
+    def test_token_cached(self):
+        with CaptureQueriesContext(connection) as first:
+            self.assertEqual(self.request().status_code, 200)
+        with CaptureQueriesContext(connection) as second:
+            response = self.request()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.token_queries(first)), 1)
+        self.assertEqual(self.token_queries(second), [])
+        self.assertEqual(len(second), len(first) - 1)
+        self.assertEqual(json.loads(response.content)['id'], self.user.id)
+
+    @freeze_time(FROZEN_TIME)
+    def test_invalid_token(self):
+        self.assertEqual(self.request('invalid').status_code, 403)
+
+    @freeze_time(FROZEN_TIME)
+    def test_user_save_invalidates(self):
+        self.request()
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.request().status_code, 403)
+
+    @freeze_time(FROZEN_TIME)
+    def test_token_delete_invalidates(self):
+        self.request()
+        self.token.delete()
+        self.assertEqual(self.request().status_code, 403)
 
 
 class NewRemindersTest(BaseTest):
@@ -3355,6 +3741,194 @@ class NewRemindersTest(BaseTest):
         status_code, content = self.get(self.url(dt), use_auth_token=False)
         self.assertEqual(status_code, 403)
 
+    @freeze_time(FROZEN_TIME)
+    def test_notified_once(self):
+        dt = self.now - timedelta(minutes=10)
+        status_code, content = self.get(self.url(dt))
+        self.assertEqual(len(content), 1)
+        self.assertTrue(
+            Reminder.objects.get(pk=self.reminder.id).desktop_notification_sent
+        )
+        status_code, content = self.get(self.url(dt))
+        self.assertEqual(status_code, 200)
+        self.assertEqual(content, [])
+
+    @freeze_time(FROZEN_TIME)
+    def test_claim_notifications(self):
+        dt = self.now - timedelta(minutes=10)
+        reminders = Reminder.objects.claim_notifications(self.user, dt)
+        self.assertEqual([r.id for r in reminders], [self.reminder.id])
+        self.assertEqual(
+            Reminder.objects.claim_notifications(self.user, dt), []
+        )
+
+    @skipIf(connection.vendor != 'postgresql', 'needs UPDATE ... RETURNING')
+    @freeze_time(FROZEN_TIME)
+    def test_claim_notifications_returning(self):
+        dt = self.now - timedelta(minutes=10)
+        st = self.now - timedelta(minutes=3)
+        recurring = self.create_reminder(st.date(), st.time())
+        recurring.interval_type = 3
+        recurring.interval_value = 1
+        recurring.save()
+        recurring.remind()
+        other = self.create_reminder(
+            st.date(), st.time(), user=self.create_user('user2', 'u2@test.com')
+        )
+        other.overdue()
+        with CaptureQueriesContext(connection) as queries:
+            reminders = Reminder.objects.claim_notifications(self.user, dt)
+        # Claimed and fetched in one statement
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(
+            [r.id for r in reminders], [self.reminder.id, recurring.id]
+        )
+        self.assertEqual([r.content for r in reminders], ['test test', 'Test'])
+        for reminder in reminders:
+            self.assertTrue(reminder.desktop_notification_sent)
+        self.assertEqual(
+            Reminder.objects.filter(desktop_notification_sent=True).count(), 2
+        )
+        self.assertEqual(
+            Reminder.objects.claim_notifications(self.user, dt), []
+        )
+
+
+class ReminderImportTest(BaseTest):
+    """
+    Test importing reminders in bulk
+    """
+
+    def setUp(self):
+        super(ReminderImportTest, self).setUp()
+        self.url = reverse('reminder_import')
+
+    @freeze_time(FROZEN_TIME)
+    def test_text(self):
+        status_code, content = self.post(self.url, {
+            'text': 'call mum 6pm tomorrow\nno time here\n'
+        })
+        self.assertEqual(status_code, 201)
+        self.assertEqual(content, {
+            'created': 1,
+            'errors': [{'line': 2, 'error': 'Please enter a reminder time'}],
+        })
+        self.assertTrue(
+            Reminder.objects.filter(user=self.user, content='call mum').exists()
+        )
+
+    @freeze_time(FROZEN_TIME)
+    def test_csv_file(self):
+        upload = StringIO('content,date,time\ndentist,2014-02-01,09:30\n')
+        upload.name = 'reminders.csv'
+        status_code, content = self.post(
+            self.url, {'format': 'csv', 'file': upload}
+        )
+        self.assertEqual(status_code, 201)
+        self.assertEqual(content['created'], 1)
+
+    @freeze_time(FROZEN_TIME)
+    def test_nothing_imported(self):
+        status_code, content = self.post(self.url, {'text': 'no time here'})
+        self.assertEqual(status_code, 400)
+        self.assertEqual(content['created'], 0)
+
+    def test_bad_format(self):
+        status_code, content = self.post(
+            self.url, {'format': 'xls', 'text': 'x'}
+        )
+        self.assertEqual(status_code, 400)
+        self.assertIn('format', content)
+
+    def test_csv_without_content(self):
+        status_code, content = self.post(
+            self.url, {'format': 'csv', 'text': 'what,when\nx,y'}
+        )
+        self.assertEqual(status_code, 400)
+        self.assertIn('file', content)
+
+
+class ReminderExportTest(BaseTest):
+    """
+    Test streaming exports of a user's reminders
+    """
+
+    @freeze_time(FROZEN_TIME)
+    def setUp(self):
+        super(ReminderExportTest, self).setUp()
+        self.reminder = self.create_reminder(
+            self.tomorrow, self.now.time(), content=u'Caf\xe9, "late"'
+        )
+        self.create_reminder(self.tomorrow, self.now.time()).soft_delete()
+        user2 = self.create_user('user2', 'user2@test.com')
+        self.create_reminder(self.tomorrow, self.now.time(), user=user2)
+
+    def export(self, export_format):
+        response = self.client.get(
+            reverse('reminder_export', args=(export_format,))
+        )
+        self.assertTrue(response.streaming)
+        return response, ''.join(response.streaming_content)
+
+    @freeze_time(FROZEN_TIME)
+    def test_csv(self):
+        response, content = self.export('csv')
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('reminders.csv', response['Content-Disposition'])
+        lines = content.splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[0].startswith('id,status,content,start'))
+        self.assertTrue(lines[1].startswith(
+            '%d,Live,"Caf\xc3\xa9, ""late""",%s' % (
+                self.reminder.id, self.reminder.localised_start().isoformat()
+            )
+        ))
+
+    @freeze_time(FROZEN_TIME)
+    def test_jsonl(self):
+        response, content = self.export('jsonl')
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['id'], self.reminder.id)
+        self.assertEqual(rows[0]['content'], u'Caf\xe9, "late"')
+        self.assertTrue(rows[0]['url'].endswith(
+            self.reminder.get_absolute_url()
+        ))
+
+    @freeze_time(FROZEN_TIME)
+    def test_ics(self):
+        response, content = self.export('ics')
+        self.assertEqual(
+            response['Content-Type'], 'text/calendar; charset=utf-8'
+        )
+        self.assertTrue(content.startswith('BEGIN:VCALENDAR\r\n'))
+        self.assertTrue(content.endswith('END:VCALENDAR\r\n'))
+        self.assertEqual(content.count('BEGIN:VEVENT'), 1)
+        start = self.reminder.full_start_datetime
+        self.assertIn(
+            start.strftime('DTSTART:%Y%m%dT%H%M%SZ\r\n'), content
+        )
+        self.assertIn('SUMMARY:Caf\xc3\xa9\\, "late"\r\n', content)
+
+    @freeze_time(FROZEN_TIME)
+    def test_reads_in_chunks(self):
+        for i in range(4):
+            self.create_reminder(self.tomorrow, self.now.time())
+        with self.settings(REMINDER_EXPORT_CHUNK_SIZE=2):
+            with CaptureQueriesContext(connection) as queries:
+                response, content = self.export('jsonl')
+        self.assertEqual(len(content.splitlines()), 5)
+        selects = [
+            q for q in queries
+            if 'FROM "remindmelatr_reminder"' in q['sql']
+        ]
+        self.assertEqual(len(selects), 3)
+
+    def test_logged_out(self):
+        self.user_logout()
+        response = self.client.get(reverse('reminder_export', args=('csv',)))
+        self.assertEqual(response.status_code, 403)
+
 
 class SignUpTest(BaseTest):
 
@@ -3467,6 +4041,8 @@ class SignUpTest(BaseTest):
         self.assertEqual(form['email'], user.email)
         tz = Timezone.objects.get(name=form['timezone_name'])
         self.assertEqual(tz, user.timezone)
+        self.assertEqual(content['token'], user.auth_token.key)
+        self.assertEqual(content['reminder_counts']['total'], 0)
 
         # Ensure the user can login
         login_form = {
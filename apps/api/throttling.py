@@ -0,0 +1,104 @@
+"""
+Request rate limits for the API.
+
+Clients are limited per auth token, or per user for session requests,
+with separate rates for polling (GET) and writes. Requests are counted in
+the cache with a sliding window: one counter for the current window and
+one for the window before, weighted by how much of it still falls in the
+last `duration` seconds. Counters are bumped with incr in the default
+cache, so limits are shared between processes only when CACHES is (as
+with memcached in production); with a local memory cache each process
+counts on its own.
+"""
+import math
+import time
+
+from django.core.cache import cache
+
+from rest_framework import settings as drf_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.throttling import SimpleRateThrottle
+
+
+class SlidingWindowThrottle(SimpleRateThrottle):
+    # Request methods counted by this throttle, None for all of them
+    methods = None
+
+    def get_rate(self):
+        # Read the rates when used rather than when imported so they
+        # follow changes to the settings
+        return drf_settings.api_settings.DEFAULT_THROTTLE_RATES.get(
+            self.scope
+        )
+
+    def get_cache_key(self, request, view):
+        if isinstance(request.auth, Token):
+            ident = 'token:%s' % request.auth.key
+        elif request.user is not None and request.user.is_authenticated():
+            ident = 'user:%s' % request.user.pk
+        else:
+            ident = 'ip:%s' % self.get_ident(request)
+        return 'throttle:%s:%s' % (self.scope, ident)
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        if self.methods is not None and request.method not in self.methods:
+            return True
+
+        key = self.get_cache_key(request, view)
+        self.now = time.time()
+        window = int(self.now // self.duration)
+        current_key = '%s:%d' % (key, window)
+
+        cache.add(current_key, 0, self.duration * 2)
+        try:
+            self.current = cache.incr(current_key)
+        except ValueError:
+            # The counter expired between add and incr
+            cache.add(current_key, 1, self.duration * 2)
+            self.current = 1
+        self.previous = cache.get('%s:%d' % (key, window - 1), 0)
+        self.elapsed = self.now / self.duration - window
+
+        if self.previous * (1 - self.elapsed) + self.current \
+                <= self.num_requests:
+            return True
+
+        # Rejected requests don't count against the client
+        cache.decr(current_key)
+        self.current -= 1
+        return False
+
+    def wait(self):
+        """
+        Seconds until the weighted count leaves room for another request
+        """
+        room = self.num_requests - 1
+        if self.current <= room and self.previous:
+            # Wait for enough of the previous window to slide out
+            fraction = 1 - float(room - self.current) / self.previous
+            wait = fraction - self.elapsed
+        else:
+            # Wait for this window to become the previous one and slide
+            # out far enough
+            fraction = 1 - float(room) / self.current if self.current else 0
+            wait = 1 - self.elapsed + max(0, fraction)
+        return max(1, int(math.ceil(round(wait * self.duration, 3))))
+
+
+class PollRateThrottle(SlidingWindowThrottle):
+    """
+    Limits how often a client can read, for endpoints clients poll
+    """
+    scope = 'poll'
+    methods = SAFE_METHODS
+
+
+class WriteRateThrottle(SlidingWindowThrottle):
+    """
+    Limits how often a client can create and change reminders
+    """
+    scope = 'write'
+    methods = ('POST', 'PUT', 'PATCH', 'DELETE')
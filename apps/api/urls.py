@@ -15,6 +15,9 @@ urlpatterns = patterns('api.views',
         'reminder_complete', name='reminder_complete'),
     url(r'^reminders/(?P<pk>[0-9]+)/delete$',
         'reminder_delete', name='reminder_delete'),
+    url(r'^reminders/import/$', 'reminder_import', name='reminder_import'),
+    url(r'^reminders/export/(?P<export_format>csv|jsonl|ics)/$',
+        'reminder_export', name='reminder_export'),
     url(r'^reminders/$', 'reminder_list', name='reminder_list'),
     url(r'^reminders/(?P<status_name>.+?)/$',
         'reminder_list', name='reminder_list'),
@@ -2,12 +2,14 @@ from datetime import datetime
 
 import pytz
 
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 from django.utils import timezone
 
 from rest_framework import status
-from rest_framework.decorators import (api_view, permission_classes)
-from rest_framework.renderers import JSONRenderer
+from rest_framework.decorators import (
+    api_view, permission_classes, throttle_classes
+)
+from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.authtoken.models import Token
@@ -15,27 +17,61 @@ from rest_framework.authtoken.serializers import AuthTokenSerializer
 
 from allauth.account.utils import send_email_confirmation
 
+from reminders import export
+from reminders.importer import FORMATS as IMPORT_FORMATS, import_reminders
 from reminders.models import Reminder
 from accounts.models import LocalUser
 from timezones.models import Timezone
+from .renderers import FastJSONRenderer
+from .throttling import PollRateThrottle, WriteRateThrottle
 from .serializers import (
-    ReminderSerializer, UserSerializer,
+    ReminderSerializer, ReminderListSerializer, UserSerializer,
     QuickReminderSerializer, ReminderSnoozeSerializer,
     ReminderEditSerializer, UserRegisterSerializer
 )
 
 
+class ReminderPagination(PageNumberPagination):
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+
 class JSONResponse(HttpResponse):
     """
     An HttpResponse that renders its content into JSON.
     """
     def __init__(self, data, **kwargs):
-        content = JSONRenderer().render(data)
+        content = FastJSONRenderer().render(data)
         kwargs['content_type'] = 'application/json'
         super(JSONResponse, self).__init__(content, **kwargs)
 
 
+def requested_fields(request):
+    """
+    The reminder fields asked for with ?fields=a,b, or the compact set with
+    ?compact, None for all of them
+    """
+    if request.query_params.get('fields'):
+        return [
+            f.strip() for f in request.query_params['fields'].split(',')
+            if f.strip()
+        ]
+    if 'compact' in request.query_params:
+        return list(ReminderListSerializer.COMPACT_FIELDS)
+    return None
+
+
+def serialize_reminders(request, reminders, fields):
+    # They all belong to the user, save loading the user for each one
+    reminders = list(reminders)
+    for reminder in reminders:
+        reminder.user = request.user
+    return ReminderListSerializer(reminders, many=True, fields=fields).data
+
+
 @api_view(['GET', 'POST'])
+@throttle_classes((PollRateThrottle, WriteRateThrottle))
 def reminder_list(request, status_name=None):
     """
     List all reminders
@@ -70,8 +106,22 @@ def reminder_list(request, status_name=None):
             except ValueError:
                 pass
 
-        serializer = ReminderSerializer(reminders, many=True)
-        return Response(serializer.data)
+        # Only load the columns needed for the fields asked for
+        fields = requested_fields(request)
+        if fields is not None:
+            reminders = reminders.only(
+                *ReminderListSerializer.columns(fields)
+            )
+
+        # Paging is opt in, without a page everything is returned
+        if 'page' in request.GET:
+            paginator = ReminderPagination()
+            page = paginator.paginate_queryset(reminders, request)
+            return paginator.get_paginated_response(
+                serialize_reminders(request, page, fields)
+            )
+
+        return Response(serialize_reminders(request, reminders, fields))
 
     elif request.method == 'POST':
         data = request.data
@@ -96,12 +146,23 @@ def reminder_detail(request, pk):
         return HttpResponse(status=404)
 
     if request.method == 'GET':
-        serializer = ReminderSerializer(reminder)
+        serializer = ReminderListSerializer(
+            reminder, fields=requested_fields(request)
+        )
         return Response(serializer.data)
     elif request.method == 'PUT':
+        orig_start = reminder.full_start_datetime
+        orig_content = reminder.content
         serializer = ReminderEditSerializer(reminder, data=request.data)
         if serializer.is_valid():
-            serializer.save()
+            reminder = serializer.save()
+            if reminder.content != orig_content:
+                reminder.add_history_entry('Reminder content updated')
+            if reminder.full_start_datetime != orig_start:
+                reminder.reset_recurrence()
+                reminder.add_history_entry('Reminder set for {}.'.format(
+                    reminder.localised_start().strftime('%H:%M on %d/%m/%y')
+                ))
             return Response(serializer.validated_data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     elif request.method == 'DELETE':
@@ -202,27 +263,80 @@ def reminder_delete(request, pk):
 
 
 @api_view(['GET'])
+@throttle_classes((PollRateThrottle, WriteRateThrottle))
+def reminder_export(request, export_format):
+    """
+    Stream all of the user's reminders as CSV, JSON Lines or iCalendar
+    """
+    chunks, content_type, extension = export.export(
+        request.user, export_format
+    )
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = (
+        'attachment; filename="reminders.%s"' % extension
+    )
+    return response
+
+
+@api_view(['POST'])
+def reminder_import(request):
+    """
+    Create reminders in bulk from an uploaded 'file' or 'text', one quick
+    add reminder per line or CSV when 'format' is csv
+    """
+    import_format = request.data.get('format', 'text')
+    if import_format not in IMPORT_FORMATS:
+        return Response(
+            {'format': ['Format should be one of %s' % ', '.join(
+                sorted(IMPORT_FORMATS)
+            )]},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    if 'file' in request.FILES:
+        lines = request.FILES['file']
+    else:
+        lines = request.data.get('text', '').splitlines()
+
+    try:
+        importer = import_reminders(request.user, lines, import_format)
+    except ValueError as e:
+        return Response(
+            {'file': [str(e)]}, status=status.HTTP_400_BAD_REQUEST
+        )
+
+    if importer.created:
+        status_code = status.HTTP_201_CREATED
+    else:
+        status_code = status.HTTP_400_BAD_REQUEST
+    return Response({
+        'created': importer.created,
+        'errors': [
+            {'line': line, 'error': error} for line, error in importer.errors
+        ],
+    }, status=status_code)
+
+
+@api_view(['GET'])
+@throttle_classes((PollRateThrottle, WriteRateThrottle))
 def new_reminders(request, since):
     """
     Return any reminders that have become overdue since 'since'
     """
     usertz = pytz.timezone(timezone.get_current_timezone_name())
     since = usertz.localize(datetime.strptime(since, '%Y-%m-%d %H:%M:%S'))
-    reminders = Reminder.objects.filter(user=request.user, deleted=False,
-                                        desktop_notification_sent=False,
-                                        status=4, full_start_datetime__gte=since)
+    reminders = Reminder.objects.claim_notifications(request.user, since)
     serializer = ReminderSerializer(reminders, many=True)
-    response = Response(serializer.data)
-    reminders.update(desktop_notification_sent=True)
-    return response
+    return Response(serializer.data)
 
 
 @api_view(['GET'])
+@throttle_classes((PollRateThrottle, WriteRateThrottle))
 def user(request):
     """
     View a single user
     """
-    serializer = UserSerializer(request.user)
+    serializer = UserSerializer(request.user, context={'request': request})
     return Response(serializer.data)
 
 
@@ -246,7 +360,9 @@ def register(request):
         )
         send_email_confirmation(request._request, user, signup=True)
         return Response(
-            UserSerializer(instance=user).data,
+            UserSerializer(
+                instance=user, context={'request': request}
+            ).data,
             status=status.HTTP_201_CREATED
         )
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -1,7 +1,7 @@
 from __future__ import absolute_import
 from django.contrib import admin
 
-from reminders.models import Reminder, RemindOn
+from reminders.models import FailedDelivery, Reminder, RemindOn
 
 
 class RemindOnAdmin(admin.ModelAdmin):
@@ -12,3 +12,8 @@ admin.site.register(RemindOn, RemindOnAdmin)
 class ReminderAdmin(admin.ModelAdmin):
     pass
 admin.site.register(Reminder, ReminderAdmin)
+
+
+class FailedDeliveryAdmin(admin.ModelAdmin):
+    list_display = ('reminder', 'attempts', 'created')
+admin.site.register(FailedDelivery, FailedDeliveryAdmin)
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ReminderMeLatrConfig(AppConfig):
     name = 'reminders'
     verbose_name = 'Reminders'
+
+    def ready(self):
+        import signals
@@ -0,0 +1,159 @@
+"""
+Kombu transport for the Django database broker that doesn't poll.
+
+Publishing a message also sends a notification, and idle workers block
+until one arrives instead of querying for messages every polling
+interval. On Postgres the notification is a NOTIFY on
+BROKER_NOTIFY_CHANNEL, sent in the publishing transaction so it arrives
+once the message is visible. Elsewhere an in-process condition stands in,
+which only wakes workers in the publishing process, so it is for tests;
+use the plain django transport on other databases.
+
+Workers register for notifications before checking the queue, so a
+message published in between still wakes them. The polling interval is
+kept as the longest a worker waits before checking anyway, in case a
+notification is lost while reconnecting.
+
+    BROKER_URL = 'django://'
+    BROKER_TRANSPORT = 'reminders.broker:Transport'
+"""
+from __future__ import absolute_import
+
+import select
+import socket
+import threading
+
+from django.conf import settings
+from django.db import connection
+
+from kombu.five import Empty, monotonic
+from kombu.transport import django as django_transport
+
+
+def notify_channel():
+    return getattr(settings, 'BROKER_NOTIFY_CHANNEL', 'kombu_messages')
+
+
+class LocalWaiter(object):
+    """
+    In process stand-in for LISTEN/NOTIFY
+    """
+    condition = threading.Condition()
+    # Bumped by every notification
+    generation = 0
+
+    seen = 0
+
+    @classmethod
+    def notify(cls, queue=None):
+        with cls.condition:
+            LocalWaiter.generation += 1
+            cls.condition.notify_all()
+
+    def prepare(self):
+        with self.condition:
+            self.seen = LocalWaiter.generation
+
+    def wait(self, timeout):
+        # Don't sleep through a notification sent since prepare
+        with self.condition:
+            if LocalWaiter.generation == self.seen:
+                self.condition.wait(timeout)
+
+    def close(self):
+        pass
+
+
+class PostgresWaiter(object):
+    """
+    Waits for NOTIFY on its own connection so that it stays listening
+    when the worker closes its Django connection between tasks
+    """
+
+    def __init__(self):
+        self.conn = connection.get_new_connection(
+            connection.get_connection_params()
+        )
+        self.conn.autocommit = True
+        self.conn.cursor().execute('LISTEN %s' % notify_channel())
+
+    @classmethod
+    def notify(cls, queue):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT pg_notify(%s, %s)', [notify_channel(), queue]
+            )
+
+    def prepare(self):
+        # Notifications queue up on the connection until wait reads them
+        pass
+
+    def wait(self, timeout):
+        if not self.conn.notifies:
+            select.select([self.conn], [], [], timeout)
+        self.conn.poll()
+        del self.conn.notifies[:]
+
+    def close(self):
+        self.conn.close()
+
+
+def waiter_class():
+    if connection.vendor == 'postgresql':
+        return PostgresWaiter
+    return LocalWaiter
+
+
+class Channel(django_transport.Channel):
+
+    def _put(self, queue, message, **kwargs):
+        super(Channel, self)._put(queue, message, **kwargs)
+        waiter_class().notify(queue)
+
+
+class Transport(django_transport.Transport):
+    Channel = Channel
+
+    # The longest an idle worker waits without a notification
+    polling_interval = 10.0
+
+    _waiter = None
+
+    @property
+    def waiter(self):
+        if self._waiter is None:
+            self._waiter = waiter_class()()
+        return self._waiter
+
+    def drain_events(self, connection, timeout=None):
+        time_start = monotonic()
+        get = self.cycle.get
+        while 1:
+            self.waiter.prepare()
+            try:
+                item, channel = get(timeout=timeout)
+            except Empty:
+                wait = self.polling_interval
+                if timeout:
+                    remaining = timeout - (monotonic() - time_start)
+                    if remaining <= 0:
+                        raise socket.timeout()
+                    wait = min(wait, remaining)
+                self.waiter.wait(wait)
+            else:
+                break
+
+        message, queue = item
+
+        if not queue or queue not in self._callbacks:
+            raise KeyError(
+                'Message for queue {0!r} without consumers: {1}'.format(
+                    queue, message))
+
+        self._callbacks[queue](message)
+
+    def close_connection(self, connection):
+        super(Transport, self).close_connection(connection)
+        if self._waiter is not None:
+            self._waiter.close()
+            self._waiter = None
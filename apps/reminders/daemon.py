@@ -0,0 +1,276 @@
+"""
+Long running reminder scheduler.
+
+Rather than asking the database what is due every few seconds the daemon
+loads everything due within the next hour into a TimingWheel, extends that
+window as time moves on and fires each reminder on the second it is due.
+Changes to reminders reach the daemon through Postgres LISTEN/NOTIFY (see
+reminders.signals, sent when REMINDER_SCHEDULER_NOTIFY is on) and a slow
+full resync catches anything missed.
+
+Given a ShardCoordinator the scheduler only looks after the reminders of
+users in the shards it holds leases for, so several can run side by side.
+"""
+import logging
+import Queue
+import select
+import time
+from datetime import datetime
+
+import pytz
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import F, Q
+
+from . import governor, history, metrics
+from .models import Reminder
+from .digest import coalesce
+from .tasks import dispatch_message
+from .wheel import TimingWheel, timestamp
+
+logger = logging.getLogger(__name__)
+
+
+class LocalListener(object):
+    """
+    In process stand-in for LISTEN/NOTIFY, used for tests and databases
+    other than Postgres. Only sees changes made in the same process.
+    """
+    queue = None
+
+    # Set when notifications may have been missed, see PostgresListener
+    missed = False
+
+    def __init__(self):
+        LocalListener.queue = Queue.Queue()
+
+    @classmethod
+    def notify(cls, reminder_id):
+        if cls.queue is not None:
+            cls.queue.put(reminder_id)
+
+    def wait(self, timeout):
+        ids = []
+        try:
+            ids.append(self.queue.get(timeout=timeout) if timeout > 0
+                       else self.queue.get_nowait())
+            while True:
+                ids.append(self.queue.get_nowait())
+        except Queue.Empty:
+            pass
+        return ids
+
+    def close(self):
+        LocalListener.queue = None
+
+
+class PostgresListener(object):
+    """
+    Blocks on its own database connection until a reminder change is
+    notified. The connection is kept away from Django so that it stays
+    listening whatever happens to the scheduler's queries, and it is opened
+    and listening again if it drops.
+    """
+    missed = False
+
+    def __init__(self):
+        self.connect()
+
+    def connect(self):
+        self.conn = connection.get_new_connection(
+            connection.get_connection_params()
+        )
+        self.conn.autocommit = True
+        self.conn.cursor().execute(
+            'LISTEN %s' % settings.REMINDER_SCHEDULER_CHANNEL
+        )
+
+    def wait(self, timeout):
+        import psycopg2
+        try:
+            if not self.conn.notifies and timeout > 0:
+                select.select([self.conn], [], [], timeout)
+            self.conn.poll()
+        except (psycopg2.Error, select.error):
+            logger.warning('Scheduler LISTEN connection lost, reconnecting')
+            self.close()
+            self.connect()
+            # Anything notified in between is gone
+            self.missed = True
+            return []
+        ids = [int(n.payload) for n in self.conn.notifies]
+        del self.conn.notifies[:]
+        return ids
+
+    def close(self):
+        if not self.conn.closed:
+            self.conn.close()
+
+
+def get_listener():
+    if connection.vendor == 'postgresql':
+        return PostgresListener()
+    return LocalListener()
+
+
+class WheelScheduler(object):
+
+    def __init__(self, listener=None, now=None, coordinator=None):
+        if now is None:
+            now = time.time()
+        self.listener = listener or get_listener()
+        self.coordinator = coordinator
+        self.wheel = TimingWheel(now)
+        self.horizon = self.wheel.horizon
+        self.loaded_until = None
+        self.next_resync = None
+        self.next_rebalance = None
+        # Shards owned, None for all of them
+        self.shards = None
+
+    def _datetime(self, ts):
+        return datetime.fromtimestamp(ts, pytz.timezone('UTC'))
+
+    def due(self, until):
+        reminders = Reminder.objects.due(self._datetime(until))
+        if self.shards is not None:
+            reminders = reminders.annotate(
+                shard=F('user_id') % self.coordinator.shards
+            ).filter(shard__in=self.shards)
+        return reminders
+
+    def rebalance(self, now):
+        """
+        Renew our leases and start again if the shards we own have changed
+        """
+        shards = self.coordinator.rebalance(self._datetime(now))
+        self.next_rebalance = now + self.coordinator.lease_time.seconds / 3.0
+        if shards != self.shards:
+            logger.info('Scheduler now owns shards %s', shards)
+            self.shards = shards
+            self.next_resync = None
+
+    def fire_time(self, start, next_attempt):
+        """
+        When a reminder is due, later than its start if a failed send is
+        backing off
+        """
+        if next_attempt is not None and next_attempt > start:
+            start = next_attempt
+        return timestamp(start)
+
+    def load(self, start, end):
+        """
+        Schedule everything due in the window (start, end]
+        """
+        reminders = self.due(end)
+        if start is not None:
+            start = self._datetime(start)
+            reminders = reminders.filter(
+                Q(full_start_datetime__gt=start) | Q(next_attempt__gt=start)
+            )
+        count = 0
+        for pk, start_dt, next_attempt in reminders.values_list(
+                'id', 'full_start_datetime', 'next_attempt'):
+            self.wheel.schedule(pk, self.fire_time(start_dt, next_attempt))
+            count += 1
+        return count
+
+    def resync(self, now):
+        """
+        Reload the whole window, dropping anything scheduled before
+        """
+        self.wheel = TimingWheel(now)
+        self.loaded_until = now + self.horizon - 1
+        self.next_resync = now + settings.REMINDER_SCHEDULER_RESYNC
+        count = self.load(None, self.loaded_until)
+        logger.debug('Scheduler resynced, %s reminders in window', count)
+
+    def extend(self):
+        """
+        Load the slice of time that has come into the window since the
+        last load
+        """
+        end = self.wheel.current + self.horizon - 1
+        if end - self.loaded_until >= settings.REMINDER_SCHEDULER_REFILL:
+            self.load(self.loaded_until, end)
+            self.loaded_until = end
+
+    def changed(self, reminder_ids):
+        """
+        Reschedule reminders that have been created or updated
+        """
+        due = dict(
+            (pk, self.fire_time(start, next_attempt))
+            for pk, start, next_attempt in self.due(
+                self.loaded_until
+            ).filter(id__in=reminder_ids).values_list(
+                'id', 'full_start_datetime', 'next_attempt'
+            )
+        )
+        for pk in reminder_ids:
+            if pk in due:
+                self.wheel.schedule(pk, due[pk])
+            else:
+                self.wheel.cancel(pk)
+
+    def fire(self, now):
+        due = self.wheel.advance(now)
+        if not due:
+            return 0
+        fired = 0
+        reminders = list(
+            self.due(now).filter(id__in=due).order_by('full_start_datetime')
+        )
+        metrics.gauge('scheduler.due', len(reminders))
+        messages = coalesce(reminders)
+        granted = governor.take(len(messages), now)
+        for message in messages[:granted]:
+            fired += dispatch_message(message)
+        # Anything over the send rate waits for the next second
+        backlog = 0
+        for message in messages[granted:]:
+            for reminder in message:
+                self.wheel.schedule(reminder.id, now + 1)
+                backlog += 1
+        governor.report_backlog(backlog)
+        metrics.gauge('scheduler.backlog', backlog)
+        metrics.incr('scheduler.dispatched', fired)
+        return fired
+
+    def tick(self, now, timeout=0):
+        """
+        Do one turn of the scheduler loop, waiting up to `timeout` seconds
+        for changes to arrive
+        """
+        if self.coordinator is not None and (
+                self.next_rebalance is None or now >= self.next_rebalance):
+            self.rebalance(now)
+        if self.next_resync is None or now >= self.next_resync:
+            self.resync(now)
+
+        changed = self.listener.wait(timeout)
+        if self.listener.missed:
+            self.listener.missed = False
+            self.resync(now)
+        with metrics.timer('scheduler.tick'):
+            if changed:
+                self.changed(changed)
+            fired = self.fire(time.time() if timeout else now)
+            self.extend()
+        history.flush()
+        return fired
+
+    def run(self):
+        logger.info('Scheduler started')
+        try:
+            while True:
+                now = time.time()
+                # Wake up on the next second boundary unless something changes
+                self.tick(now, timeout=1 - (now % 1))
+        finally:
+            history.flush()
+            self.listener.close()
+            if self.coordinator is not None:
+                self.coordinator.stop()
@@ -0,0 +1,84 @@
+"""
+Digest coalescing for reminder delivery.
+
+With REMINDER_DIGEST_WINDOW set, a user's reminders that fall due in the
+same window (aligned to the epoch, so a window of 60 is each clock minute)
+are sent as one digest email rather than one email each.
+"""
+from django.conf import settings
+from django.contrib.sites.models import Site
+from django.template import Context
+from django.template.loader import get_template
+
+from . import metrics
+from .models import build_email
+from .wheel import timestamp
+
+
+def digest_window():
+    return getattr(settings, 'REMINDER_DIGEST_WINDOW', 0)
+
+
+def coalesce(reminders):
+    """
+    Group reminders into the messages to send, keeping the order of the
+    first reminder in each message
+    """
+    window = digest_window()
+    if not window:
+        return [[r] for r in reminders]
+
+    messages = []
+    groups = {}
+    for r in reminders:
+        key = (r.user_id, int(timestamp(r.full_start_datetime)) // window)
+        if key not in groups:
+            groups[key] = []
+            messages.append(groups[key])
+        groups[key].append(r)
+    return messages
+
+
+def build_digest(reminders):
+    user = reminders[0].user
+    subject = '%s new reminders from remindmelatr.com' % len(reminders)
+    context = Context({
+        'reminders': reminders,
+        'user': user,
+        'site': Site.objects.get_current(),
+        'subject': subject,
+    })
+    return build_email(
+        subject,
+        get_template('email/digest.txt').render(context),
+        get_template('email/digest.html').render(context),
+        user.email
+    )
+
+
+def send_digest(reminders):
+    """
+    Send a user one email for several reminders
+    """
+    if len(reminders) == 1:
+        return reminders[0].remind()
+
+    for r in reminders:
+        r.start_sending()
+
+    with metrics.timer('reminder.render'):
+        msg = build_digest(reminders)
+
+    try:
+        with metrics.timer('reminder.send'):
+            msg.send()
+    except Exception as exc:
+        metrics.incr('reminder.send_failed')
+        for r in reminders:
+            r.delivery_failed(exc)
+        return
+
+    metrics.incr('reminder.digest')
+    with metrics.timer('reminder.db'):
+        for r in reminders:
+            r.sent('Reminder sent in a digest.')
@@ -0,0 +1,123 @@
+"""
+Streaming exports of a user's reminders.
+
+Each format is a generator of byte strings for a StreamingHttpResponse.
+Reminders are read a chunk at a time in primary key order, so memory use
+stays the same however many reminders are exported.
+"""
+import csv
+import json
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.sites.models import Site
+from django.core.serializers.json import DjangoJSONEncoder
+
+from . import ical
+from .models import Reminder
+
+FIELDS = (
+    'id', 'status', 'content', 'start', 'interval_type', 'interval_value',
+    'max_recurrances', 'scheduled_end_date', 'completion_date',
+    'snooze_count', 'total_reminders', 'total_snoozes', 'url',
+)
+
+
+def chunked(queryset, size=None):
+    """
+    Iterate over a queryset `size` rows at a time, keyed on the primary
+    key so each chunk is a cheap indexed query
+    """
+    if size is None:
+        size = settings.REMINDER_EXPORT_CHUNK_SIZE
+    last = 0
+    while True:
+        count = 0
+        chunk = queryset.filter(pk__gt=last).order_by('pk')[:size]
+        for obj in chunk.iterator():
+            count += 1
+            last = obj.pk
+            yield obj
+        if count < size:
+            return
+
+
+def user_reminders(user):
+    """
+    All of the user's reminders, sharing the user so their timezone is
+    only looked up once
+    """
+    for reminder in chunked(Reminder.objects.all(user)):
+        reminder.user = user
+        yield reminder
+
+
+def row(reminder, domain):
+    return OrderedDict([
+        ('id', reminder.id),
+        ('status', reminder.get_status_display()),
+        ('content', reminder.content),
+        ('start', reminder.localised_start()),
+        ('interval_type', reminder.get_interval_type_display()),
+        ('interval_value', reminder.interval_value),
+        ('max_recurrances', reminder.max_recurrances),
+        ('scheduled_end_date', reminder.scheduled_end_date),
+        ('completion_date', reminder.completion_date),
+        ('snooze_count', reminder.snooze_count),
+        ('total_reminders', reminder.total_reminders),
+        ('total_snoozes', reminder.total_snoozes),
+        ('url', 'https://%s%s' % (domain, reminder.get_absolute_url())),
+    ])
+
+
+class Echo(object):
+    """
+    A file like object handing back whatever is written to it, lets
+    csv.writer produce lines one at a time
+    """
+
+    def write(self, value):
+        return value
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return unicode(value).encode('utf-8')
+
+
+def as_csv(reminders, domain):
+    writer = csv.writer(Echo())
+    yield writer.writerow(FIELDS)
+    for reminder in reminders:
+        yield writer.writerow(
+            [_csv_value(v) for v in row(reminder, domain).values()]
+        )
+
+
+def as_jsonl(reminders, domain):
+    for reminder in reminders:
+        yield json.dumps(row(reminder, domain), cls=DjangoJSONEncoder) + '\n'
+
+
+def as_ics(reminders, domain):
+    return ical.calendar(reminders, domain, name='Reminders')
+
+
+# format: (generator, content type, file extension)
+FORMATS = {
+    'csv': (as_csv, 'text/csv; charset=utf-8', 'csv'),
+    'jsonl': (as_jsonl, 'application/x-ndjson', 'jsonl'),
+    'ics': (as_ics, 'text/calendar; charset=utf-8', 'ics'),
+}
+
+
+def export(user, export_format):
+    """
+    The chunks of an export of all the user's reminders and its content type
+    """
+    generator, content_type, extension = FORMATS[export_format]
+    domain = Site.objects.get_current().domain
+    return generator(user_reminders(user), domain), content_type, extension
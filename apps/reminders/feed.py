@@ -0,0 +1,132 @@
+"""
+Per user iCalendar feeds.
+
+Calendar clients poll feeds often, so a rendered feed is cached against
+the version of the user's reminders. The version is the time of their
+last change, bumped by the receivers in reminders.signals. Polls between
+changes are answered from the cache, and conditional requests are answered
+from the version alone without touching the database.
+
+Rendered feeds are cached in chunks so that large feeds stay under the
+memcached item size limit.
+
+Versions live in the default cache, so every process has to share it (see
+CACHES and the accounts.E001 check) or a change made in one process won't
+reach feeds served by the others.
+"""
+import time
+from datetime import datetime, timedelta
+
+import pytz
+
+from django.conf import settings
+from django.contrib.sites.models import Site
+from django.core.cache import cache
+from django.db import models
+
+from accounts.models import LocalUser
+from . import ical
+from .export import chunked
+from .models import Reminder
+
+TOKEN_KEY = 'calendar:token:%s'
+VERSION_KEY = 'calendar:version:%s'
+FEED_KEY = 'calendar:feed:%s:%s'
+
+# Characters of a rendered feed per cache item, well under memcached's 1MB
+CHUNK_SIZE = 256 * 1024
+
+
+def cache_timeout():
+    return settings.REMINDER_FEED_CACHE_TIMEOUT
+
+
+def user_id(token):
+    """
+    The id of the user a feed token belongs to, None if nobody's
+    """
+    pk = cache.get(TOKEN_KEY % token)
+    if pk is None:
+        pk = LocalUser.objects.filter(
+            calendar_token=token
+        ).values_list('id', flat=True).first()
+        if pk is None:
+            return None
+        cache.set(TOKEN_KEY % token, pk, cache_timeout())
+    return pk
+
+
+def version(user_id):
+    """
+    Milliseconds since the epoch of the last change to the user's reminders,
+    or of when we started tracking them
+    """
+    now = int(time.time() * 1000)
+    cache.add(VERSION_KEY % user_id, now, cache_timeout())
+    # Nothing is kept by a dummy cache, every request is a new version
+    return cache.get(VERSION_KEY % user_id, now)
+
+
+def changed(user_id):
+    """
+    Move the user's feed on to a new version
+    """
+    key = VERSION_KEY % user_id
+    now = int(time.time() * 1000)
+    current = cache.get(key)
+    if current is not None and current >= now:
+        # Always move forwards, even for changes in the same millisecond
+        now = current + 1
+    cache.set(key, now, cache_timeout())
+
+
+def etag(version):
+    return '%x' % version
+
+
+def last_modified(version):
+    return datetime.fromtimestamp(version // 1000, pytz.utc)
+
+
+def reminders(user):
+    """
+    The reminders that appear in a user's feed, live and snoozed ones and
+    those that went overdue recently
+    """
+    cutoff = datetime.now(pytz.utc) - timedelta(
+        days=settings.REMINDER_FEED_OVERDUE_DAYS
+    )
+    qs = Reminder.objects.all(user).filter(
+        models.Q(status__in=[2, 3]) |
+        models.Q(status=4, full_start_datetime__gte=cutoff)
+    )
+    for reminder in chunked(qs):
+        reminder.user = user
+        yield reminder
+
+
+def render(user_id, version):
+    """
+    The feed for a version of the user's reminders
+    """
+    key = FEED_KEY % (user_id, version)
+    count = cache.get(key)
+    if count is not None:
+        keys = ['%s:%d' % (key, i) for i in range(count)]
+        chunks = cache.get_many(keys)
+        if len(chunks) == count:
+            return ''.join(chunks[k] for k in keys)
+
+    user = LocalUser.objects.select_related('timezone').get(pk=user_id)
+    domain = Site.objects.get_current().domain
+    content = ''.join(ical.calendar(reminders(user), domain, name=(
+        'Reminders for %s' % user.email
+    )))
+    chunks = [content[i:i + CHUNK_SIZE]
+              for i in range(0, len(content), CHUNK_SIZE)]
+    cache.set_many(dict(
+        ('%s:%d' % (key, i), chunk) for i, chunk in enumerate(chunks)
+    ), cache_timeout())
+    # Only once every chunk is in
+    cache.set(key, len(chunks), cache_timeout())
+    return content
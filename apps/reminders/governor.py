@@ -0,0 +1,60 @@
+"""
+Send rate governor for reminder delivery.
+
+SES only accepts REMINDER_SEND_RATE messages a second, so reminders are
+released to the workers through a token bucket shared through the cache.
+The bucket holds one second's worth of tokens and is refilled at the start
+of every second; each process takes tokens by incrementing the counter for
+the current second, which memcached does atomically. Reminders that don't
+get a token stay unclaimed and are picked up, oldest first, next time.
+
+The rate only holds across processes that share the cache (see CACHES).
+With a local memory cache, as in development, every process gets the
+whole rate to itself.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+BUCKET_KEY = 'reminders:send-bucket:%d'
+BACKLOG_KEY = 'reminders:send-backlog'
+
+
+def send_rate():
+    return getattr(settings, 'REMINDER_SEND_RATE', None)
+
+
+def take(wanted, now=None):
+    """
+    Take up to `wanted` tokens, returning how many were granted
+    """
+    rate = send_rate()
+    if not rate or wanted <= 0:
+        return wanted
+    if now is None:
+        now = time.time()
+
+    key = BUCKET_KEY % int(now)
+    # Buckets can be taken from ahead of their second (see tasks.scheduler)
+    # and have to last until it is over
+    timeout = max(0, int(now) - int(time.time())) + 5
+    cache.add(key, 0, timeout=timeout)
+    try:
+        used = cache.incr(key, wanted)
+    except ValueError:
+        # The counter expired between add and incr
+        cache.add(key, wanted, timeout=timeout)
+        used = wanted
+    return max(0, min(wanted, rate - (used - wanted)))
+
+
+def report_backlog(depth):
+    """
+    Record how many due reminders are waiting for a token
+    """
+    cache.set(BACKLOG_KEY, depth, timeout=None)
+
+
+def backlog():
+    return cache.get(BACKLOG_KEY, 0)
@@ -0,0 +1,87 @@
+"""
+Write-behind buffer for reminder history entries.
+
+Depending on REMINDER_HISTORY_WRITE_MODE history entries are either saved
+straight away ('sync'), held in memory and bulk inserted once the request
+or task has finished ('buffer'), or queued for a celery task as soon as
+the transaction that created them commits ('celery'). Entries are only
+buffered or queued once that transaction has committed so rolled back
+changes never reach the history. Buffered entries are lost if the process
+dies before they are flushed, queued ones are written at least once.
+
+Until they are written the database doesn't know about buffered or queued
+entries, see written().
+"""
+import threading
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+_local = threading.local()
+
+
+def _pending():
+    if not hasattr(_local, 'entries'):
+        _local.entries = []
+    return _local.entries
+
+
+def write_mode():
+    return getattr(settings, 'REMINDER_HISTORY_WRITE_MODE', 'sync')
+
+
+def written():
+    """
+    Whether entries are in the database as soon as they are added, so the
+    stored history is up to date
+    """
+    return write_mode() == 'sync'
+
+
+def add(entry):
+    """
+    Save a history entry according to the configured write mode
+    """
+    if write_mode() == 'sync':
+        entry.save()
+        return
+
+    # Stamp the entry now, it may not be written for a while
+    entry.created = entry.modified = timezone.now()
+    if write_mode() == 'celery':
+        transaction.on_commit(lambda: _queue([entry]))
+    else:
+        transaction.on_commit(lambda: _enqueue(entry))
+
+
+def _queue(entries):
+    from .tasks import write_history
+    write_history.delay([entry_values(e) for e in entries])
+
+
+def _enqueue(entry):
+    entries = _pending()
+    entries.append(entry)
+    if len(entries) >= settings.REMINDER_HISTORY_BATCH_SIZE:
+        flush()
+
+
+def flush():
+    """
+    Write out any buffered history entries
+    """
+    entries = _pending()
+    if not entries:
+        return
+    _local.entries = []
+
+    from .models import ReminderHistory
+    ReminderHistory.objects.bulk_insert(entries)
+
+
+def entry_values(entry):
+    return dict(
+        (f.attname, getattr(entry, f.attname))
+        for f in entry._meta.concrete_fields if not f.primary_key
+    )
@@ -0,0 +1,123 @@
+"""
+iCalendar (RFC 5545) output for reminders.
+
+Calendars are built as generators of CRLF terminated byte strings so they
+can be streamed without holding the whole calendar in memory.
+"""
+import pytz
+
+PRODID = '-//remindmelatr//Reminders//EN'
+
+FREQUENCIES = {
+    1: 'MINUTELY',
+    2: 'HOURLY',
+    3: 'DAILY',
+    4: 'MONTHLY',
+    5: 'YEARLY',
+}
+
+
+def escape(text):
+    """
+    Escape a TEXT property value
+    """
+    return (text.replace('\\', '\\\\').replace(';', '\\;')
+                .replace(',', '\\,').replace('\r\n', '\\n')
+                .replace('\n', '\\n'))
+
+
+def fold(line, limit=75):
+    """
+    Encode a content line as utf-8, folding it into lines of at most
+    `limit` octets without splitting a character
+    """
+    data = line.encode('utf-8')
+    lines = []
+    while len(data) > limit:
+        cut = limit if not lines else limit - 1
+        # Don't cut in the middle of a multibyte character
+        while cut > 0 and (ord(data[cut]) & 0xC0) == 0x80:
+            cut -= 1
+        lines.append(data[:cut])
+        data = data[cut:]
+    lines.append(data)
+    return '\r\n '.join(lines) + '\r\n'
+
+
+def format_datetime(dt):
+    return dt.astimezone(pytz.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def dtstart(reminder):
+    """
+    The DTSTART property. Recurring reminders repeat on the owner's wall
+    clock (see Reminder.occurrence_time), so their start is given in the
+    owner's timezone for clients to expand the RRULE in it too.
+    """
+    start = reminder.full_start_datetime
+    if not reminder.is_recurring() or reminder.user.timezone is None:
+        return 'DTSTART:%s' % format_datetime(start)
+    tz = reminder.user_timezone()
+    return 'DTSTART;TZID=%s:%s' % (
+        tz.zone, start.astimezone(tz).strftime('%Y%m%dT%H%M%S')
+    )
+
+
+def rrule(reminder):
+    """
+    The RRULE for a recurring reminder, None if it doesn't recur again
+    """
+    if not reminder.is_recurring():
+        return None
+    rule = 'FREQ=%s;INTERVAL=%d' % (
+        FREQUENCIES[reminder.interval_type], reminder.interval_value
+    )
+    if reminder.max_recurrances:
+        # DTSTART is the next occurrence, count the ones left from there
+        remaining = reminder.max_recurrances - reminder.total_reminders
+        if remaining < 1:
+            return None
+        rule += ';COUNT=%d' % remaining
+    elif reminder.scheduled_end_date is not None:
+        rule += ';UNTIL=%s' % format_datetime(reminder.scheduled_end_date)
+    return rule
+
+
+def event(reminder, domain):
+    """
+    The content lines of the VEVENT for a reminder
+    """
+    lines = [
+        'BEGIN:VEVENT',
+        'UID:reminder-%d@%s' % (reminder.id, domain),
+        'DTSTAMP:%s' % format_datetime(reminder.last_update),
+        dtstart(reminder),
+        'SUMMARY:%s' % escape(reminder.short_content()),
+        'DESCRIPTION:%s' % escape(reminder.content),
+        'URL:https://%s%s' % (domain, reminder.get_absolute_url()),
+    ]
+    rule = rrule(reminder)
+    if rule is not None:
+        lines.append('RRULE:%s' % rule)
+    lines.extend([
+        'BEGIN:VALARM',
+        'ACTION:DISPLAY',
+        'DESCRIPTION:%s' % escape(reminder.short_content()),
+        'TRIGGER:PT0S',
+        'END:VALARM',
+        'END:VEVENT',
+    ])
+    return lines
+
+
+def calendar(reminders, domain, name=None):
+    """
+    Yield a VCALENDAR holding an event for each of `reminders`
+    """
+    header = ['BEGIN:VCALENDAR', 'VERSION:2.0', 'PRODID:%s' % PRODID]
+    if name is not None:
+        header.append('X-WR-CALNAME:%s' % escape(name))
+    yield ''.join(fold(line) for line in header)
+    for reminder in reminders:
+        yield ''.join(fold(line) for line in event(reminder, domain))
+    yield fold('END:VCALENDAR')
@@ -0,0 +1,164 @@
+"""
+Bulk import of reminders from quick add text or CSV.
+
+Lines are parsed and validated a batch at a time and each batch is
+written with a handful of queries: one bulk insert of the reminders, one
+query for their ids and one bulk insert of their history entries.
+
+Text imports have one quick add reminder per line, e.g. 'call mum 6pm
+tomorrow'. CSV imports have a header row with a 'content' column and
+optional 'date' (YYYY-MM-DD) and 'time' (HH:MM) columns in the user's
+timezone. Rows without a date and time have their content parsed as
+quick add text.
+"""
+import csv
+from datetime import datetime
+
+import pytz
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.crypto import get_random_string
+
+from utils.reminder_parser import parse_reminder
+from . import feed
+from .models import HISTORY_FIELDS, Reminder, ReminderHistory
+from .signals import notify_scheduler_of
+
+
+def text_rows(lines):
+    """
+    (line number, content, date, time) for each non blank line of text
+    """
+    for number, line in enumerate(lines, 1):
+        if isinstance(line, str):
+            line = line.decode('utf-8')
+        line = line.strip()
+        if line:
+            yield number, line, None, None
+
+
+def csv_rows(lines):
+    """
+    (line number, content, date, time) for each row of a CSV with a header
+    """
+    reader = csv.DictReader(line.encode('utf-8') if isinstance(line, unicode)
+                            else line for line in lines)
+    if 'content' not in (reader.fieldnames or []):
+        raise ValueError('CSV imports need a content column')
+    for row in reader:
+        values = dict(
+            (k, (v or '').decode('utf-8').strip()) for k, v in row.items()
+            if k is not None
+        )
+        if values['content']:
+            yield (reader.line_num, values['content'],
+                   values.get('date') or None, values.get('time') or None)
+
+
+FORMATS = {
+    'text': text_rows,
+    'csv': csv_rows,
+}
+
+
+class ReminderImporter(object):
+
+    def __init__(self, user, batch_size=None):
+        self.user = user
+        if user.timezone is not None:
+            self.usertz = pytz.timezone(user.timezone.name)
+        else:
+            self.usertz = pytz.timezone(timezone.get_current_timezone_name())
+        self.batch_size = batch_size or settings.REMINDER_IMPORT_BATCH_SIZE
+        self.created = 0
+        self.errors = []
+
+    def parse(self, content, date, time):
+        """
+        The UTC start and content of a reminder, raises ValueError with a
+        message for the user if it isn't valid
+        """
+        if date is None or time is None:
+            return parse_reminder(content, self.usertz)
+        try:
+            start = self.usertz.localize(
+                datetime.strptime('%s %s' % (date, time), '%Y-%m-%d %H:%M')
+            )
+        except ValueError:
+            raise ValueError('Dates should look like 2014-01-31 and times 13:30')
+        if start <= datetime.now(self.usertz):
+            raise ValueError('Please pick a date in the future')
+        return start.astimezone(pytz.timezone('UTC')), content
+
+    def build(self, start, content, now):
+        return Reminder(
+            user=self.user, content=content,
+            start_date=start.date(), start_time=start.time(),
+            full_start_datetime=start,
+            hash_digest=get_random_string(20), last_update=now,
+        )
+
+    def history_entry(self, reminder, now):
+        entry = ReminderHistory(
+            reminder_id=reminder.id, description='Reminder imported.',
+            created=now, modified=now
+        )
+        for field in HISTORY_FIELDS:
+            setattr(entry, field, getattr(reminder, field))
+        return entry
+
+    def write(self, reminders, now):
+        """
+        Insert a batch of reminders and their history entries
+        """
+        with transaction.atomic():
+            Reminder.objects.bulk_create(reminders)
+            # bulk_create doesn't give us the ids on every database
+            ids = dict(Reminder.objects.filter(
+                hash_digest__in=[r.hash_digest for r in reminders]
+            ).values_list('hash_digest', 'id'))
+            for reminder in reminders:
+                reminder.id = ids[reminder.hash_digest]
+            ReminderHistory.objects.bulk_insert(
+                [self.history_entry(r, now) for r in reminders]
+            )
+        self.created += len(reminders)
+        notify_scheduler_of(ids.values())
+
+    def run(self, rows):
+        """
+        Import (line number, content, date, time) rows, returns the number
+        of reminders created. Rows that can't be imported are skipped and
+        recorded in self.errors.
+        """
+        batch = []
+        for number, content, date, time in rows:
+            try:
+                batch.append(self.parse(content, date, time))
+            except ValueError as e:
+                self.errors.append((number, str(e)))
+            if len(batch) >= self.batch_size:
+                self.flush(batch)
+                batch = []
+        self.flush(batch)
+        return self.created
+
+    def flush(self, batch):
+        if not batch:
+            return
+        now = datetime.now(pytz.timezone('UTC'))
+        self.write([self.build(start, content, now)
+                    for start, content in batch], now)
+        feed.changed(self.user.id)
+
+
+def import_reminders(user, lines, import_format='text', batch_size=None):
+    """
+    Import reminders for a user from lines of text or CSV, returns the
+    importer holding the number created and any errors
+    """
+    importer = ReminderImporter(user, batch_size=batch_size)
+    importer.run(FORMATS[import_format](lines))
+    return importer
@@ -0,0 +1,89 @@
+"""
+Shard ownership for scheduler nodes.
+
+Every node heartbeats a SchedulerNode row and holds SchedulerLease rows for
+the shards it schedules. Each round a node works out its fair share of the
+shards from the number of live nodes, gives back any it holds over that and
+takes free or expired shards up to it. A node that dies stops renewing, its
+leases expire and the survivors pick its shards up on their next round.
+"""
+import math
+import os
+import socket
+from datetime import datetime, timedelta
+
+import pytz
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from .models import SchedulerLease, SchedulerNode
+
+
+def default_node_name():
+    return '%s:%s' % (socket.gethostname(), os.getpid())
+
+
+class ShardCoordinator(object):
+
+    def __init__(self, name=None, shards=None, lease_time=None):
+        self.name = name or default_node_name()
+        self.shards = shards or settings.REMINDER_SCHEDULER_SHARDS
+        self.lease_time = timedelta(
+            seconds=lease_time or settings.REMINDER_SCHEDULER_LEASE
+        )
+
+    def heartbeat(self, now, expires):
+        updated = SchedulerNode.objects.filter(name=self.name).update(
+            expires=expires
+        )
+        if not updated:
+            try:
+                with transaction.atomic():
+                    SchedulerNode.objects.create(
+                        name=self.name, expires=expires
+                    )
+            except IntegrityError:
+                pass
+        SchedulerNode.objects.filter(expires__lt=now).delete()
+
+    def fair_share(self, now):
+        nodes = SchedulerNode.objects.filter(expires__gte=now).count()
+        return int(math.ceil(self.shards / float(max(nodes, 1))))
+
+    def rebalance(self, now=None):
+        """
+        Renew, give back and take leases. Returns the shards now owned.
+        """
+        if now is None:
+            now = datetime.now(pytz.timezone('UTC'))
+        expires = now + self.lease_time
+
+        self.heartbeat(now, expires)
+        share = self.fair_share(now)
+        owned = SchedulerLease.objects.renew(self.name, expires, now)
+
+        if len(owned) > share:
+            SchedulerLease.objects.release(self.name, owned[share:])
+            owned = owned[:share]
+
+        for shard in range(self.shards):
+            if len(owned) >= share:
+                break
+            if shard in owned:
+                continue
+            try:
+                with transaction.atomic():
+                    acquired = SchedulerLease.objects.acquire(
+                        shard, self.name, expires, now
+                    )
+            except IntegrityError:
+                acquired = False
+            if acquired:
+                owned.append(shard)
+
+        return sorted(owned)
+
+    def stop(self):
+        SchedulerLease.objects.release(self.name)
+        SchedulerNode.objects.filter(name=self.name).delete()
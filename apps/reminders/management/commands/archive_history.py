@@ -0,0 +1,26 @@
+from datetime import datetime, timedelta
+
+import pytz
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from reminders.models import ReminderHistory
+
+
+class Command(BaseCommand):
+    help = 'Move old reminder history entries into the archive table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.REMINDER_HISTORY_ARCHIVE_DAYS,
+            help='Archive entries older than this many days'
+        )
+
+    def handle(self, *args, **options):
+        before = datetime.now(pytz.timezone('UTC')) - timedelta(
+            days=options['days']
+        )
+        print 'Archiving history entries created before %s' % before
+        moved = ReminderHistory.objects.archive(before)
+        print 'Archived %s history entries' % moved
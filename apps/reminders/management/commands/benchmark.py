@@ -0,0 +1,222 @@
+import json
+import os
+import subprocess
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from accounts.models import LocalUser
+from api import middleware, renderers
+from api.renderers import FastJSONRenderer
+from api.serializers import ReminderSerializer
+from api.views import reminder_list
+from reminders import tasks
+from reminders.models import Reminder
+from utils.date_parser import match_date
+from utils.time_parser import match_time
+
+
+class Rollback(Exception):
+    pass
+
+
+def summarise(samples):
+    """
+    Summary statistics of a list of timings in milliseconds
+    """
+    samples = sorted(samples)
+    count = len(samples)
+    return {
+        'runs': count,
+        'mean_ms': round(sum(samples) / count, 4),
+        'p50_ms': round(samples[count / 2], 4),
+        'p95_ms': round(samples[min(count - 1, int(count * 0.95))], 4),
+        'max_ms': round(samples[-1], 4),
+    }
+
+
+def timed(func, runs):
+    samples = []
+    for i in range(runs):
+        start = time.time()
+        func()
+        samples.append((time.time() - start) * 1000)
+    return samples
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the scheduler, parsers and API and save the results'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=10)
+        parser.add_argument('--parser-runs', type=int, default=1000)
+        parser.add_argument(
+            '--output', default=None,
+            help='Results file, defaults to benchmarks/<timestamp>.json'
+        )
+        parser.add_argument(
+            '--compare', default=None,
+            help='Earlier results file to compare against'
+        )
+
+    def handle(self, *args, **options):
+        results = {
+            'created': datetime.utcnow().isoformat(),
+            'revision': self.revision(),
+            'users': LocalUser.objects.count(),
+            'reminders': Reminder.objects.count(),
+            'benchmarks': {},
+        }
+        benchmarks = results['benchmarks']
+
+        benchmarks['scheduler_tick'], dispatched = self.bench_scheduler(
+            options['runs']
+        )
+        tick = benchmarks['scheduler_tick']['mean_ms']
+        benchmarks['dispatch_throughput'] = {
+            'dispatched': dispatched,
+            'per_second': round(dispatched / (tick / 1000), 2) if tick else 0,
+        }
+        benchmarks['match_date'] = self.bench_parser(
+            match_date, options['parser_runs']
+        )
+        benchmarks['match_time'] = self.bench_parser(
+            match_time, options['parser_runs']
+        )
+        benchmarks['api_reminder_list'] = self.bench_api(options['runs'])
+        (benchmarks['api_encode_json'], benchmarks['api_encode_fast'],
+         benchmarks['api_payload']) = self.bench_payload(options['runs'])
+
+        output = options['output'] or os.path.join(
+            'benchmarks', '%s.json' % datetime.utcnow().strftime('%Y%m%d%H%M%S')
+        )
+        directory = os.path.dirname(output)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        with open(output, 'w') as fp:
+            json.dump(results, fp, indent=2, sort_keys=True)
+
+        for name, result in sorted(benchmarks.items()):
+            print '%-20s %s' % (name, result)
+        print 'Results written to %s' % output
+
+        if options['compare']:
+            self.compare(options['compare'], benchmarks)
+
+    def revision(self):
+        try:
+            return subprocess.check_output(
+                ['git', 'rev-parse', 'HEAD'], cwd=str(settings.PROJECT_ROOT),
+                stderr=subprocess.STDOUT
+            ).strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def bench_scheduler(self, runs):
+        """
+        Time scheduler ticks against the current backlog without the send
+        rate limit. Nothing is queued and the claims are rolled back after
+        each tick.
+        """
+        run_reminder = tasks.run_reminder
+        dispatched = []
+
+        class DryRun(object):
+            def delay(self, *args):
+                pass
+
+            def apply_async(self, *args, **kwargs):
+                pass
+
+        def tick():
+            try:
+                with transaction.atomic():
+                    dispatched.append(tasks.scheduler())
+                    raise Rollback
+            except Rollback:
+                pass
+
+        tasks.run_reminder = DryRun()
+        try:
+            with override_settings(REMINDER_SEND_RATE=None):
+                samples = timed(tick, runs)
+        finally:
+            tasks.run_reminder = run_reminder
+        return summarise(samples), max(dispatched)
+
+    def bench_parser(self, parser, runs):
+        terms = [term.lower() for term in settings.DEMO_REMINDERS]
+
+        def parse():
+            for term in terms:
+                parser(term)
+
+        # Per call, not per pass over the terms
+        return summarise(
+            [ms / len(terms) for ms in timed(parse, runs)]
+        )
+
+    def bench_api(self, runs):
+        user = LocalUser.objects.order_by('-id').first()
+        if user is None:
+            return None
+        factory = APIRequestFactory()
+
+        def request():
+            req = factory.get('/api/reminders/')
+            force_authenticate(req, user=user)
+            reminder_list(req).render()
+
+        return summarise(timed(request, runs))
+
+    def bench_payload(self, runs):
+        """
+        Time encoding a user's reminder list with the standard and fast
+        renderers, and measure its size on the wire with each compression
+        """
+        user = LocalUser.objects.order_by('-id').first()
+        if user is None:
+            return None, None, None
+        reminders = list(Reminder.objects.filter(user=user))
+        for reminder in reminders:
+            reminder.user = user
+        data = ReminderSerializer(reminders, many=True).data
+        content = JSONRenderer().render(data)
+
+        compression = middleware.CompressionMiddleware()
+        payload = {'json_bytes': len(content)}
+        encodings = ['gzip'] + (['br'] if middleware.brotli else [])
+        for encoding in encodings:
+            payload['%s_bytes' % encoding] = len(
+                compression.compress(content, encoding)
+            )
+            payload['%s_ms' % encoding] = summarise(timed(
+                lambda: compression.compress(content, encoding), runs
+            ))['mean_ms']
+
+        fast = summarise(timed(lambda: FastJSONRenderer().render(data), runs))
+        # FastJSONRenderer falls back to JSONRenderer without ujson
+        fast['encoder'] = 'ujson' if renderers.ujson else 'json'
+        return (
+            summarise(timed(lambda: JSONRenderer().render(data), runs)),
+            fast,
+            payload,
+        )
+
+    def compare(self, path, benchmarks):
+        with open(path) as fp:
+            previous = json.load(fp)['benchmarks']
+        print 'Compared with %s' % path
+        for name, result in sorted(benchmarks.items()):
+            before = previous.get(name) or {}
+            if result and 'mean_ms' in result and 'mean_ms' in before:
+                change = (result['mean_ms'] - before['mean_ms']) \
+                    / (before['mean_ms'] or 1) * 100
+                print '%-20s %+.1f%%' % (name, change)
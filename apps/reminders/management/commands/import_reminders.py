@@ -0,0 +1,45 @@
+import io
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import LocalUser
+from reminders.importer import FORMATS, import_reminders
+
+
+class Command(BaseCommand):
+    help = 'Import reminders for a user from quick add text or CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('email', help='Email address of the user')
+        parser.add_argument('path', help='File to import from')
+        parser.add_argument('--format', default='text',
+                            choices=sorted(FORMATS),
+                            help='One reminder per line or CSV')
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Lines parsed and inserted at a time')
+
+    def handle(self, *args, **options):
+        try:
+            user = LocalUser.objects.select_related('timezone').get(
+                email=options['email']
+            )
+        except LocalUser.DoesNotExist:
+            raise CommandError('No user with email %s' % options['email'])
+
+        started = time.time()
+        with io.open(options['path'], 'rb') as lines:
+            try:
+                importer = import_reminders(
+                    user, lines, options['format'], options['batch_size']
+                )
+            except ValueError as e:
+                raise CommandError(str(e))
+        elapsed = time.time() - started
+
+        for line, error in importer.errors:
+            print 'Line %s: %s' % (line, error)
+        print 'Imported %s reminders in %.2fs (%d/s), skipped %s lines' % (
+            importer.created, elapsed, importer.created / max(elapsed, 0.001),
+            len(importer.errors)
+        )
@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from reminders.daemon import WheelScheduler
+from reminders.leases import ShardCoordinator
+
+
+class Command(BaseCommand):
+    help = 'Run the timing wheel reminder scheduler'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--name', default=None,
+            help='Name of this scheduler node, defaults to host:pid'
+        )
+
+    def handle(self, *args, **options):
+        if settings.REMINDER_SCHEDULER != 'daemon':
+            self.stderr.write(
+                "REMINDER_SCHEDULER isn't 'daemon', the beat scheduler task "
+                "is still polling and changes aren't being notified"
+            )
+        coordinator = ShardCoordinator(name=options['name'])
+        print 'Starting reminder scheduler %s' % coordinator.name
+        try:
+            WheelScheduler(coordinator=coordinator).run()
+        except KeyboardInterrupt:
+            print 'Reminder scheduler stopped'
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from reminders import history
+from reminders.sender import ConcurrentSender
+
+
+class Command(BaseCommand):
+    help = 'Send due reminders from a pool of threads'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=None,
+                            help='Sends in flight at once')
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Reminders claimed at a time')
+
+    def handle(self, *args, **options):
+        sender = ConcurrentSender(
+            concurrency=options['concurrency'],
+            batch_size=options['batch_size'],
+        )
+        print 'Starting reminder sender with %s threads' % sender.concurrency
+        try:
+            while True:
+                if not sender.run_once():
+                    time.sleep(1)
+        except KeyboardInterrupt:
+            print 'Reminder sender stopped'
+        finally:
+            sender.close()
+            history.flush()
@@ -0,0 +1,155 @@
+import random
+import re
+from datetime import datetime, timedelta
+
+import pytz
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.crypto import get_random_string
+
+from rest_framework.authtoken.models import Token
+
+from accounts.models import LocalUser
+from reminders.models import Reminder
+from timezones.models import Timezone
+
+# Rough share of users per timezone, the rest are spread over all of them
+TIMEZONE_WEIGHTS = (
+    ('Europe/London', 30),
+    ('America/New_York', 20),
+    ('America/Los_Angeles', 10),
+    ('Europe/Berlin', 10),
+    ('Australia/Sydney', 5),
+    ('Asia/Kolkata', 5),
+)
+
+# Most people ask to be reminded on the hour or half hour, mostly during
+# the day and with peaks at 9am and 6pm
+HOUR_WEIGHTS = [1] * 7 + [4, 8, 20, 6, 4, 6, 4, 4, 4, 4, 6, 12, 6, 4, 3, 2, 1]
+
+
+class Command(BaseCommand):
+    help = 'Seed users and reminders in bulk for load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--reminders', type=int, default=20,
+                            help='Reminders per user')
+        parser.add_argument('--days', type=int, default=30,
+                            help='Spread reminders over this many days')
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--prefix', default='load',
+                            help='Username prefix of the seeded users')
+        parser.add_argument('--start', type=int, default=None,
+                            help='Number of the first seeded user, defaults '
+                                 'to after the highest already seeded')
+        parser.add_argument('--seed', type=int, default=None)
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.timezones = self.load_timezones()
+        self.password = make_password('password')
+        self.now = datetime.now(pytz.timezone('UTC'))
+
+        prefix = options['prefix']
+        start = options['start']
+        if start is None:
+            start = self.next_number(prefix)
+        batch_size = options['batch_size']
+        users = options['users']
+
+        created = 0
+        while created < users:
+            count = min(batch_size, users - created)
+            with transaction.atomic():
+                seeded = self.create_users(prefix, start + created, count)
+                self.create_reminders(
+                    seeded, options['reminders'], options['days'], batch_size
+                )
+            created += count
+            print 'Seeded %s/%s users' % (created, users)
+
+    def next_number(self, prefix):
+        """
+        The number after the highest of the users already seeded with
+        `prefix`, 0 if there aren't any
+        """
+        pattern = r'^%s(\d+)$' % re.escape(prefix)
+        usernames = LocalUser.objects.filter(
+            username__regex=pattern
+        ).values_list('username', flat=True)
+        numbers = [int(re.match(pattern, u).group(1)) for u in usernames]
+        return max(numbers) + 1 if numbers else 0
+
+    def load_timezones(self):
+        timezones = dict(
+            (tz.name, tz) for tz in Timezone.objects.all()
+        )
+        if not timezones:
+            raise CommandError('Load the timezones fixture first')
+        weighted = []
+        for name, weight in TIMEZONE_WEIGHTS:
+            if name in timezones:
+                weighted.extend([timezones[name]] * weight)
+        rest = len(weighted) / 4 or 1
+        weighted.extend(self.random.sample(
+            timezones.values(), min(rest, len(timezones))
+        ))
+        return weighted
+
+    def create_users(self, prefix, first, count):
+        usernames = ['%s%s' % (prefix, i) for i in range(first, first + count)]
+        LocalUser.objects.bulk_create([
+            LocalUser(
+                username=username, email='%s@example.com' % username,
+                password=self.password, is_new=False,
+                show_welcome_message=False,
+                timezone=self.random.choice(self.timezones),
+            ) for username in usernames
+        ])
+        # Bulk inserts skip the post_save that creates auth tokens
+        users = list(
+            LocalUser.objects.filter(username__in=usernames)
+            .select_related('timezone')
+        )
+        Token.objects.bulk_create([
+            Token(user=user, key=Token().generate_key()) for user in users
+        ])
+        return users
+
+    def start_datetime(self, tz, days):
+        hour = self.weighted_hour()
+        minute = self.random.choice([0] * 6 + [30] * 2 + [15, 45]) \
+            if self.random.random() < 0.9 else self.random.randint(0, 59)
+        day = self.now.date() + timedelta(
+            days=self.random.randint(-1, days)
+        )
+        local = tz.localize(
+            datetime(day.year, day.month, day.day, hour, minute)
+        )
+        return local.astimezone(pytz.timezone('UTC'))
+
+    def weighted_hour(self):
+        pick = self.random.uniform(0, sum(HOUR_WEIGHTS))
+        for hour, weight in enumerate(HOUR_WEIGHTS):
+            pick -= weight
+            if pick <= 0:
+                return hour
+        return 23
+
+    def create_reminders(self, users, per_user, days, batch_size):
+        reminders = []
+        for user in users:
+            tz = pytz.timezone(user.timezone.name)
+            for i in range(per_user):
+                start = self.start_datetime(tz, days)
+                reminders.append(Reminder(
+                    user=user, content='Load test reminder %s' % i,
+                    status=2, start_date=start.date(),
+                    start_time=start.time(), full_start_datetime=start,
+                    hash_digest=get_random_string(20),
+                    last_update=self.now,
+                ))
+        Reminder.objects.bulk_create(reminders, batch_size=batch_size)
@@ -0,0 +1,106 @@
+"""
+Delivery metrics.
+
+Metrics are handed to the sink named by REMINDER_METRICS_SINK, or dropped
+when it isn't set:
+
+    reminders.metrics.LogSink     - logged at DEBUG to reminders.metrics
+    reminders.metrics.StatsdSink  - sent over UDP to REMINDER_STATSD_HOST
+    reminders.metrics.MemorySink  - kept in memory, for tests
+
+Timings and latencies are in milliseconds and are sent as statsd timers,
+which the statsd server aggregates into histograms.
+"""
+import logging
+import socket
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+_sink = None
+
+
+class LogSink(object):
+
+    def send(self, kind, name, value):
+        logger.debug('%s %s %s', kind, name, value)
+
+
+class StatsdSink(object):
+    TYPES = {'timing': 'ms', 'incr': 'c', 'gauge': 'g'}
+
+    def __init__(self):
+        self.address = (
+            settings.REMINDER_STATSD_HOST, settings.REMINDER_STATSD_PORT
+        )
+        self.prefix = settings.REMINDER_STATSD_PREFIX
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def send(self, kind, name, value):
+        data = '%s.%s:%s|%s' % (self.prefix, name, value, self.TYPES[kind])
+        try:
+            self.socket.sendto(data.encode('utf-8'), self.address)
+        except socket.error:
+            # Metrics must never get in the way of delivery
+            pass
+
+
+class MemorySink(object):
+
+    def __init__(self):
+        self.records = []
+
+    def send(self, kind, name, value):
+        self.records.append((kind, name, value))
+
+    def values(self, name):
+        return [value for kind, n, value in self.records if n == name]
+
+
+def get_sink():
+    global _sink
+    if _sink is None:
+        path = settings.REMINDER_METRICS_SINK
+        _sink = import_string(path)() if path else None
+    return _sink
+
+
+@receiver(setting_changed)
+def reset_sink(sender, setting, **kwargs):
+    global _sink
+    if setting.startswith('REMINDER_METRICS') or \
+            setting.startswith('REMINDER_STATSD'):
+        _sink = None
+
+
+def _send(kind, name, value):
+    sink = get_sink()
+    if sink is not None:
+        sink.send(kind, name, value)
+
+
+def timing(name, ms):
+    _send('timing', name, int(round(ms)))
+
+
+def incr(name, count=1):
+    _send('incr', name, count)
+
+
+def gauge(name, value):
+    _send('gauge', name, value)
+
+
+@contextmanager
+def timer(name):
+    start = time.time()
+    try:
+        yield
+    finally:
+        timing(name, (time.time() - start) * 1000)
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9 on 2026-10-19 06:00
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reminders', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedReminderHistory',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('created', models.DateTimeField()),
+                ('modified', models.DateTimeField()),
+                ('deleted', models.BooleanField(default=False)),
+                ('internal', models.BooleanField(default=False)),
+                ('description', models.TextField()),
+                ('status', models.IntegerField(choices=[(1, b'Paused'), (2, b'Live'), (3, b'Snoozed'), (4, b'Overdue'), (5, b'Completed'), (6, b'Cancelled'), (7, b'Deleted')])),
+                ('content', models.TextField()),
+                ('snooze_count', models.IntegerField(default=0)),
+                ('total_reminders', models.IntegerField(default=0)),
+                ('total_snoozes', models.IntegerField(default=0)),
+                ('full_start_datetime', models.DateTimeField()),
+                ('extra_info', models.TextField(blank=True, null=True)),
+                ('reminder', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_history', to='reminders.Reminder')),
+            ],
+            options={
+                'ordering': ('-created',),
+                'db_table': 'remindmelatr_reminderhistory_archive',
+            },
+        ),
+    ]
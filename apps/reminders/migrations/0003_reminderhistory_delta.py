@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9 on 2026-10-19 06:03
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reminders', '0002_reminderhistory_archive'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='archivedreminderhistory',
+            options={'ordering': ('-created', '-id')},
+        ),
+        migrations.AlterModelOptions(
+            name='reminderhistory',
+            options={'ordering': ('-created', '-id')},
+        ),
+        migrations.AlterField(
+            model_name='archivedreminderhistory',
+            name='content',
+            field=models.TextField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='archivedreminderhistory',
+            name='full_start_datetime',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='archivedreminderhistory',
+            name='snooze_count',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='archivedreminderhistory',
+            name='status',
+            field=models.IntegerField(choices=[(1, b'Paused'), (2, b'Live'), (3, b'Snoozed'), (4, b'Overdue'), (5, b'Completed'), (6, b'Cancelled'), (7, b'Deleted')], null=True),
+        ),
+        migrations.AlterField(
+            model_name='archivedreminderhistory',
+            name='total_reminders',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='archivedreminderhistory',
+            name='total_snoozes',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='reminderhistory',
+            name='content',
+            field=models.TextField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='reminderhistory',
+            name='full_start_datetime',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='reminderhistory',
+            name='snooze_count',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='reminderhistory',
+            name='status',
+            field=models.IntegerField(choices=[(1, b'Paused'), (2, b'Live'), (3, b'Snoozed'), (4, b'Overdue'), (5, b'Completed'), (6, b'Cancelled'), (7, b'Deleted')], null=True),
+        ),
+        migrations.AlterField(
+            model_name='reminderhistory',
+            name='total_reminders',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='reminderhistory',
+            name='total_snoozes',
+            field=models.IntegerField(null=True),
+        ),
+    ]
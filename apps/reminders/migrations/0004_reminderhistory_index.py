@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9 on 2026-10-19 06:05
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reminders', '0003_reminderhistory_delta'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='archivedreminderhistory',
+            index_together=set([('reminder', 'internal', 'created')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='reminderhistory',
+            index_together=set([('reminder', 'internal', 'created')]),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9 on 2026-10-19 06:10
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reminders', '0004_reminderhistory_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReminderOccurrence',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.IntegerField()),
+                ('fire_at', models.DateTimeField()),
+            ],
+            options={
+                'ordering': ('fire_at',),
+                'db_table': 'remindmelatr_reminderoccurrence',
+            },
+        ),
+        migrations.AlterField(
+            model_name='reminder',
+            name='full_start_datetime',
+            field=models.DateTimeField(db_index=True),
+        ),
+        migrations.AddField(
+            model_name='reminderoccurrence',
+            name='reminder',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='occurrences', to='reminders.Reminder'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='reminderoccurrence',
+            unique_together=set([('reminder', 'number')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='reminderoccurrence',
+            index_together=set([('reminder', 'fire_at')]),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9 on 2026-10-19 06:17
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reminders', '0005_reminderoccurrence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SchedulerLease',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.IntegerField(unique=True)),
+                ('owner', models.CharField(blank=True, default=b'', max_length=255)),
+                ('expires', models.DateTimeField(null=True)),
+            ],
+            options={
+                'db_table': 'remindmelatr_schedulerlease',
+            },
+        ),
+        migrations.CreateModel(
+            name='SchedulerNode',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('expires', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'db_table': 'remindmelatr_schedulernode',
+            },
+        ),
+    ]
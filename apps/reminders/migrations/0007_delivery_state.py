@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9 on 2026-10-19 06:22
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reminders', '0006_schedulerlease'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FailedDelivery',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('modified', models.DateTimeField(auto_now=True)),
+                ('deleted', models.BooleanField(default=False)),
+                ('attempts', models.IntegerField()),
+                ('error', models.TextField()),
+            ],
+            options={
+                'ordering': ('-created',),
+                'db_table': 'remindmelatr_faileddelivery',
+            },
+        ),
+        migrations.AddField(
+            model_name='reminder',
+            name='claimed_at',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AddField(
+            model_name='reminder',
+            name='delivery_attempts',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='reminder',
+            name='next_attempt',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AddField(
+            model_name='faileddelivery',
+            name='reminder',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='failed_deliveries', to='reminders.Reminder'),
+        ),
+    ]
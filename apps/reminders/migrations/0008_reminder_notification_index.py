@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9 on 2026-10-19 06:43
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reminders', '0007_delivery_state'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='reminder',
+            index_together=set([('user', 'status', 'desktop_notification_sent', 'full_start_datetime')]),
+        ),
+    ]
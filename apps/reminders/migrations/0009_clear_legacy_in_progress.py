@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9 on 2026-10-19 09:12
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+def clear_legacy_in_progress(apps, schema_editor):
+    # Reminders sent before claims were tracked were left in progress
+    # without a claim time, they aren't being sent by anyone
+    Reminder = apps.get_model('reminders', 'Reminder')
+    Reminder.objects.filter(
+        in_progress=True, claimed_at=None
+    ).update(in_progress=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reminders', '0008_reminder_notification_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            clear_legacy_in_progress, migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9 on 2026-10-19 09:31
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reminders', '0009_clear_legacy_in_progress'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reminder',
+            name='last_sent',
+            field=models.DateTimeField(null=True),
+        ),
+    ]
@@ -1,9 +1,9 @@
-from datetime import datetime, time, timedelta
+from datetime import datetime, timedelta
 import pytz
 import os
 from email.mime.image import MIMEImage
 
-from django.db import models
+from django.db import connection, models, transaction
 from django.conf import settings
 from django.template import Context
 from django.template.loader import get_template
@@ -17,6 +17,8 @@ from dateutil.relativedelta import *
 
 from base.models import TimeStampedModel
 from accounts.models import LocalUser
+from . import history as history_writer
+from . import metrics
 
 REMINDER_STATUS = (
     (1, 'Paused'),
@@ -46,6 +48,13 @@ WEEKDAYS = {
     6: 'Sunday',
 }
 
+# Reminder fields recorded by history entries. Entries only store the
+# fields that changed since the previous entry, NULL means unchanged.
+HISTORY_FIELDS = (
+    'status', 'content', 'snooze_count', 'total_reminders',
+    'total_snoozes', 'full_start_datetime',
+)
+
 MONTHS = {
     1: 'January',
     2: 'February',
@@ -111,15 +120,72 @@ class ReminderManager(models.Manager):
         return qs
 
     def valid(self, user=None):
+        return self.due(self._current_datetime(), user=user)
+
+    def due(self, until, user=None):
         qs = super(ReminderManager, self).get_queryset().filter(
+            models.Q(next_attempt=None) | models.Q(next_attempt__lte=until),
             deleted=False, status__in=[2,3], in_progress=False,
-            full_start_datetime__lte=self._current_datetime(),
+            full_start_datetime__lte=until,
             completion_date=None
         )
         if user is not None:
             qs = qs.filter(user=user)
         return qs
 
+    def claim(self, reminder_id):
+        """
+        Mark a reminder as in progress, returns False if someone else
+        already has
+        """
+        return super(ReminderManager, self).get_queryset().filter(
+            id=reminder_id, in_progress=False
+        ).update(
+            in_progress=True, claimed_at=datetime.now(pytz.timezone('UTC'))
+        ) == 1
+
+    def stuck(self, before):
+        """
+        Reminders claimed before `before` that were never sent or failed
+        """
+        return super(ReminderManager, self).get_queryset().filter(
+            in_progress=True, claimed_at__lt=before
+        )
+
+    def claim_notifications(self, user, since):
+        """
+        Mark the user's reminders that have gone overdue since `since` as
+        notified, returning them. Recurring reminders move straight on to
+        their next occurrence rather than going overdue, so those sent since
+        `since` are included too. Each reminder is only ever returned once,
+        however many requests ask at the same time.
+        """
+        if connection.vendor == 'postgresql':
+            reminders = list(self.raw(
+                'UPDATE {table} SET desktop_notification_sent = true '
+                'WHERE user_id = %s AND deleted = false '
+                'AND desktop_notification_sent = false '
+                'AND ((status = 4 AND full_start_datetime >= %s) '
+                'OR (status = 2 AND last_sent >= %s)) '
+                'RETURNING *'.format(table=self.model._meta.db_table),
+                [user.id, since, since]
+            ))
+            return sorted(reminders, key=lambda r: r.full_start_datetime)
+
+        qs = super(ReminderManager, self).get_queryset().filter(
+            models.Q(status=4, full_start_datetime__gte=since) |
+            models.Q(status=2, last_sent__gte=since),
+            user=user, deleted=False, desktop_notification_sent=False
+        )
+        with transaction.atomic():
+            reminders = list(qs.select_for_update())
+            qs.filter(
+                id__in=[r.id for r in reminders]
+            ).update(desktop_notification_sent=True)
+        for reminder in reminders:
+            reminder.desktop_notification_sent = True
+        return reminders
+
     def completed(self, user=None):
         qs = super(ReminderManager, self).get_queryset().filter(
             deleted=False, status__in=[5]
@@ -128,6 +194,22 @@ class ReminderManager(models.Manager):
             qs = qs.filter(user=user)
         return qs.order_by('-completion_date')
 
+    def status_counts(self, user):
+        """
+        Number of the user's reminders in each status, from one query
+        """
+        counts = dict(
+            super(ReminderManager, self).get_queryset().filter(
+                user=user, deleted=False
+            ).order_by().values_list('status').annotate(models.Count('id'))
+        )
+        result = dict(
+            (name.lower(), counts.get(value, 0))
+            for value, name in REMINDER_STATUS
+        )
+        result['total'] = sum(counts.values())
+        return result
+
     def paused(self, user=None):
         qs = super(ReminderManager, self).get_queryset().filter(
                      deleted=False, status=1)
@@ -169,20 +251,38 @@ class Reminder(TimeStampedModel):
     next_fire = models.DateTimeField(null=True)
     in_progress = models.BooleanField(default=False)
 
+    # Delivery state, see remind and delivery_failed
+    claimed_at = models.DateTimeField(null=True)
+    delivery_attempts = models.IntegerField(default=0)
+    next_attempt = models.DateTimeField(null=True)
+
     total_reminders = models.IntegerField(default=0)
     total_snoozes = models.IntegerField(default=0)
 
-    full_start_datetime = models.DateTimeField()
+    full_start_datetime = models.DateTimeField(db_index=True)
 
     desktop_notification_sent = models.BooleanField(default=False)
+    # When the reminder was last sent, see claim_notifications
+    last_sent = models.DateTimeField(null=True)
 
     last_update = models.DateTimeField()
 
     objects = ReminderManager()
 
+    # Field values as of the last history entry, None if unknown
+    _history_state = None
+
+    # Per instance caches, see user_timezone and get_human_readable
+    _user_tz = None
+    _human_readable = None
+
     class Meta:
         ordering = ('full_start_datetime',)
         db_table = 'remindmelatr_reminder'
+        index_together = (
+            ('user', 'status', 'desktop_notification_sent',
+             'full_start_datetime'),
+        )
 
     def save(self, *args, **kwargs):
         if self.id is None:
@@ -204,17 +304,22 @@ class Reminder(TimeStampedModel):
         import time
         return int(time.mktime(self.full_start_datetime.timetuple()))
 
+    def user_timezone(self):
+        """
+        The owner's pytz timezone, looked up once per instance
+        """
+        if self._user_tz is None:
+            self._user_tz = pytz.timezone(self.user.timezone.name)
+        return self._user_tz
+
     def localised_start(self):
-        tz = pytz.timezone(self.user.timezone.name)
-        return self.full_start_datetime.astimezone(tz)
+        return self.full_start_datetime.astimezone(self.user_timezone())
 
     def localised_created(self):
-        tz = pytz.timezone(self.user.timezone.name)
-        return self.created.astimezone(tz)
+        return self.created.astimezone(self.user_timezone())
 
     def localised_updated(self):
-        tz = pytz.timezone(self.user.timezone.name)
-        return self.updated.astimezone(tz)
+        return self.updated.astimezone(self.user_timezone())
 
     def soft_delete(self):
         self.deleted = True
@@ -255,19 +360,142 @@ class Reminder(TimeStampedModel):
         self.save()
         self.add_history_entry('Reminder marked as OVERDUE.')
 
+    def is_recurring(self):
+        return self.interval_type is not None and bool(self.interval_value)
+
+    def interval_delta(self, multiple=1):
+        value = self.interval_value * multiple
+        return {
+            1: relativedelta(minutes=value),
+            2: relativedelta(hours=value),
+            3: relativedelta(days=value),
+            4: relativedelta(months=value),
+            5: relativedelta(years=value),
+        }[self.interval_type]
+
+    def occurrence_time(self, anchor, number):
+        """
+        The fire time of the nth occurrence after `anchor`. Worked out on
+        the owner's wall clock so daily reminders keep their local time
+        across daylight saving changes.
+        """
+        tz = self.user_timezone()
+        local = anchor.astimezone(tz).replace(tzinfo=None)
+        local += self.interval_delta(number)
+        return tz.localize(local).astimezone(pytz.timezone('UTC'))
+
+    def first_occurrence_after(self, anchor, after):
+        """
+        The number of the first occurrence after `after`, worked out from
+        the time between them rather than stepping through every occurrence
+        """
+        tz = self.user_timezone()
+        start = anchor.astimezone(tz).replace(tzinfo=None)
+        end = after.astimezone(tz).replace(tzinfo=None)
+        if self.interval_type in (4, 5):
+            months = (end.year - start.year) * 12 + end.month - start.month
+            step = self.interval_value * (12 if self.interval_type == 5 else 1)
+            number = months // step
+        else:
+            step = self.interval_value * {1: 60, 2: 3600, 3: 86400}[
+                self.interval_type
+            ]
+            number = int((end - start).total_seconds() // step)
+        # The estimate is out by at most a daylight saving change or a
+        # short month, settle it on the exact times
+        number = max(number, 0)
+        while self.occurrence_time(anchor, number) <= after:
+            number += 1
+        while number > 0 and self.occurrence_time(anchor, number - 1) > after:
+            number -= 1
+        return number
+
+    def materialize_occurrences(self, after=None, count=None):
+        """
+        Precompute up to `count` further occurrences of a recurring reminder,
+        skipping any at or before `after`. The first occurrence is the
+        original start and anchors the rest of the schedule. Returns the
+        number of occurrences added.
+        """
+        if not self.is_recurring():
+            return 0
+        if count is None:
+            count = settings.REMINDER_OCCURRENCE_BATCH
+
+        occurrences = []
+        last = self.occurrences.order_by('-number').first()
+        if last is None:
+            anchor, number = self.full_start_datetime, 1
+            occurrences.append(
+                ReminderOccurrence(reminder=self, number=0, fire_at=anchor)
+            )
+        else:
+            anchor = self.occurrences.get(number=0).fire_at
+            number = last.number + 1
+        if after is not None and after >= anchor:
+            number = max(number, self.first_occurrence_after(anchor, after))
+
+        while len(occurrences) < count:
+            if self.max_recurrances and number >= self.max_recurrances:
+                break
+            fire_at = self.occurrence_time(anchor, number)
+            if self.scheduled_end_date is not None \
+                    and fire_at > self.scheduled_end_date:
+                break
+            if after is None or fire_at > after:
+                occurrences.append(ReminderOccurrence(
+                    reminder=self, number=number, fire_at=fire_at
+                ))
+            number += 1
+
+        ReminderOccurrence.objects.bulk_create(occurrences)
+        return len(occurrences)
+
+    def next_occurrence(self, after):
+        """
+        The first occurrence after `after`, extending the precomputed
+        schedule when it runs out. None once the recurrence has ended.
+        """
+        occurrence = self.occurrences.filter(fire_at__gt=after).first()
+        if occurrence is None and self.materialize_occurrences(after=after):
+            occurrence = self.occurrences.filter(fire_at__gt=after).first()
+        return occurrence
+
+    def reset_recurrence(self):
+        """
+        Drop the precomputed schedule so it is rebuilt from the current start
+        """
+        self.occurrences.all().delete()
+
     def set_next_fire_time(self):
+        """
+        Move a sent recurring reminder on to its next occurrence. One-off
+        reminders and the last occurrence are left overdue.
+        """
         utc = pytz.timezone('UTC')
-        if self.completion_date <= datetime.now(utc):
-            self.complete()
-        elif self.total_reminders >= self.max_recurrances:
-            self.complete()
-        else:
-            self.next_fire = self.get_interval_timedelta(
-                self.interval_type,
-                self.interval_value
+        now = datetime.now(utc)
+        occurrence = None
+        if self.is_recurring():
+            occurrence = self.next_occurrence(
+                max(now, self.full_start_datetime)
             )
+
+        if occurrence is None:
+            self.next_fire = None
+            self.in_progress = False
+            self.overdue()
+            return
+
+        self.start_date = occurrence.fire_at.date()
+        self.start_time = occurrence.fire_at.time()
+        self.next_fire = occurrence.fire_at
+        self.status = 2
         self.in_progress = False
+        self.desktop_notification_sent = False
+        self.last_update = now
         self.save()
+        on, at = self.get_human_readable()
+        self.add_history_entry('Next reminder set for %s %s.' % (at, on))
 
     def get_interval_timedelta(self, interval_type, interval_value):
         utc = pytz.timezone('UTC')
@@ -280,36 +508,45 @@ class Reminder(TimeStampedModel):
         if interval_type == 3:
             return now + timedelta(days=interval_value)
         if interval_type == 4:
-            return now + relativedelta(months=1)
+            return now + relativedelta(months=interval_value)
         if interval_type == 5:
-            return now + relativedelta(years=1)
+            return now + relativedelta(years=interval_value)
+
+    def get_human_readable(self, now=None):
+        """
+        Describe when the reminder is due relative to `now` in the owner's
+        timezone, e.g. ('tomorrow', '09:00'). The result is cached until the
+        start changes, see prime_human_readable for formatting whole pages.
+        """
+        if self._human_readable is not None \
+                and self._human_readable[0] == self.full_start_datetime:
+            return self._human_readable[1]
 
-    def get_human_readable(self):
         start = self.localised_start()
+        start_date = start.date()
         remind_on = 'on %s' % WEEKDAYS[start.weekday()]
-        remind_at = time.strftime(start.time(), '%H:%M')
-        today = datetime.now(pytz.timezone(self.user.timezone.name))
-        tomorrow = today + timedelta(days=1)
-        if start.date() == today.date():
+        remind_at = start.strftime('%H:%M')
+        if now is None:
+            now = datetime.now(self.user_timezone())
+        today = now.date()
+        if start_date == today:
             remind_on = 'today'
-        elif start.date() == tomorrow.date():
+        elif start_date == today + timedelta(days=1):
             remind_on = 'tomorrow'
-        elif start.date().month > today.date().month \
-                or start.date().year > today.year:
-            remind_on += ' %s %s' % (
-                start.date().day, MONTHS[start.date().month]
-            )
+        elif start_date.month > today.month or start_date.year > today.year:
+            remind_on += ' %s %s' % (start_date.day, MONTHS[start_date.month])
         # if the week is not this week
-        elif today.date().isocalendar()[1] < start.date().isocalendar()[1]:
-            remind_on += ' %s %s' % (
-                start.date().day, MONTHS[start.date().month]
-            )
-        elif start.date() == today.date() - timedelta(days=1):
+        elif today.isocalendar()[1] < start_date.isocalendar()[1]:
+            remind_on += ' %s %s' % (start_date.day, MONTHS[start_date.month])
+        elif start_date == today - timedelta(days=1):
             remind_on = 'yesterday'
 
-        if start.date().year > today.year or start.date().year < today.year:
-            remind_on += ' %s' % start.date().year
+        if start_date.year != today.year:
+            remind_on += ' %s' % start_date.year
 
+        self._human_readable = (
+            self.full_start_datetime, (remind_on, remind_at)
+        )
         return remind_on, remind_at
 
     def success_message(self):
@@ -354,9 +591,23 @@ class Reminder(TimeStampedModel):
 
     def remind(self):
 
-        self.in_progress = True
-        self.save()
+        self.start_sending()
+
+        with metrics.timer('reminder.render'):
+            msg = self.build_message()
 
+        try:
+            with metrics.timer('reminder.send'):
+                msg.send()
+        except Exception as exc:
+            metrics.incr('reminder.send_failed')
+            self.delivery_failed(exc)
+            return
+
+        with metrics.timer('reminder.db'):
+            self.sent()
+
+    def build_message(self):
         html = get_template('email/reminder.html')
         text = get_template('email/reminder.txt')
 
@@ -368,33 +619,42 @@ class Reminder(TimeStampedModel):
             'subject': subject,
         })
 
-        text_content = text.render(context)
-        html_content = html.render(context)
-
-        msg = EmailMultiAlternatives(subject, text_content,
-                                     settings.FROM_EMAIL, [self.user.email])
-        msg.attach_alternative(html_content, 'text/html')
+        return build_email(
+            subject, text.render(context), html.render(context),
+            self.user.email
+        )
 
-        msg.mixed_subtype = 'related'
-        logo_path = settings.EMAIL_LOGO
-        with open(logo_path, 'rb') as fp:
-            msg_img = MIMEImage(fp.read())
-            msg_img.add_header('Content-ID', '<%s>' % (
-               os.path.basename(logo_path)
-            ))
-            msg.attach(msg_img)
+    def start_sending(self):
+        self.in_progress = True
+        if self.claimed_at is None:
+            self.claimed_at = datetime.now(pytz.timezone('UTC'))
+        self.save()
 
-        msg.send()
+    def sent(self, description='Reminder sent.'):
+        """
+        Record a successful send and move on to the next occurrence
+        """
+        # How late the reminder went out
+        late = datetime.now(pytz.timezone('UTC')) - self.full_start_datetime
+        metrics.timing('reminder.latency', late.total_seconds() * 1000)
 
-        self.add_history_entry('Reminder sent.')
+        self.claimed_at = None
+        self.delivery_attempts = 0
+        self.next_attempt = None
+        self.total_reminders += 1
+        self.last_sent = datetime.now(pytz.timezone('UTC'))
+        self.add_history_entry(description)
 
-        self.overdue()
+        self.set_next_fire_time()
 
     def snooze(self, snooze_date, snooze_time):
         self.start_date = snooze_date
         self.start_time = snooze_time
         self.status = 3
         self.in_progress = False
+        self.claimed_at = None
+        self.delivery_attempts = 0
+        self.next_attempt = None
         self.completion_date = None
         self.snooze_count += 1
         self.last_update = datetime.now().replace(tzinfo=pytz.timezone('UTC'))
@@ -402,6 +662,39 @@ class Reminder(TimeStampedModel):
         on, at = self.get_human_readable()
         self.add_history_entry('Reminder snoozed until %s %s.' % (at, on))
 
+    def delivery_failed(self, error):
+        """
+        Record a failed send. The reminder is tried again after an
+        exponential backoff until REMINDER_DELIVERY_MAX_ATTEMPTS is reached,
+        then dead lettered and left overdue.
+        """
+        utc = pytz.timezone('UTC')
+        self.delivery_attempts += 1
+        self.in_progress = False
+        self.claimed_at = None
+
+        if self.delivery_attempts >= settings.REMINDER_DELIVERY_MAX_ATTEMPTS:
+            FailedDelivery.objects.create(
+                reminder=self, attempts=self.delivery_attempts,
+                error=unicode(error)
+            )
+            self.delivery_attempts = 0
+            self.next_attempt = None
+            self.add_history_entry(
+                'Reminder could not be sent.', internal=True,
+                extra=unicode(error)
+            )
+            self.overdue()
+            return
+
+        backoff = min(
+            settings.REMINDER_DELIVERY_BACKOFF *
+            2 ** (self.delivery_attempts - 1),
+            settings.REMINDER_DELIVERY_MAX_BACKOFF
+        )
+        self.next_attempt = datetime.now(utc) + timedelta(seconds=backoff)
+        self.save()
+
     def initial_form_values(self):
         start = self.localised_start()
         return {
@@ -414,42 +707,386 @@ class Reminder(TimeStampedModel):
             self.status = 2
             self.in_progress = False
 
+    def recorded_state(self, depth=20):
+        """
+        The last recorded value of each history field, looking only at the
+        newest `depth` entries. Fields not recorded in those are left out.
+        """
+        state = {}
+        entries = ReminderHistory.objects.filter(reminder=self).order_by(
+            '-created', '-id'
+        ).values(*HISTORY_FIELDS)[:depth]
+        for entry in entries:
+            for field, value in entry.items():
+                if value is not None:
+                    state.setdefault(field, value)
+            if len(state) == len(HISTORY_FIELDS):
+                break
+        return state
+
     def add_history_entry(self, description, internal=False, extra=None):
+        state = dict((f, getattr(self, f)) for f in HISTORY_FIELDS)
+        if self._history_state is None:
+            # Compare with the history rather than the row as loaded, it may
+            # have been saved without an entry since. Anything not found is
+            # recorded again, and while entries may still be on their way to
+            # the database everything is.
+            if history_writer.written():
+                self._history_state = self.recorded_state()
+            else:
+                self._history_state = {}
         r = ReminderHistory(
-            reminder=self, internal=internal,
-            description=description, status=self.status,
-            content=self.content,
-            snooze_count=self.snooze_count,
-            total_reminders=self.total_reminders,
-            total_snoozes=self.total_snoozes,
-            full_start_datetime=self.full_start_datetime
+            reminder=self, internal=internal, description=description
         )
+        for field, value in state.items():
+            if self._history_state.get(field) != value:
+                setattr(r, field, value)
         if extra is not None:
             r.extra_info = extra
-        r.save()
+        history_writer.add(r)
+        self._history_state = state
 
     def history(self, include_internal=False):
         history = ReminderHistory.objects.filter(reminder=self)
+        archived = ArchivedReminderHistory.objects.filter(reminder=self)
         if not include_internal:
             history = history.filter(internal=False)
-        return history
+            archived = archived.filter(internal=False)
+        return QuerySetChain(history, archived)
+
+    def history_page(self, before=None, limit=10, include_internal=False):
+        """
+        Read a page of history entries newest first using the cursor
+        returned for the previous page instead of an offset, reading the
+        archive once the hot table runs out. Returns the entries and the
+        cursor for the next page, None on the last page.
+        """
+        entries = []
+        for model in (ReminderHistory, ArchivedReminderHistory):
+            qs = model.objects.filter(reminder=self)
+            if not include_internal:
+                qs = qs.filter(internal=False)
+            if before is not None:
+                created, pk = before
+                qs = qs.filter(
+                    models.Q(created__lt=created) |
+                    models.Q(created=created, id__lt=pk)
+                )
+            entries.extend(
+                qs.order_by('-created', '-id')[:limit + 1 - len(entries)]
+            )
+            if len(entries) > limit:
+                break
+
+        cursor = None
+        if len(entries) > limit:
+            entries = entries[:limit]
+            cursor = (entries[-1].created, entries[-1].id)
+        return entries, cursor
+
+    def history_state(self, until=None, before=None, fields=HISTORY_FIELDS):
+        """
+        Rebuild the recorded state of the reminder from its history.
+        `until` includes entries created at or before that time, `before`
+        only entries older than the given history entry. Fields without a
+        recorded value are returned as None.
+        """
+        state = {}
+        for field in fields:
+            state[field] = None
+            for model in (ReminderHistory, ArchivedReminderHistory):
+                qs = model.objects.filter(reminder=self).exclude(
+                    **{field: None}
+                ).order_by('-created', '-id')
+                if until is not None:
+                    qs = qs.filter(created__lte=until)
+                if before is not None:
+                    qs = qs.filter(
+                        models.Q(created__lt=before.created) |
+                        models.Q(created=before.created, id__lt=before.id)
+                    )
+                values = qs.values_list(field, flat=True)[:1]
+                if values:
+                    state[field] = values[0]
+                    break
+        return state
+
+    def fill_history(self, entries, fields=('status', 'content')):
+        """
+        Fill in the unchanged fields of a newest first list of history
+        entries. Entries that changed the content get `previous_content`.
+        """
+        entries = sorted(entries, key=lambda h: (h.created, h.id))
+        if not entries:
+            return
+        state = self.history_state(before=entries[0], fields=fields)
+        for entry in entries:
+            entry.previous_content = None
+            if entry.content is not None and state.get('content') \
+                    and entry.content != state['content']:
+                entry.previous_content = state['content']
+            for field in fields:
+                if getattr(entry, field) is None:
+                    setattr(entry, field, state[field])
+                else:
+                    state[field] = getattr(entry, field)
+
+
+def build_email(subject, text_content, html_content, to):
+    """
+    A reminder email with the site logo attached inline
+    """
+    msg = EmailMultiAlternatives(
+        subject, text_content, settings.FROM_EMAIL, [to]
+    )
+    msg.attach_alternative(html_content, 'text/html')
+
+    msg.mixed_subtype = 'related'
+    logo_path = settings.EMAIL_LOGO
+    with open(logo_path, 'rb') as fp:
+        msg_img = MIMEImage(fp.read())
+        msg_img.add_header('Content-ID', '<%s>' % (
+           os.path.basename(logo_path)
+        ))
+        msg.attach(msg_img)
+    return msg
+
+
+def prime_human_readable(reminders, user):
+    """
+    Format a page of reminders belonging to `user`, looking up the
+    timezone and the current time once for the whole page.
+    """
+    tz = pytz.timezone(user.timezone.name)
+    now = datetime.now(tz)
+    for reminder in reminders:
+        reminder.user = user
+        reminder._user_tz = tz
+        reminder.get_human_readable(now=now)
+
+
+class QuerySetChain(object):
+    """
+    Chains querysets together so they can be counted, sliced and
+    paginated as a single list. Querysets are read in the order given.
+    """
+    def __init__(self, *querysets):
+        self.querysets = querysets
+
+    def count(self):
+        return sum(qs.count() for qs in self.querysets)
+
+    def __len__(self):
+        return self.count()
+
+    def __iter__(self):
+        for qs in self.querysets:
+            for item in qs:
+                yield item
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            items = self[index:index + 1]
+            if not items:
+                raise IndexError(index)
+            return items[0]
+
+        start = index.start or 0
+        stop = index.stop
+        items = []
+        for qs in self.querysets:
+            if stop is not None and stop <= 0:
+                break
+            total = qs.count()
+            if start < total:
+                end = total if stop is None else min(stop, total)
+                items.extend(qs[start:end])
+            start = max(start - total, 0)
+            if stop is not None:
+                stop -= total
+        return items
+
+
+class ReminderOccurrence(models.Model):
+    """
+    A precomputed fire time of a recurring reminder
+    """
+    reminder = models.ForeignKey(Reminder, related_name='occurrences')
+    number = models.IntegerField()
+    fire_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'remindmelatr_reminderoccurrence'
+        ordering = ('fire_at',)
+        unique_together = (('reminder', 'number'),)
+        index_together = (('reminder', 'fire_at'),)
+
+
+class ReminderHistoryManager(models.Manager):
+
+    def archive(self, before, batch_size=500):
+        """
+        Move history entries created before `before` into the archive
+        table. Returns the number of entries moved.
+        """
+        moved = 0
+        while True:
+            with transaction.atomic():
+                batch = list(
+                    self.get_queryset().filter(
+                        created__lt=before
+                    ).order_by('id')[:batch_size]
+                )
+                if not batch:
+                    break
+                ArchivedReminderHistory.objects.bulk_create([
+                    ArchivedReminderHistory.from_history(h) for h in batch
+                ])
+                self.get_queryset().filter(
+                    id__in=[h.id for h in batch]
+                ).delete()
+            moved += len(batch)
+        return moved
+
+    def bulk_insert(self, entries, batch_size=500):
+        """
+        Like bulk_create but keeps the created and modified times already
+        set on the entries rather than stamping them at insert time.
+
+        bulk_create always stamps auto_now fields, so this inserts with the
+        private QuerySet._insert(raw=True), which skips pre_save. Check it
+        when upgrading Django past the version pinned in
+        requirements/production.txt; test_buffered_until_flushed covers it.
+        """
+        fields = [
+            f for f in self.model._meta.concrete_fields if not f.primary_key
+        ]
+        with transaction.atomic():
+            for i in range(0, len(entries), batch_size):
+                self._insert(
+                    entries[i:i + batch_size], fields=fields, raw=True
+                )
 
 
 class ReminderHistory(TimeStampedModel):
     """
-    Holds the state of the reminder and a description of the historic event
+    Holds the changes to the reminder and a description of the historic
+    event. See HISTORY_FIELDS and Reminder.history_state
     """
     reminder = models.ForeignKey(Reminder)
     internal = models.BooleanField(default=False)
     description = models.TextField()
-    status = models.IntegerField(choices=REMINDER_STATUS)
-    content = models.TextField()
-    snooze_count = models.IntegerField(default=0)
-    total_reminders = models.IntegerField(default=0)
-    total_snoozes = models.IntegerField(default=0)
-    full_start_datetime = models.DateTimeField()
+    status = models.IntegerField(choices=REMINDER_STATUS, null=True)
+    content = models.TextField(null=True)
+    snooze_count = models.IntegerField(null=True)
+    total_reminders = models.IntegerField(null=True)
+    total_snoozes = models.IntegerField(null=True)
+    full_start_datetime = models.DateTimeField(null=True)
     extra_info = models.TextField(null=True, blank=True)
 
+    objects = ReminderHistoryManager()
+
     class Meta:
         db_table = 'remindmelatr_reminderhistory'
+        index_together = (('reminder', 'internal', 'created'),)
+        ordering = ('-created', '-id')
+
+
+class ArchivedReminderHistory(models.Model):
+    """
+    Cold storage for history entries that have aged out of ReminderHistory.
+    Rows keep the id and timestamps of the entry they were moved from.
+    """
+    id = models.IntegerField(primary_key=True)
+    reminder = models.ForeignKey(Reminder, related_name='archived_history')
+    created = models.DateTimeField()
+    modified = models.DateTimeField()
+    deleted = models.BooleanField(default=False)
+    internal = models.BooleanField(default=False)
+    description = models.TextField()
+    status = models.IntegerField(choices=REMINDER_STATUS, null=True)
+    content = models.TextField(null=True)
+    snooze_count = models.IntegerField(null=True)
+    total_reminders = models.IntegerField(null=True)
+    total_snoozes = models.IntegerField(null=True)
+    full_start_datetime = models.DateTimeField(null=True)
+    extra_info = models.TextField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'remindmelatr_reminderhistory_archive'
+        index_together = (('reminder', 'internal', 'created'),)
+        ordering = ('-created', '-id')
+
+    @classmethod
+    def from_history(cls, history):
+        return cls(**dict(
+            (f.attname, getattr(history, f.attname))
+            for f in cls._meta.concrete_fields
+        ))
+
+
+class SchedulerLeaseManager(models.Manager):
+
+    def acquire(self, shard, owner, expires, now):
+        """
+        Take the lease on a shard if it is free, expired or already ours
+        """
+        self.get_or_create(shard=shard)
+        return self.filter(shard=shard).filter(
+            models.Q(owner=owner) | models.Q(expires__lt=now) |
+            models.Q(expires=None)
+        ).update(owner=owner, expires=expires) == 1
+
+    def renew(self, owner, expires, now):
+        """
+        Extend every unexpired lease held by owner, returning their shards
+        """
+        leases = self.filter(owner=owner, expires__gte=now)
+        shards = sorted(leases.values_list('shard', flat=True))
+        self.filter(owner=owner, shard__in=shards).update(expires=expires)
+        return shards
+
+    def release(self, owner, shards=None):
+        leases = self.filter(owner=owner)
+        if shards is not None:
+            leases = leases.filter(shard__in=shards)
+        return leases.update(owner='', expires=None)
+
+
+class SchedulerNode(models.Model):
+    """
+    A running scheduler, kept alive by a heartbeat
+    """
+    name = models.CharField(max_length=255, unique=True)
+    expires = models.DateTimeField(db_index=True)
+
+    class Meta:
+        db_table = 'remindmelatr_schedulernode'
+
+
+class SchedulerLease(models.Model):
+    """
+    Ownership of one scheduler shard. Reminders belong to the shard
+    user_id % REMINDER_SCHEDULER_SHARDS.
+    """
+    shard = models.IntegerField(unique=True)
+    owner = models.CharField(max_length=255, blank=True, default='')
+    expires = models.DateTimeField(null=True)
+
+    objects = SchedulerLeaseManager()
+
+    class Meta:
+        db_table = 'remindmelatr_schedulerlease'
+
+
+class FailedDelivery(TimeStampedModel):
+    """
+    Dead letter for a reminder that could not be sent
+    """
+    reminder = models.ForeignKey(Reminder, related_name='failed_deliveries')
+    attempts = models.IntegerField()
+    error = models.TextField()
+
+    class Meta:
+        db_table = 'remindmelatr_faileddelivery'
         ordering = ('-created',)
@@ -0,0 +1,135 @@
+"""
+Concurrent reminder sender.
+
+An alternative to running every reminder through its own celery task: the
+sender claims due reminders in batches, renders them, then sends them from
+a pool of REMINDER_SENDER_CONCURRENCY threads so that hundreds of sends can
+wait on the mail server at once. Each thread keeps its mail connection
+open between sends. Rendering and all database work stay on the calling
+thread.
+
+The claims, send rate and digests work as they do for the scheduler, so
+the sender can run alongside it.
+"""
+import threading
+from datetime import datetime
+from multiprocessing.pool import ThreadPool
+
+import pytz
+
+from django.conf import settings
+from django.core.mail import get_connection
+
+from . import governor, history, metrics
+from .digest import build_digest, coalesce
+from .models import Reminder
+
+_local = threading.local()
+
+
+def _mail_connection():
+    if getattr(_local, 'connection', None) is None:
+        _local.connection = get_connection()
+        _local.connection.open()
+    return _local.connection
+
+
+def _send(job):
+    reminders, msg = job
+    try:
+        with metrics.timer('reminder.send'):
+            msg.connection = _mail_connection()
+            msg.send()
+    except Exception as exc:
+        # Start again with a fresh connection
+        connection, _local.connection = _local.connection, None
+        try:
+            connection.close()
+        except Exception:
+            pass
+        return reminders, exc
+    return reminders, None
+
+
+class ConcurrentSender(object):
+
+    def __init__(self, concurrency=None, batch_size=None):
+        self.concurrency = (
+            concurrency or settings.REMINDER_SENDER_CONCURRENCY
+        )
+        self.batch_size = batch_size or settings.REMINDER_SENDER_BATCH
+        self.pool = ThreadPool(self.concurrency)
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+
+    def claim_batch(self):
+        """
+        Claim the oldest due reminders the send rate allows, grouped into
+        messages
+        """
+        reminders = Reminder.objects.valid().select_related(
+            'user__timezone'
+        ).order_by('full_start_datetime')[:self.batch_size]
+        messages = coalesce(list(reminders))
+        granted = governor.take(len(messages))
+        governor.report_backlog(
+            sum(len(message) for message in messages[granted:])
+        )
+
+        now = datetime.now(pytz.timezone('UTC'))
+        claimed = []
+        for message in messages[:granted]:
+            mine = []
+            for r in message:
+                if Reminder.objects.claim(r.id):
+                    r.in_progress = True
+                    r.claimed_at = now
+                    mine.append(r)
+                else:
+                    metrics.incr('scheduler.claim_conflict')
+            if mine:
+                claimed.append(mine)
+        return claimed
+
+    def render(self, reminders):
+        with metrics.timer('reminder.render'):
+            if len(reminders) == 1:
+                return reminders[0].build_message()
+            return build_digest(reminders)
+
+    def finish(self, reminders, error):
+        if error is not None:
+            metrics.incr('reminder.send_failed')
+            for r in reminders:
+                r.delivery_failed(error)
+            return
+
+        description = 'Reminder sent.'
+        if len(reminders) > 1:
+            metrics.incr('reminder.digest')
+            description = 'Reminder sent in a digest.'
+        with metrics.timer('reminder.db'):
+            for r in reminders:
+                r.sent(description)
+
+    def run_once(self):
+        """
+        Send one batch, returning the number of reminders handled
+        """
+        with metrics.timer('sender.batch'):
+            jobs = []
+            for reminders in self.claim_batch():
+                try:
+                    jobs.append((reminders, self.render(reminders)))
+                except Exception as exc:
+                    self.finish(reminders, exc)
+
+            handled = 0
+            for reminders, error in self.pool.imap_unordered(_send, jobs):
+                self.finish(reminders, error)
+                handled += len(reminders)
+        # There's no request or task to flush the batch's history after
+        history.flush()
+        return handled
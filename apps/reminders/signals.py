@@ -0,0 +1,59 @@
+from celery.signals import task_postrun
+
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db import connection, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from reminders import feed, history
+from reminders.models import Reminder
+
+
+@receiver(request_finished, dispatch_uid='reminders.flush_history')
+def flush_history_after_request(sender, **kwargs):
+    history.flush()
+
+
+@task_postrun.connect(dispatch_uid='reminders.flush_history')
+def flush_history_after_task(sender=None, **kwargs):
+    history.flush()
+
+
+@receiver(post_save, sender=Reminder, dispatch_uid='reminders.notify_scheduler')
+def notify_scheduler(sender, instance, **kwargs):
+    """
+    Let a running scheduler know the reminder's due time may have changed
+    """
+    notify_scheduler_of([instance.pk])
+
+
+def notify_scheduler_of(reminder_ids):
+    """
+    Tell a running scheduler about reminders changed without a signal,
+    e.g. by bulk_create
+    """
+    if not reminder_ids or not settings.REMINDER_SCHEDULER_NOTIFY:
+        return
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT pg_notify(%s, id::text) FROM unnest(%s) AS id',
+                [settings.REMINDER_SCHEDULER_CHANNEL, list(reminder_ids)]
+            )
+    else:
+        from reminders.daemon import LocalListener
+        for pk in reminder_ids:
+            LocalListener.notify(pk)
+
+
+@receiver(post_save, sender=Reminder, dispatch_uid='reminders.feed_changed')
+@receiver(post_delete, sender=Reminder, dispatch_uid='reminders.feed_deleted')
+def bump_feed_version(sender, instance, **kwargs):
+    """
+    Invalidate the user's cached calendar feed, and again once the change
+    is committed in case the feed was rendered from before it in between
+    """
+    user_id = instance.user_id
+    feed.changed(user_id)
+    transaction.on_commit(lambda: feed.changed(user_id))
@@ -1,8 +1,17 @@
 from __future__ import absolute_import
+import time
+from datetime import datetime, timedelta
+
+import pytz
 
 from celery import shared_task
 
-from .models import Reminder
+from django.conf import settings
+from django.db import DatabaseError
+
+from . import governor, metrics
+from .digest import coalesce, send_digest
+from .models import Reminder, ReminderHistory
 
 
 @shared_task
@@ -13,7 +22,110 @@ def run_reminder(reminder):
 
 
 @shared_task
-def scheduler():
-    for r in Reminder.objects.valid():
-        run_reminder.delay(r)
+def run_digest(reminders):
+    send_digest(reminders)
+
+
+def _claim(reminder):
+    if not Reminder.objects.claim(reminder.id):
+        metrics.incr('scheduler.claim_conflict')
+        return False
+    reminder.in_progress = True
+    return True
+
+
+def _queue(task, arg, countdown):
+    if countdown:
+        task.apply_async((arg,), countdown=countdown)
+    else:
+        task.delay(arg)
+
+
+def dispatch(reminder, countdown=0):
+    """
+    Queue a reminder to be sent unless it has already been claimed
+    """
+    if not _claim(reminder):
+        return False
+    _queue(run_reminder, reminder, countdown)
+    return True
+
+
+def dispatch_message(reminders, countdown=0):
+    """
+    Queue one message from reminders.digest.coalesce, a single reminder or
+    a digest. Returns the number of reminders queued.
+    """
+    if len(reminders) == 1:
+        return int(dispatch(reminders[0], countdown))
+    claimed = [r for r in reminders if _claim(r)]
+    if len(claimed) == 1:
+        _queue(run_reminder, claimed[0], countdown)
+    elif claimed:
+        _queue(run_digest, claimed, countdown)
+    return len(claimed)
+
+
+@shared_task
+def scheduler(window=10):
+    """
+    Queue the reminders that are due, oldest first, spreading them over
+    the next `window` seconds (the beat interval) at the send rate
+    """
+    with metrics.timer('scheduler.tick'):
+        reminders = Reminder.objects.valid().order_by('full_start_datetime')
+        due = list(reminders)
+        metrics.gauge('scheduler.due', len(due))
+        messages = coalesce(due)
+        now = time.time()
+        dispatched = 0
+        for second in range(window):
+            if not messages:
+                break
+            granted = governor.take(len(messages), now + second)
+            for message in messages[:granted]:
+                dispatched += dispatch_message(message, countdown=second)
+            messages = messages[granted:]
+        backlog = sum(len(message) for message in messages)
+        governor.report_backlog(backlog)
+        metrics.gauge('scheduler.backlog', backlog)
+        metrics.incr('scheduler.dispatched', dispatched)
+    return dispatched
+
+
+@shared_task
+def archive_history():
+    before = datetime.now(pytz.timezone('UTC')) - timedelta(
+        days=settings.REMINDER_HISTORY_ARCHIVE_DAYS
+    )
+    return ReminderHistory.objects.archive(before)
+
+
+@shared_task
+def reclaim_reminders():
+    """
+    Give back reminders whose worker died or hung while sending them,
+    counting it as a failed attempt
+    """
+    before = datetime.now(pytz.timezone('UTC')) - timedelta(
+        seconds=settings.REMINDER_DELIVERY_LEASE
+    )
+    reclaimed = 0
+    for reminder in Reminder.objects.stuck(before):
+        reminder.delivery_failed('Delivery timed out')
+        reclaimed += 1
+    return reclaimed
+
 
+@shared_task(acks_late=True, max_retries=None, default_retry_delay=10)
+def write_history(entries):
+    """
+    Write queued history entries. The task is only acknowledged once they
+    are in so entries are written at least once.
+    """
+    try:
+        ReminderHistory.objects.bulk_insert(
+            [ReminderHistory(**values) for values in entries]
+        )
+    except DatabaseError as exc:
+        raise write_history.retry(exc=exc)
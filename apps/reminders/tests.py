@@ -1,12 +1,41 @@
+import json
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
 from datetime import datetime, timedelta
+from StringIO import StringIO
 
 from freezegun import freeze_time
+import pytz
 
-from django.test import TestCase, Client
+from django.test import TestCase, TransactionTestCase, Client
+from django.test.utils import CaptureQueriesContext, override_settings
 from django.core.urlresolvers import reverse
+from django.core import mail
+from django.core.management import call_command
+from django.core.cache import cache
+from django.core.cache.backends.dummy import DummyCache
+from django.db import connection, transaction
+from django.utils import timezone
+
+from mock import patch
 
 from accounts.models import LocalUser
-from reminders.models import Reminder, WEEKDAYS, MONTHS
+from reminders import broker, feed, governor, history, ical, metrics
+from reminders.digest import coalesce, send_digest
+from reminders.importer import import_reminders
+from reminders.daemon import LocalListener, WheelScheduler
+from reminders.leases import ShardCoordinator
+from reminders.sender import ConcurrentSender
+from reminders.tasks import dispatch, reclaim_reminders, scheduler
+from reminders.models import (
+    Reminder, ReminderHistory, ArchivedReminderHistory, ReminderOccurrence,
+    SchedulerLease, FailedDelivery, WEEKDAYS, MONTHS, prime_human_readable
+)
+from reminders.wheel import TimingWheel, timestamp
 from timezones.models import Timezone
 
 FROZEN_TIME = '2014-01-05 07:43:22'
@@ -1583,6 +1612,1607 @@ class ReminderDetailTest(BaseTest):
         self.assertEqual(response.status_code, 404)
 
 
+class ReminderHistoryArchiveTest(BaseTest):
+    """
+    Test old history entries are archived and still shown on the reminder
+    """
+
+    @freeze_time(FROZEN_TIME)
+    def setUp(self):
+        super(ReminderHistoryArchiveTest, self).setUp()
+        st = datetime.now() + timedelta(days=200)
+        self.reminder = self.create_reminder(st.date(), st.time())
+        for i in range(15):
+            with freeze_time(datetime.now() + timedelta(minutes=i)):
+                self.reminder.add_history_entry('Old entry %s' % i)
+
+    def test_archive(self):
+        with freeze_time('2014-06-05 07:43:22'):
+            self.reminder.add_history_entry('New entry')
+            moved = ReminderHistory.objects.archive(
+                datetime.now() - timedelta(days=90)
+            )
+        self.assertEqual(moved, 15)
+        self.assertEqual(
+            ReminderHistory.objects.filter(reminder=self.reminder).count(), 1
+        )
+        self.assertEqual(
+            ArchivedReminderHistory.objects.filter(
+                reminder=self.reminder
+            ).count(), 15
+        )
+        history = self.reminder.history()
+        self.assertEqual(history.count(), 16)
+        self.assertEqual(history[0].description, 'New entry')
+        self.assertEqual(
+            [h.description for h in history[9:12]],
+            ['Old entry 6', 'Old entry 5', 'Old entry 4']
+        )
+
+    def test_archive_keeps_timestamps(self):
+        entry = ReminderHistory.objects.filter(reminder=self.reminder)[0]
+        with freeze_time('2014-06-05 07:43:22'):
+            ReminderHistory.objects.archive(datetime.now())
+        archived = ArchivedReminderHistory.objects.get(id=entry.id)
+        self.assertEqual(archived.created, entry.created)
+        self.assertEqual(archived.description, entry.description)
+
+    @freeze_time(FROZEN_TIME)
+    def test_reminder_page_shows_archived_history(self):
+        ReminderHistory.objects.archive(datetime.now() + timedelta(days=1))
+        url = reverse('reminder', args=(self.reminder.id,))
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Old entry 14', response.content)
+        self.assertNotIn('Old entry 0<', response.content)
+        response = self.client.get(
+            url + '?before=' + response.context['older_history']
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Old entry 0', response.content)
+        self.assertNotIn('Old entry 14', response.content)
+        self.assertIsNone(response.context['older_history'])
+
+    def test_history_page_spans_archive(self):
+        with freeze_time('2014-01-05 07:50:00'):
+            ReminderHistory.objects.archive(datetime.now())
+        entries, cursor = self.reminder.history_page(limit=4)
+        self.assertEqual(
+            [h.description for h in entries],
+            ['Old entry 14', 'Old entry 13', 'Old entry 12', 'Old entry 11']
+        )
+        seen = list(entries)
+        while cursor is not None:
+            entries, cursor = self.reminder.history_page(
+                before=cursor, limit=4
+            )
+            seen.extend(entries)
+        self.assertEqual(
+            [h.description for h in seen],
+            ['Old entry %s' % i for i in range(14, -1, -1)]
+        )
+
+    @freeze_time(FROZEN_TIME)
+    def test_invalid_history_cursor(self):
+        url = reverse('reminder', args=(self.reminder.id,))
+        response = self.client.get(url + '?before=invalid')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Old entry 14', response.content)
+
+
+class ReminderHistoryDeltaTest(BaseTest):
+    """
+    Test history entries only store changed fields and can be rebuilt
+    """
+
+    @freeze_time(FROZEN_TIME)
+    def setUp(self):
+        super(ReminderHistoryDeltaTest, self).setUp()
+        st = datetime.now() + timedelta(days=10)
+        self.reminder = self.create_reminder(
+            st.date(), st.time(), content='Original content'
+        )
+        self.reminder.add_history_entry('Reminder created.')
+
+    @freeze_time(FROZEN_TIME)
+    def test_first_entry_is_full_snapshot(self):
+        entry = ReminderHistory.objects.get(reminder=self.reminder)
+        self.assertEqual(entry.content, 'Original content')
+        self.assertEqual(entry.status, 2)
+        self.assertEqual(entry.snooze_count, 0)
+        self.assertEqual(
+            entry.full_start_datetime, self.reminder.full_start_datetime
+        )
+
+    @freeze_time(FROZEN_TIME)
+    def test_status_change_stores_status_only(self):
+        Reminder.objects.get(pk=self.reminder.id).pause()
+        entry = ReminderHistory.objects.filter(reminder=self.reminder)[0]
+        self.assertEqual(entry.description, 'Reminder status set to PAUSED.')
+        self.assertEqual(entry.status, 1)
+        self.assertIsNone(entry.content)
+        self.assertIsNone(entry.snooze_count)
+        self.assertIsNone(entry.full_start_datetime)
+
+    def test_history_state(self):
+        with freeze_time('2014-01-05 08:00:00'):
+            reminder = Reminder.objects.get(pk=self.reminder.id)
+            reminder.content = 'Updated content'
+            reminder.save()
+            reminder.add_history_entry('Reminder content updated')
+        with freeze_time('2014-01-05 09:00:00'):
+            reminder.pause()
+
+        state = reminder.history_state(until=datetime(2014, 1, 5, 7, 50))
+        self.assertEqual(state['content'], 'Original content')
+        self.assertEqual(state['status'], 2)
+        state = reminder.history_state(until=datetime(2014, 1, 5, 8, 30))
+        self.assertEqual(state['content'], 'Updated content')
+        self.assertEqual(state['status'], 2)
+        state = reminder.history_state()
+        self.assertEqual(state['content'], 'Updated content')
+        self.assertEqual(state['status'], 1)
+        self.assertEqual(
+            state['full_start_datetime'], reminder.full_start_datetime
+        )
+
+    @freeze_time(FROZEN_TIME)
+    def test_save_without_entry(self):
+        reminder = Reminder.objects.get(pk=self.reminder.id)
+        reminder.content = 'Quietly changed'
+        reminder.save()
+        reminder = Reminder.objects.get(pk=self.reminder.id)
+        reminder.pause()
+        entry = ReminderHistory.objects.filter(reminder=self.reminder)[0]
+        self.assertEqual(entry.status, 1)
+        self.assertEqual(entry.content, 'Quietly changed')
+        self.assertIsNone(entry.snooze_count)
+        self.assertEqual(
+            reminder.history_state()['content'], 'Quietly changed'
+        )
+
+    def test_history_state_with_archive(self):
+        with freeze_time('2014-01-05 09:00:00'):
+            Reminder.objects.get(pk=self.reminder.id).pause()
+            ReminderHistory.objects.archive(datetime(2014, 1, 5, 8, 0))
+        state = self.reminder.history_state()
+        self.assertEqual(state['content'], 'Original content')
+        self.assertEqual(state['status'], 1)
+
+    @freeze_time(FROZEN_TIME)
+    def test_edit_content_history(self):
+        form = {
+            'content': 'New content',
+            'remind_on': self.reminder.localised_start().strftime('%d %B %Y'),
+            'remind_at': self.reminder.localised_start().strftime('%H:%M'),
+        }
+        self.client.post(reverse('edit', args=(self.reminder.id,)), form)
+        entry = ReminderHistory.objects.get(
+            reminder=self.reminder, description='Reminder content updated'
+        )
+        self.assertEqual(entry.content, 'New content')
+        self.assertIsNone(entry.status)
+        self.assertIsNone(entry.extra_info)
+
+        response = self.client.get(
+            reverse('reminder', args=(self.reminder.id,))
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Content was:', response.content)
+        self.assertIn('Original content', response.content)
+        self.assertNotIn('None', response.content)
+
+
+@override_settings(REMINDER_HISTORY_WRITE_MODE='buffer')
+class ReminderHistoryWriteBehindTest(TransactionTestCase):
+    """
+    Test history entries can be written after the request has finished
+    """
+    fixtures = ['socialapp.json', 'timezones.json']
+
+    @freeze_time(FROZEN_TIME)
+    def setUp(self):
+        self.client = Client()
+        self.user = LocalUser.objects.create_user(
+            'testuser', 'test@test.com', 'password',
+            timezone=Timezone.objects.get(name='Europe/London')
+        )
+        self.client.login(username='testuser', password='password')
+        st = datetime.now() + timedelta(days=1)
+        self.reminder = Reminder(
+            user=self.user, content='Test',
+            start_date=st.date(), start_time=st.time()
+        )
+        self.reminder.save()
+
+    def tearDown(self):
+        history.flush()
+
+    def history_count(self):
+        return ReminderHistory.objects.filter(reminder=self.reminder).count()
+
+    @freeze_time(FROZEN_TIME)
+    def test_written_after_request(self):
+        self.client.get(reverse('pause', args=(self.reminder.id,)))
+        self.assertEqual(self.history_count(), 1)
+        entry = ReminderHistory.objects.get(reminder=self.reminder)
+        self.assertEqual(entry.description, 'Reminder status set to PAUSED.')
+
+    def test_buffered_until_flushed(self):
+        with freeze_time('2014-01-05 07:43:22'):
+            self.reminder.pause()
+        with freeze_time('2014-01-05 07:50:00'):
+            self.assertEqual(self.history_count(), 0)
+            history.flush()
+        entry = ReminderHistory.objects.get(reminder=self.reminder)
+        self.assertEqual(entry.created, datetime(2014, 1, 5, 7, 43, 22,
+                                                 tzinfo=entry.created.tzinfo))
+
+    @freeze_time(FROZEN_TIME)
+    def test_rolled_back_entries_discarded(self):
+        try:
+            with transaction.atomic():
+                self.reminder.pause()
+                raise ValueError
+        except ValueError:
+            pass
+        history.flush()
+        self.assertEqual(self.history_count(), 0)
+
+    @freeze_time(FROZEN_TIME)
+    @override_settings(REMINDER_HISTORY_BATCH_SIZE=2)
+    def test_flushed_at_batch_size(self):
+        self.reminder.pause()
+        self.assertEqual(self.history_count(), 0)
+        self.reminder.unpause()
+        self.assertEqual(self.history_count(), 2)
+
+    @freeze_time(FROZEN_TIME)
+    def test_sender_flushes(self):
+        cache.clear()
+        due = Reminder(
+            user=self.user, content='Due', start_date=datetime(2014, 1, 5),
+            start_time=datetime(2014, 1, 5, 7, 43).time()
+        )
+        due.save()
+        sender = ConcurrentSender(concurrency=1, batch_size=10)
+        try:
+            self.assertEqual(sender.run_once(), 1)
+        finally:
+            sender.close()
+        self.assertTrue(ReminderHistory.objects.filter(
+            reminder=due, description='Reminder sent.'
+        ).exists())
+
+    def test_scheduler_tick_flushes(self):
+        listener = LocalListener()
+        now = timestamp(datetime(2014, 1, 5, 7, 43, 22,
+                                 tzinfo=pytz.timezone('UTC')))
+        daemon = WheelScheduler(listener=listener, now=now)
+        try:
+            with patch('reminders.history.flush') as flush:
+                daemon.tick(now)
+        finally:
+            listener.close()
+        self.assertTrue(flush.called)
+
+    @freeze_time(FROZEN_TIME)
+    def test_two_edits_before_flush(self):
+        self.reminder.add_history_entry('Reminder created.')
+        history.flush()
+        with transaction.atomic():
+            Reminder.objects.get(pk=self.reminder.pk).pause()
+            Reminder.objects.get(pk=self.reminder.pk).unpause()
+        history.flush()
+        self.assertEqual(self.history_count(), 3)
+        self.assertEqual(self.reminder.history_state()['status'], 2)
+
+    @freeze_time(FROZEN_TIME)
+    @override_settings(REMINDER_HISTORY_WRITE_MODE='celery')
+    def test_celery_mode(self):
+        with patch('reminders.tasks.write_history.delay') as delay:
+            with transaction.atomic():
+                self.reminder.pause()
+                self.reminder.unpause()
+                # Queued once the transaction commits, not before
+                self.assertFalse(delay.called)
+        self.assertEqual(delay.call_count, 2)
+        entries = [call[0][0][0] for call in delay.call_args_list]
+        self.assertEqual(self.history_count(), 0)
+
+        from reminders.tasks import write_history
+        write_history(entries)
+        self.assertEqual(self.history_count(), 2)
+        self.assertEqual(self.reminder.history_state()['status'], 2)
+
+
+class ReminderHumanReadableTest(BaseTest):
+    """
+    Test human readable reminder times are cached and can be batched
+    """
+
+    @freeze_time(FROZEN_TIME)
+    def test_cached_until_start_changes(self):
+        st = datetime.now() + timedelta(days=1)
+        r = self.create_reminder(st.date(), st.time())
+        self.assertEqual(r.get_human_readable(), ('tomorrow', '07:43'))
+        with self.assertNumQueries(0):
+            self.assertEqual(r.listing_message(), 'tomorrow at 07:43')
+        r.start_date = self.today
+        r.start_time = (datetime.now() + timedelta(hours=2)).time()
+        r.save()
+        self.assertEqual(r.get_human_readable(), ('today', '09:43'))
+
+    @freeze_time(FROZEN_TIME)
+    def test_prime_human_readable(self):
+        for days in range(1, 6):
+            st = datetime.now() + timedelta(days=days)
+            self.create_reminder(st.date(), st.time())
+        user = LocalUser.objects.select_related('timezone').get(
+            pk=self.user.pk
+        )
+        reminders = list(Reminder.objects.outstanding(user=user))
+        with self.assertNumQueries(0):
+            prime_human_readable(reminders, user)
+            messages = [r.listing_message() for r in reminders]
+        self.assertEqual(messages, [
+            'tomorrow at 07:43',
+            'Tuesday 7 January at 07:43',
+            'Wednesday 8 January at 07:43',
+            'Thursday 9 January at 07:43',
+            'Friday 10 January at 07:43',
+        ])
+
+
+class ReminderRecurrenceTest(BaseTest):
+    """
+    Test recurring reminders are scheduled from precomputed occurrences
+    """
+
+    def create_recurring(self, start, interval_type, interval_value,
+                         max_recurrances=0):
+        r = self.create_reminder(start.date(), start.time())
+        r.interval_type = interval_type
+        r.interval_value = interval_value
+        r.max_recurrances = max_recurrances
+        r.save()
+        return r
+
+    def fire_times(self, reminder):
+        return [o.fire_at.replace(tzinfo=None)
+                for o in reminder.occurrences.all()]
+
+    @freeze_time(FROZEN_TIME)
+    def test_materialize_daily(self):
+        r = self.create_recurring(datetime(2014, 1, 5, 9, 0), 3, 2)
+        self.assertEqual(r.materialize_occurrences(count=3), 3)
+        self.assertEqual(self.fire_times(r), [
+            datetime(2014, 1, 5, 9, 0),
+            datetime(2014, 1, 7, 9, 0),
+            datetime(2014, 1, 9, 9, 0),
+        ])
+        r.materialize_occurrences(count=2)
+        self.assertEqual(r.occurrences.count(), 5)
+        self.assertEqual(
+            self.fire_times(r)[-1], datetime(2014, 1, 13, 9, 0)
+        )
+
+    @freeze_time(FROZEN_TIME)
+    def test_materialize_months_uses_interval_value(self):
+        r = self.create_recurring(datetime(2014, 1, 31, 9, 0), 4, 2)
+        r.materialize_occurrences(count=4)
+        self.assertEqual(self.fire_times(r), [
+            datetime(2014, 1, 31, 9, 0),
+            datetime(2014, 3, 31, 8, 0),
+            datetime(2014, 5, 31, 8, 0),
+            datetime(2014, 7, 31, 8, 0),
+        ])
+
+    @freeze_time(FROZEN_TIME)
+    def test_materialize_stops_at_max_recurrances(self):
+        r = self.create_recurring(datetime(2014, 1, 5, 9, 0), 3, 1, 3)
+        self.assertEqual(r.materialize_occurrences(count=10), 3)
+        self.assertEqual(r.materialize_occurrences(count=10), 0)
+
+    @freeze_time(FROZEN_TIME)
+    def test_materialize_skips_past(self):
+        r = self.create_recurring(datetime(2014, 1, 1, 9, 0), 3, 1)
+        r.materialize_occurrences(after=timezone.now(), count=3)
+        self.assertEqual(self.fire_times(r), [
+            datetime(2014, 1, 1, 9, 0),
+            datetime(2014, 1, 5, 9, 0),
+            datetime(2014, 1, 6, 9, 0),
+        ])
+
+    @freeze_time('2014-01-06 09:00:30')
+    def test_remind_moves_to_next_occurrence(self):
+        r = self.create_recurring(datetime(2014, 1, 6, 9, 0), 3, 1)
+        r.remind()
+        r = Reminder.objects.get(pk=r.pk)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(r.status, 2)
+        self.assertFalse(r.in_progress)
+        self.assertEqual(r.total_reminders, 1)
+        self.assertEqual(
+            r.full_start_datetime.replace(tzinfo=None),
+            datetime(2014, 1, 7, 9, 0)
+        )
+        self.assertEqual(r.history()[0].description,
+                         'Next reminder set for 09:00 tomorrow.')
+        self.assertIn(r, Reminder.objects.outstanding())
+
+    @freeze_time('2014-01-06 09:00:30')
+    def test_sent_occurrence_is_notified(self):
+        r = self.create_recurring(datetime(2014, 1, 6, 9, 0), 3, 1)
+        since = timezone.now() - timedelta(minutes=1)
+        self.assertEqual(
+            Reminder.objects.claim_notifications(self.user, since), []
+        )
+        r.remind()
+        self.assertEqual(
+            Reminder.objects.claim_notifications(self.user, since), [r]
+        )
+        self.assertEqual(
+            Reminder.objects.claim_notifications(self.user, since), []
+        )
+
+    @freeze_time(FROZEN_TIME)
+    def test_materialize_jumps_to_after(self):
+        r = self.create_recurring(datetime(2004, 1, 5, 7, 0), 1, 1)
+        r.materialize_occurrences(after=timezone.now(), count=3)
+        self.assertEqual(self.fire_times(r), [
+            datetime(2004, 1, 5, 7, 0),
+            datetime(2014, 1, 5, 7, 44),
+            datetime(2014, 1, 5, 7, 45),
+        ])
+        self.assertEqual(r.occurrences.order_by('number')[1].number, 5260364)
+
+    @freeze_time('2014-04-01 12:00:00')
+    def test_first_occurrence_after(self):
+        # Anchored in winter, the estimate is an hour out over summer time
+        r = self.create_recurring(datetime(2014, 1, 1, 12, 0), 2, 1)
+        anchor = r.full_start_datetime
+        number = r.first_occurrence_after(anchor, timezone.now())
+        self.assertGreater(r.occurrence_time(anchor, number), timezone.now())
+        self.assertLessEqual(
+            r.occurrence_time(anchor, number - 1), timezone.now()
+        )
+        monthly = self.create_recurring(datetime(2014, 1, 31, 9, 0), 4, 1)
+        self.assertEqual(monthly.first_occurrence_after(
+            monthly.full_start_datetime, timezone.now()
+        ), 3)
+
+    @freeze_time('2014-01-06 09:00:30')
+    def test_remind_last_occurrence_is_overdue(self):
+        r = self.create_recurring(datetime(2014, 1, 6, 9, 0), 3, 1, 1)
+        r.remind()
+        r = Reminder.objects.get(pk=r.pk)
+        self.assertEqual(r.status, 4)
+
+    @freeze_time('2014-01-06 09:00:30')
+    def test_remind_one_off_is_overdue(self):
+        r = self.create_reminder(self.today, datetime(2014, 1, 6, 9).time())
+        r.remind()
+        r = Reminder.objects.get(pk=r.pk)
+        self.assertEqual(r.status, 4)
+        self.assertEqual(ReminderOccurrence.objects.count(), 0)
+
+    @freeze_time(FROZEN_TIME)
+    def test_local_time_kept_over_dst(self):
+        r = self.create_recurring(datetime(2014, 3, 29, 9, 0), 3, 1)
+        r.materialize_occurrences(count=3)
+        self.assertEqual(self.fire_times(r), [
+            datetime(2014, 3, 29, 9, 0),
+            datetime(2014, 3, 30, 8, 0),
+            datetime(2014, 3, 31, 8, 0),
+        ])
+
+
+class TimingWheelTest(TestCase):
+    """
+    Test keys fire from the timing wheel on the right second
+    """
+
+    def test_fires_on_the_second(self):
+        wheel = TimingWheel(1000)
+        wheel.schedule('a', 1005)
+        self.assertEqual(wheel.advance(1004), [])
+        self.assertEqual(wheel.advance(1005), ['a'])
+        self.assertEqual(len(wheel), 0)
+
+    def test_cascades_from_higher_levels(self):
+        wheel = TimingWheel(1000)
+        wheel.schedule('a', 1000 + 59 * 60 + 7)
+        wheel.schedule('b', 1000 + 61)
+        self.assertEqual(wheel.advance(1060), [])
+        self.assertEqual(wheel.advance(1061), ['b'])
+        self.assertEqual(wheel.advance(1000 + 59 * 60 + 6), [])
+        self.assertEqual(wheel.advance(1000 + 59 * 60 + 7), ['a'])
+
+    def test_past_times_fire_next(self):
+        wheel = TimingWheel(1000)
+        wheel.schedule('a', 10)
+        self.assertEqual(wheel.advance(1000), ['a'])
+
+    def test_cancel_and_reschedule(self):
+        wheel = TimingWheel(1000)
+        wheel.schedule('a', 1010)
+        wheel.schedule('b', 1010)
+        wheel.cancel('a')
+        wheel.schedule('b', 1200)
+        self.assertEqual(wheel.advance(1199), [])
+        self.assertEqual(wheel.advance(1200), ['b'])
+
+    def test_beyond_horizon(self):
+        wheel = TimingWheel(1000)
+        self.assertFalse(wheel.schedule('a', 1000 + 3600))
+        self.assertNotIn('a', wheel)
+        self.assertTrue(wheel.schedule('a', 1000 + 3599))
+        self.assertIn('a', wheel)
+
+
+class ShardCoordinatorTest(TestCase):
+    """
+    Test scheduler nodes share out the shards between them
+    """
+
+    def setUp(self):
+        self.now = datetime(2014, 1, 5, 7, 43, 22, tzinfo=pytz.timezone('UTC'))
+
+    def node(self, name):
+        return ShardCoordinator(name=name, shards=4, lease_time=30)
+
+    def test_single_node_owns_everything(self):
+        self.assertEqual(self.node('a').rebalance(self.now), [0, 1, 2, 3])
+
+    def test_nodes_split_shards(self):
+        a, b = self.node('a'), self.node('b')
+        self.assertEqual(a.rebalance(self.now), [0, 1, 2, 3])
+        self.assertEqual(b.rebalance(self.now), [])
+        self.assertEqual(a.rebalance(self.now), [0, 1])
+        self.assertEqual(b.rebalance(self.now), [2, 3])
+        self.assertEqual(
+            SchedulerLease.objects.filter(owner='b').count(), 2
+        )
+
+    def test_dead_node_shards_taken_over(self):
+        a, b = self.node('a'), self.node('b')
+        a.rebalance(self.now)
+        b.rebalance(self.now)
+        a.rebalance(self.now)
+        self.assertEqual(b.rebalance(self.now), [2, 3])
+        later = self.now + timedelta(seconds=31)
+        self.assertEqual(b.rebalance(later), [0, 1, 2, 3])
+
+    def test_stop_releases_leases(self):
+        a, b = self.node('a'), self.node('b')
+        a.rebalance(self.now)
+        a.stop()
+        self.assertEqual(b.rebalance(self.now), [0, 1, 2, 3])
+
+
+class WheelSchedulerTest(BaseTest):
+    """
+    Test the scheduler daemon fires reminders when they are due
+    """
+
+    def setUp(self):
+        super(WheelSchedulerTest, self).setUp()
+        self.listener = LocalListener()
+        self.now = datetime(2014, 1, 5, 7, 43, 22)
+        self.scheduler = WheelScheduler(
+            listener=self.listener, now=self.ts(self.now)
+        )
+
+    def tearDown(self):
+        self.listener.close()
+
+    def ts(self, dt):
+        return timestamp(dt.replace(tzinfo=pytz.timezone('UTC')))
+
+    def tick(self, dt):
+        with freeze_time(dt):
+            return self.scheduler.tick(self.ts(dt))
+
+    def test_only_fires_owned_shards(self):
+        with freeze_time(FROZEN_TIME):
+            other = self.create_user('otheruser', 'other@test.com')
+            mine = self.create_reminder(
+                self.today, datetime(2014, 1, 5, 7, 0).time()
+            )
+            self.create_reminder(
+                self.today, datetime(2014, 1, 5, 7, 0).time(), user=other
+            )
+        coordinator = ShardCoordinator(name='a', shards=2, lease_time=30)
+        ShardCoordinator(name='b', shards=2, lease_time=30).heartbeat(
+            self.now.replace(tzinfo=pytz.timezone('UTC')),
+            datetime(2014, 1, 6, tzinfo=pytz.timezone('UTC'))
+        )
+        SchedulerLease.objects.create(
+            shard=other.id % 2, owner='b',
+            expires=datetime(2014, 1, 6, tzinfo=pytz.timezone('UTC'))
+        )
+        self.scheduler.coordinator = coordinator
+        with patch('reminders.tasks.run_reminder.delay') as delay:
+            self.assertEqual(self.tick(self.now), 1)
+        self.assertEqual(self.scheduler.shards, [self.user.id % 2])
+        self.assertEqual(delay.call_args[0][0].pk, mine.pk)
+
+    @freeze_time(FROZEN_TIME)
+    def test_claim(self):
+        r = self.create_reminder(self.today, datetime(2014, 1, 5, 7, 0).time())
+        self.assertTrue(Reminder.objects.claim(r.id))
+        self.assertFalse(Reminder.objects.claim(r.id))
+
+    def test_fires_when_due(self):
+        with freeze_time(FROZEN_TIME):
+            r = self.create_reminder(
+                self.today, datetime(2014, 1, 5, 7, 50).time()
+            )
+        with patch('reminders.tasks.run_reminder.delay') as delay:
+            self.assertEqual(self.tick(self.now), 0)
+            self.assertEqual(self.tick(datetime(2014, 1, 5, 7, 49, 59)), 0)
+            self.assertEqual(self.tick(datetime(2014, 1, 5, 7, 50)), 1)
+            self.assertEqual(self.tick(datetime(2014, 1, 5, 7, 50, 1)), 0)
+        self.assertEqual(delay.call_count, 1)
+        self.assertTrue(Reminder.objects.get(pk=r.pk).in_progress)
+
+    def test_overdue_fire_straight_away(self):
+        with freeze_time(FROZEN_TIME):
+            self.create_reminder(
+                self.today, datetime(2014, 1, 5, 7, 0).time()
+            )
+        with patch('reminders.tasks.run_reminder.delay') as delay:
+            self.assertEqual(self.tick(self.now), 1)
+        self.assertEqual(delay.call_count, 1)
+
+    def test_picks_up_changes(self):
+        self.tick(self.now)
+        with freeze_time(FROZEN_TIME):
+            moved = self.create_reminder(
+                self.today, datetime(2014, 1, 5, 7, 45).time()
+            )
+            self.create_reminder(
+                self.today, datetime(2014, 1, 5, 7, 45).time()
+            )
+            moved.start_time = datetime(2014, 1, 5, 7, 46).time()
+            moved.save()
+        with patch('reminders.tasks.run_reminder.delay') as delay:
+            self.assertEqual(self.tick(datetime(2014, 1, 5, 7, 45)), 1)
+            self.assertEqual(self.tick(datetime(2014, 1, 5, 7, 46)), 1)
+        self.assertEqual(delay.call_count, 2)
+        self.assertEqual(delay.call_args[0][0].pk, moved.pk)
+
+    @override_settings(REMINDER_SCHEDULER_NOTIFY=False)
+    def test_notify_off(self):
+        with freeze_time(FROZEN_TIME):
+            self.create_reminder(
+                self.today, datetime(2014, 1, 5, 7, 45).time()
+            )
+        self.assertEqual(self.listener.wait(0), [])
+
+    @override_settings(REMINDER_SCHEDULER_RESYNC=24 * 60 * 60)
+    def test_resyncs_after_missed_changes(self):
+        self.tick(self.now)
+        with freeze_time(FROZEN_TIME), \
+                override_settings(REMINDER_SCHEDULER_NOTIFY=False):
+            self.create_reminder(
+                self.today, datetime(2014, 1, 5, 7, 45).time()
+            )
+        self.assertEqual(len(self.scheduler.wheel), 0)
+        self.listener.missed = True
+        self.tick(datetime(2014, 1, 5, 7, 44))
+        self.assertFalse(self.listener.missed)
+        self.assertEqual(len(self.scheduler.wheel), 1)
+
+    @override_settings(REMINDER_SCHEDULER_RESYNC=24 * 60 * 60)
+    def test_refills_window(self):
+        with freeze_time(FROZEN_TIME):
+            self.create_reminder(
+                self.today, datetime(2014, 1, 5, 9, 0).time()
+            )
+        self.tick(self.now)
+        self.assertEqual(len(self.scheduler.wheel), 0)
+        self.tick(datetime(2014, 1, 5, 8, 1))
+        self.assertEqual(len(self.scheduler.wheel), 1)
+
+    def test_skips_claimed(self):
+        with freeze_time(FROZEN_TIME):
+            r = self.create_reminder(
+                self.today, datetime(2014, 1, 5, 7, 50).time()
+            )
+        self.tick(self.now)
+        Reminder.objects.claim(r.id)
+        with patch('reminders.tasks.run_reminder.delay') as delay:
+            self.assertEqual(self.tick(datetime(2014, 1, 5, 7, 50)), 0)
+        self.assertFalse(delay.called)
+
+    def test_failed_delivery_waits_for_retry(self):
+        with freeze_time(FROZEN_TIME):
+            r = self.create_reminder(
+                self.today, datetime(2014, 1, 5, 7, 44).time()
+            )
+        self.tick(self.now)
+        with freeze_time('2014-01-05 07:44:01'):
+            r.delivery_failed('Connection refused')
+        self.assertEqual(
+            r.next_attempt, pytz.utc.localize(datetime(2014, 1, 5, 7, 45, 1))
+        )
+        with patch('reminders.tasks.run_reminder.delay') as delay:
+            self.assertEqual(self.tick(datetime(2014, 1, 5, 7, 44, 1)), 0)
+            self.assertEqual(self.tick(datetime(2014, 1, 5, 7, 45)), 0)
+            self.assertEqual(self.tick(datetime(2014, 1, 5, 7, 45, 1)), 1)
+        self.assertEqual(delay.call_args[0][0].pk, r.pk)
+
+        # A scheduler loading the retry from scratch waits for it too
+        restarted = WheelScheduler(
+            listener=self.listener, now=self.ts(datetime(2014, 1, 5, 7, 44, 30))
+        )
+        Reminder.objects.filter(pk=r.pk).update(in_progress=False)
+        with patch('reminders.tasks.run_reminder.delay') as delay, \
+                freeze_time('2014-01-05 07:44:30'):
+            self.assertEqual(restarted.tick(
+                self.ts(datetime(2014, 1, 5, 7, 44, 30))
+            ), 0)
+        self.assertEqual(
+            restarted.wheel.advance(self.ts(datetime(2014, 1, 5, 7, 45, 1))),
+            [r.pk]
+        )
+
+
+@override_settings(REMINDER_SEND_RATE=2)
+class SendGovernorTest(BaseTest):
+    """
+    Test reminders are released at the send rate, oldest first
+    """
+
+    def setUp(self):
+        super(SendGovernorTest, self).setUp()
+        cache.clear()
+
+    def test_take(self):
+        self.assertEqual(governor.take(3, 100), 2)
+        self.assertEqual(governor.take(1, 100.5), 0)
+        self.assertEqual(governor.take(1, 101), 1)
+
+    def test_take_ahead(self):
+        with freeze_time('2014-01-05 07:43:22'):
+            ahead = time.time() + 9
+            self.assertEqual(governor.take(2, ahead), 2)
+        # Still counted when the second comes round
+        with freeze_time('2014-01-05 07:43:31'):
+            self.assertEqual(governor.take(1, ahead), 0)
+
+    @override_settings(REMINDER_SEND_RATE=None)
+    def test_no_limit(self):
+        self.assertEqual(governor.take(100, 100), 100)
+
+    @freeze_time(FROZEN_TIME)
+    def test_scheduler_spreads_sends(self):
+        reminders = [
+            self.create_reminder(
+                self.today, datetime(2014, 1, 5, 7, minute).time()
+            ) for minute in (30, 10, 20, 40, 0)
+        ]
+        with patch('reminders.tasks.run_reminder.delay') as delay, \
+                patch('reminders.tasks.run_reminder.apply_async') as later:
+            self.assertEqual(scheduler(window=2), 4)
+
+        self.assertEqual(
+            [c[0][0].pk for c in delay.call_args_list],
+            [reminders[4].pk, reminders[1].pk]
+        )
+        self.assertEqual(
+            [(c[0][0][0].pk, c[1]['countdown']) for c in later.call_args_list],
+            [(reminders[2].pk, 1), (reminders[0].pk, 1)]
+        )
+        self.assertEqual(governor.backlog(), 1)
+        self.assertEqual(Reminder.objects.valid().get(), reminders[3])
+
+    def test_daemon_defers_over_rate(self):
+        with freeze_time(FROZEN_TIME):
+            first = self.create_reminder(
+                self.today, datetime(2014, 1, 5, 7, 0).time()
+            )
+            for i in range(2):
+                self.create_reminder(
+                    self.today, datetime(2014, 1, 5, 7, 30).time()
+                )
+        listener = LocalListener()
+        now = datetime(2014, 1, 5, 7, 43, 22, tzinfo=pytz.timezone('UTC'))
+        daemon = WheelScheduler(listener=listener, now=timestamp(now))
+        with patch('reminders.tasks.run_reminder.delay') as delay, \
+                freeze_time(now):
+            self.assertEqual(daemon.tick(timestamp(now)), 2)
+            self.assertEqual(governor.backlog(), 1)
+            self.assertEqual(daemon.tick(timestamp(now) + 1), 1)
+        listener.close()
+        self.assertEqual(delay.call_args_list[0][0][0].pk, first.pk)
+        self.assertEqual(governor.backlog(), 0)
+
+
+class ReminderDeliveryTest(BaseTest):
+    """
+    Test failed sends are retried with backoff and dead lettered
+    """
+
+    def fail_send(self):
+        return patch(
+            'reminders.models.EmailMultiAlternatives.send',
+            side_effect=Exception('Throttling')
+        )
+
+    def due_reminder(self):
+        return self.create_reminder(
+            self.today, datetime(2014, 1, 5, 7, 0).time()
+        )
+
+    @freeze_time(FROZEN_TIME)
+    def test_failed_send_is_retried_later(self):
+        r = self.due_reminder()
+        with self.fail_send():
+            r.remind()
+        r = Reminder.objects.get(pk=r.pk)
+        self.assertFalse(r.in_progress)
+        self.assertEqual(r.status, 2)
+        self.assertEqual(r.delivery_attempts, 1)
+        self.assertEqual(r.next_attempt, timezone.now() + timedelta(seconds=60))
+        self.assertNotIn(r, Reminder.objects.valid())
+        self.assertIn(
+            r, Reminder.objects.due(timezone.now() + timedelta(seconds=60))
+        )
+
+    @freeze_time(FROZEN_TIME)
+    def test_backoff_doubles(self):
+        r = self.due_reminder()
+        delays = []
+        for i in range(3):
+            r.delivery_failed('Throttling')
+            delays.append((r.next_attempt - timezone.now()).seconds)
+        self.assertEqual(delays, [60, 120, 240])
+
+    @freeze_time(FROZEN_TIME)
+    @override_settings(REMINDER_DELIVERY_MAX_ATTEMPTS=2)
+    def test_dead_lettered_after_max_attempts(self):
+        r = self.due_reminder()
+        with self.fail_send():
+            r.remind()
+            r.remind()
+        r = Reminder.objects.get(pk=r.pk)
+        self.assertEqual(r.status, 4)
+        self.assertFalse(r.in_progress)
+        self.assertIsNone(r.next_attempt)
+        failed = FailedDelivery.objects.get()
+        self.assertEqual(failed.reminder, r)
+        self.assertEqual(failed.attempts, 2)
+        self.assertEqual(failed.error, 'Throttling')
+        self.assertEqual(
+            ReminderHistory.objects.filter(
+                reminder=r, description='Reminder could not be sent.'
+            ).count(), 1
+        )
+
+    @freeze_time(FROZEN_TIME)
+    def test_success_resets_attempts(self):
+        r = self.due_reminder()
+        with self.fail_send():
+            r.remind()
+        r.remind()
+        r = Reminder.objects.get(pk=r.pk)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(r.delivery_attempts, 0)
+        self.assertIsNone(r.next_attempt)
+        self.assertIsNone(r.claimed_at)
+
+    def test_sweeper_reclaims_stuck_claims(self):
+        with freeze_time(FROZEN_TIME):
+            r = self.due_reminder()
+            Reminder.objects.claim(r.id)
+        with freeze_time('2014-01-05 07:44:22'):
+            self.assertEqual(reclaim_reminders(), 0)
+        with freeze_time('2014-01-05 07:49:23'):
+            self.assertEqual(reclaim_reminders(), 1)
+        r = Reminder.objects.get(pk=r.pk)
+        self.assertFalse(r.in_progress)
+        self.assertEqual(r.delivery_attempts, 1)
+
+    @freeze_time(FROZEN_TIME)
+    def test_sweeper_ignores_legacy_sent_reminders(self):
+        # Sent before claims were tracked, left in progress with no claim
+        r = self.due_reminder()
+        Reminder.objects.filter(pk=r.pk).update(
+            in_progress=True, status=5
+        )
+        with freeze_time('2014-01-06 07:49:23'):
+            self.assertEqual(reclaim_reminders(), 0)
+        r = Reminder.objects.get(pk=r.pk)
+        self.assertEqual(r.status, 5)
+        self.assertEqual(r.delivery_attempts, 0)
+
+
+@override_settings(REMINDER_METRICS_SINK='reminders.metrics.MemorySink')
+class ReminderMetricsTest(BaseTest):
+    """
+    Test delivery and scheduler metrics reach the sink
+    """
+
+    def setUp(self):
+        super(ReminderMetricsTest, self).setUp()
+        self.sink = metrics.get_sink()
+        del self.sink.records[:]
+
+    @freeze_time(FROZEN_TIME)
+    def test_remind_records_latency_and_stages(self):
+        r = self.create_reminder(
+            self.today, datetime(2014, 1, 5, 7, 43).time()
+        )
+        r.remind()
+        self.assertEqual(self.sink.values('reminder.latency'), [22000])
+        for stage in ('render', 'send', 'db'):
+            self.assertEqual(len(self.sink.values('reminder.' + stage)), 1)
+
+    @freeze_time(FROZEN_TIME)
+    def test_failed_send_counted(self):
+        r = self.create_reminder(
+            self.today, datetime(2014, 1, 5, 7, 43).time()
+        )
+        with patch('reminders.models.EmailMultiAlternatives.send',
+                   side_effect=Exception('Throttling')):
+            r.remind()
+        self.assertEqual(self.sink.values('reminder.send_failed'), [1])
+        self.assertEqual(self.sink.values('reminder.latency'), [])
+
+    @freeze_time(FROZEN_TIME)
+    def test_scheduler_tick(self):
+        for minute in (10, 20):
+            self.create_reminder(
+                self.today, datetime(2014, 1, 5, 7, minute).time()
+            )
+        with patch('reminders.tasks.run_reminder.delay'):
+            scheduler()
+        self.assertEqual(self.sink.values('scheduler.due'), [2])
+        self.assertEqual(self.sink.values('scheduler.backlog'), [0])
+        self.assertEqual(self.sink.values('scheduler.dispatched'), [2])
+        self.assertEqual(len(self.sink.values('scheduler.tick')), 1)
+
+    @freeze_time(FROZEN_TIME)
+    def test_claim_conflict(self):
+        r = self.create_reminder(
+            self.today, datetime(2014, 1, 5, 7, 10).time()
+        )
+        Reminder.objects.claim(r.id)
+        with patch('reminders.tasks.run_reminder.delay') as delay:
+            self.assertFalse(dispatch(r))
+        self.assertFalse(delay.called)
+        self.assertEqual(self.sink.values('scheduler.claim_conflict'), [1])
+
+    def test_statsd_sink(self):
+        listener = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        listener.bind(('127.0.0.1', 0))
+        listener.settimeout(1)
+        with override_settings(
+                REMINDER_METRICS_SINK='reminders.metrics.StatsdSink',
+                REMINDER_STATSD_PORT=listener.getsockname()[1]):
+            metrics.gauge('scheduler.due', 3)
+            metrics.timing('reminder.latency', 1500.4)
+        self.assertEqual(
+            listener.recv(512), 'remindmelatr.scheduler.due:3|g'
+        )
+        self.assertEqual(
+            listener.recv(512), 'remindmelatr.reminder.latency:1500|ms'
+        )
+        listener.close()
+
+    @override_settings(REMINDER_METRICS_SINK=None)
+    def test_no_sink(self):
+        self.assertIsNone(metrics.get_sink())
+        metrics.incr('scheduler.dispatched')
+        self.assertEqual(self.sink.records, [])
+
+
+class LoadTestCommandsTest(BaseTest):
+    """
+    Test the load seeding and benchmark commands
+    """
+
+    def setUp(self):
+        super(LoadTestCommandsTest, self).setUp()
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def call(self, *args, **kwargs):
+        with patch('sys.stdout', new_callable=StringIO):
+            call_command(*args, **kwargs)
+
+    def test_seed_load(self):
+        self.call('seed_load', users=5, reminders=4, batch_size=2, seed=1)
+        users = LocalUser.objects.filter(username__startswith='load')
+        self.assertEqual(users.count(), 5)
+        self.assertEqual(
+            Reminder.objects.filter(user__in=users).count(), 20
+        )
+        for user in users:
+            self.assertTrue(user.auth_token.key)
+            self.assertIsNotNone(user.timezone)
+        for r in Reminder.objects.filter(user__in=users):
+            self.assertEqual(len(r.hash_digest), 20)
+            self.assertEqual(
+                r.full_start_datetime.replace(tzinfo=None),
+                datetime.combine(r.start_date, r.start_time)
+            )
+
+    def test_seed_load_continues_numbering(self):
+        self.call('seed_load', users=2, reminders=1)
+        self.call('seed_load', users=2, reminders=1)
+        self.assertTrue(LocalUser.objects.filter(username='load3').exists())
+
+    def test_seed_load_numbers_after_highest(self):
+        self.create_user('loadtester', 'loadtester@test.com')
+        self.call('seed_load', users=3, reminders=1)
+        LocalUser.objects.filter(username='load0').delete()
+        self.call('seed_load', users=2, reminders=1)
+        self.assertEqual(sorted(LocalUser.objects.filter(
+            username__regex=r'^load\d+$'
+        ).values_list('username', flat=True)), [
+            'load1', 'load2', 'load3', 'load4'
+        ])
+        self.call('seed_load', users=1, reminders=1, start=10)
+        self.assertTrue(LocalUser.objects.filter(username='load10').exists())
+
+    def test_benchmark_writes_results(self):
+        self.call('seed_load', users=2, reminders=3, seed=1)
+        first = os.path.join(self.directory, 'first.json')
+        second = os.path.join(self.directory, 'second.json')
+        self.call('benchmark', runs=2, parser_runs=2, output=first)
+        self.call('benchmark', runs=2, parser_runs=2, output=second,
+                  compare=first)
+        with open(second) as fp:
+            results = json.load(fp)
+        self.assertEqual(results['reminders'], 6)
+        self.assertEqual(sorted(results['benchmarks']), [
+            'api_encode_fast', 'api_encode_json', 'api_payload',
+            'api_reminder_list', 'dispatch_throughput', 'match_date',
+            'match_time', 'scheduler_tick',
+        ])
+        payload = results['benchmarks']['api_payload']
+        self.assertTrue(0 < payload['gzip_bytes'] < payload['json_bytes'])
+        self.assertIn(
+            results['benchmarks']['api_encode_fast']['encoder'],
+            ('ujson', 'json')
+        )
+        self.assertEqual(results['benchmarks']['match_date']['runs'], 2)
+        # Benchmark ticks are rolled back
+        self.assertFalse(Reminder.objects.filter(in_progress=True).exists())
+
+
+class ReminderImportTest(BaseTest):
+    """
+    Test reminders are imported in bulk from text and CSV
+    """
+
+    def setUp(self):
+        super(ReminderImportTest, self).setUp()
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    @freeze_time(FROZEN_TIME)
+    def test_text(self):
+        importer = import_reminders(self.user, [
+            'call mum 6pm tomorrow', '', 'feed the cat at 8pm',
+            'no time here',
+        ])
+        self.assertEqual(importer.created, 2)
+        self.assertEqual(importer.errors, [(4, 'Please enter a reminder time')])
+        mum = Reminder.objects.get(content='call mum')
+        self.assertEqual(
+            mum.full_start_datetime, pytz.utc.localize(datetime(2014, 1, 6, 18))
+        )
+        self.assertEqual(
+            mum.full_start_datetime.replace(tzinfo=None),
+            datetime.combine(mum.start_date, mum.start_time)
+        )
+        self.assertEqual(len(mum.hash_digest), 20)
+        self.assertEqual(
+            Reminder.objects.get(content__startswith='feed the cat').start_date,
+            datetime(2014, 1, 5).date()
+        )
+
+    @freeze_time(FROZEN_TIME)
+    def test_csv(self):
+        importer = import_reminders(self.user, [
+            'content,date,time',
+            'dentist,2014-02-01,09:30',
+            'renew passport,,',
+            'call mum 6pm tomorrow,,',
+            'late,2013-02-01,09:30',
+            'typo,2014-02-31,09:30',
+        ], 'csv')
+        self.assertEqual(importer.created, 2)
+        self.assertEqual(importer.errors, [
+            (3, 'Please enter a reminder time'),
+            (5, 'Please pick a date in the future'),
+            (6, 'Dates should look like 2014-01-31 and times 13:30'),
+        ])
+        self.assertEqual(
+            Reminder.objects.get(content='dentist').full_start_datetime,
+            pytz.utc.localize(datetime(2014, 2, 1, 9, 30))
+        )
+
+    @freeze_time(FROZEN_TIME)
+    def test_user_without_timezone(self):
+        self.user.timezone = None
+        self.user.save()
+        with timezone.override('America/New_York'):
+            importer = import_reminders(self.user, ['call mum 6pm tomorrow'])
+        self.assertEqual(importer.created, 1)
+        self.assertEqual(
+            Reminder.objects.get(content='call mum').full_start_datetime,
+            pytz.utc.localize(datetime(2014, 1, 6, 23))
+        )
+
+    def test_csv_needs_content(self):
+        with self.assertRaises(ValueError):
+            import_reminders(self.user, ['what,when', 'x,y'], 'csv')
+
+    @freeze_time(FROZEN_TIME)
+    def test_history(self):
+        import_reminders(self.user, ['call mum 6pm tomorrow'])
+        reminder = Reminder.objects.get(content='call mum')
+        entry = reminder.history()[0]
+        self.assertEqual(entry.description, 'Reminder imported.')
+        self.assertEqual(entry.status, 2)
+        self.assertEqual(entry.full_start_datetime, reminder.full_start_datetime)
+
+    @freeze_time(FROZEN_TIME)
+    def test_queries_per_batch(self):
+        lines = ['reminder %d at 8pm' % i for i in range(10)]
+        with CaptureQueriesContext(connection) as queries:
+            importer = import_reminders(self.user, lines, batch_size=5)
+        self.assertEqual(importer.created, 10)
+        inserts = [q for q in queries if q['sql'].startswith('INSERT')]
+        # A reminder and a history insert for each batch
+        self.assertEqual(len(inserts), 4)
+        self.assertEqual(
+            ReminderHistory.objects.filter(reminder__user=self.user).count(),
+            10
+        )
+
+    @freeze_time(FROZEN_TIME)
+    def test_command(self):
+        path = os.path.join(self.directory, 'reminders.txt')
+        with open(path, 'w') as fp:
+            fp.write('call mum 6pm tomorrow\nfeed the cat at 8pm\n')
+        with patch('sys.stdout', new_callable=StringIO) as stdout:
+            call_command('import_reminders', self.user.email, path)
+        self.assertEqual(Reminder.objects.filter(user=self.user).count(), 2)
+        self.assertIn('Imported 2 reminders', stdout.getvalue())
+
+
+@override_settings(REMINDER_DIGEST_WINDOW=60)
+class ReminderDigestTest(BaseTest):
+    """
+    Test reminders due together are sent as one digest
+    """
+
+    def create_due(self, minute, user=None):
+        return self.create_reminder(
+            self.today, datetime(2014, 1, 5, 7, minute).time(),
+            content='Reminder at %s' % minute, user=user
+        )
+
+    @freeze_time(FROZEN_TIME)
+    def test_coalesce(self):
+        other = self.create_user('otheruser', 'other@test.com')
+        first = self.create_due(0)
+        mine = [first, self.create_due(0), self.create_due(1)]
+        theirs = self.create_due(0, user=other)
+        self.assertEqual(
+            coalesce([first, theirs] + mine[1:]),
+            [[first, mine[1]], [theirs], [mine[2]]]
+        )
+
+    @freeze_time(FROZEN_TIME)
+    @override_settings(REMINDER_DIGEST_WINDOW=0)
+    def test_coalesce_disabled(self):
+        reminders = [self.create_due(0), self.create_due(0)]
+        self.assertEqual(coalesce(reminders), [[r] for r in reminders])
+
+    @freeze_time(FROZEN_TIME)
+    def test_scheduler_queues_digest(self):
+        together = [self.create_due(0), self.create_due(0)]
+        alone = self.create_due(5)
+        with patch('reminders.tasks.run_reminder.delay') as single, \
+                patch('reminders.tasks.run_digest.delay') as digest:
+            self.assertEqual(scheduler(), 3)
+        self.assertEqual(single.call_args[0][0], alone)
+        self.assertEqual(digest.call_count, 1)
+        self.assertEqual(digest.call_args[0][0], together)
+
+    @freeze_time(FROZEN_TIME)
+    def test_send_digest(self):
+        reminders = [self.create_due(0), self.create_due(0)]
+        send_digest(reminders)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(
+            mail.outbox[0].subject, '2 new reminders from remindmelatr.com'
+        )
+        for r in reminders:
+            self.assertIn(r.content, mail.outbox[0].body)
+            self.assertIn(
+                reverse('snooze_external',
+                        kwargs={'hash_digest': r.hash_digest}),
+                mail.outbox[0].body
+            )
+            r = Reminder.objects.get(pk=r.pk)
+            self.assertEqual(r.status, 4)
+            self.assertEqual(r.total_reminders, 1)
+            self.assertEqual(
+                r.history()[1].description, 'Reminder sent in a digest.'
+            )
+
+    @freeze_time(FROZEN_TIME)
+    def test_failed_digest_retries_each(self):
+        reminders = [self.create_due(0), self.create_due(0)]
+        with patch('reminders.models.EmailMultiAlternatives.send',
+                   side_effect=Exception('Throttling')):
+            send_digest(reminders)
+        for r in reminders:
+            r = Reminder.objects.get(pk=r.pk)
+            self.assertFalse(r.in_progress)
+            self.assertEqual(r.delivery_attempts, 1)
+
+
+class NotifyingBrokerTest(TestCase):
+    """
+    Test the broker transport waits for notifications instead of polling
+    """
+
+    def setUp(self):
+        from kombu import Connection
+        self.connection = Connection(
+            'django://', transport='reminders.broker:Transport'
+        )
+        self.queue = self.connection.SimpleQueue('test')
+
+    def tearDown(self):
+        self.queue.close()
+        self.connection.close()
+
+    def test_round_trip(self):
+        self.queue.put({'hello': 'world'})
+        message = self.queue.get(timeout=1)
+        self.assertEqual(message.payload, {'hello': 'world'})
+        message.ack()
+
+    def test_put_notifies(self):
+        with patch('reminders.broker.LocalWaiter.notify') as notify:
+            self.queue.put({'hello': 'world'})
+        notify.assert_called_once_with('test')
+
+    def test_waits_instead_of_polling(self):
+        with patch('reminders.broker.LocalWaiter.wait') as wait:
+            with self.assertRaises(self.queue.Empty):
+                self.queue.get(timeout=0.2)
+        self.assertTrue(wait.called)
+        # Every wait is for the rest of the timeout, never a short poll
+        for call in wait.call_args_list:
+            self.assertLessEqual(call[0][0], 0.2)
+            self.assertGreater(call[0][0], 0)
+
+    def test_notification_wakes_waiter(self):
+        waiter = broker.LocalWaiter()
+        threading.Timer(0.05, broker.LocalWaiter.notify).start()
+        start = time.time()
+        waiter.wait(5)
+        self.assertLess(time.time() - start, 1)
+
+    def test_notification_before_wait(self):
+        # Published after the worker found the queue empty but before it
+        # started waiting
+        waiter = broker.LocalWaiter()
+        waiter.prepare()
+        broker.LocalWaiter.notify()
+        start = time.time()
+        waiter.wait(5)
+        self.assertLess(time.time() - start, 1)
+
+
+class ConcurrentSenderTest(BaseTest):
+    """
+    Test the threaded sender claims, sends and records reminders
+    """
+
+    def setUp(self):
+        super(ConcurrentSenderTest, self).setUp()
+        cache.clear()
+        self.sender = ConcurrentSender(concurrency=5, batch_size=10)
+
+    def tearDown(self):
+        self.sender.close()
+
+    def create_due(self, minute=0, hour=7):
+        return self.create_reminder(
+            self.today, datetime(2014, 1, 5, hour, minute).time()
+        )
+
+    @freeze_time(FROZEN_TIME)
+    def test_sends_due_reminders(self):
+        due = [self.create_due(minute) for minute in (0, 10, 20)]
+        later = self.create_due(hour=9)
+        self.assertEqual(self.sender.run_once(), 3)
+        self.assertEqual(len(mail.outbox), 3)
+        for r in due:
+            r = Reminder.objects.get(pk=r.pk)
+            self.assertEqual(r.status, 4)
+            self.assertEqual(r.total_reminders, 1)
+            self.assertFalse(r.in_progress)
+        self.assertEqual(Reminder.objects.get(pk=later.pk).status, 2)
+        self.assertEqual(self.sender.run_once(), 0)
+
+    @freeze_time(FROZEN_TIME)
+    def test_failed_sends_retried(self):
+        r = self.create_due()
+        with patch('django.core.mail.backends.locmem.EmailBackend'
+                   '.send_messages', side_effect=Exception('Throttling')):
+            self.assertEqual(self.sender.run_once(), 1)
+        r = Reminder.objects.get(pk=r.pk)
+        self.assertFalse(r.in_progress)
+        self.assertEqual(r.delivery_attempts, 1)
+        self.assertIsNotNone(r.next_attempt)
+
+    @freeze_time(FROZEN_TIME)
+    @override_settings(REMINDER_DIGEST_WINDOW=60)
+    def test_sends_digests(self):
+        self.create_due()
+        self.create_due()
+        self.assertEqual(self.sender.run_once(), 2)
+        self.assertEqual(len(mail.outbox), 1)
+
+    @freeze_time(FROZEN_TIME)
+    @override_settings(REMINDER_SEND_RATE=2)
+    def test_respects_send_rate(self):
+        for minute in (0, 10, 20):
+            self.create_due(minute)
+        self.assertEqual(self.sender.run_once(), 2)
+        self.assertEqual(governor.backlog(), 1)
+
+    def test_sends_concurrently(self):
+        with freeze_time(FROZEN_TIME):
+            for minute in range(5):
+                self.create_due(minute)
+
+        def slow_send(backend, messages):
+            time.sleep(0.2)
+            return len(messages)
+
+        with patch('django.core.mail.backends.locmem.EmailBackend'
+                   '.send_messages', slow_send):
+            start = time.time()
+            self.assertEqual(self.sender.run_once(), 5)
+        self.assertLess(time.time() - start, 0.6)
+
+
+class CalendarFeedTest(BaseTest):
+    """
+    Test the cached per user calendar feed
+    """
+
+    @freeze_time(FROZEN_TIME)
+    def setUp(self):
+        super(CalendarFeedTest, self).setUp()
+        cache.clear()
+        self.reminder = self.create_reminder(self.tomorrow, self.now.time())
+        self.create_reminder(self.tomorrow, self.now.time(), status=1)
+        self.url = reverse(
+            'calendar_feed', args=(self.user.calendar_token,)
+        )
+        self.user_logout()
+
+    def reminder_queries(self, **headers):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, **headers)
+        return response, [
+            q for q in queries if 'remindmelatr_reminder' in q['sql']
+        ]
+
+    def test_feed(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response['Content-Type'], 'text/calendar; charset=utf-8'
+        )
+        self.assertIn('ETag', response)
+        self.assertIn('Last-Modified', response)
+        self.assertEqual(response.content.count('BEGIN:VEVENT'), 1)
+        self.assertIn('UID:reminder-%d@' % self.reminder.id, response.content)
+
+    def test_unknown_token(self):
+        response = self.client.get(reverse('calendar_feed', args=('nope',)))
+        self.assertEqual(response.status_code, 404)
+
+    def test_cached(self):
+        response, queries = self.reminder_queries()
+        self.assertNotEqual(queries, [])
+        cached, queries = self.reminder_queries()
+        self.assertEqual(queries, [])
+        self.assertEqual(cached.content, response.content)
+
+    def test_cached_in_chunks(self):
+        with patch.object(feed, 'CHUNK_SIZE', 100):
+            response, queries = self.reminder_queries()
+            self.assertGreater(cache.get(feed.FEED_KEY % (
+                self.user.id, feed.version(self.user.id)
+            )), 1)
+            cached, queries = self.reminder_queries()
+        self.assertEqual(queries, [])
+        self.assertEqual(cached.content, response.content)
+
+    @freeze_time(FROZEN_TIME)
+    def test_old_overdue_left_out(self):
+        recent = self.create_reminder(self.today, self.now.time())
+        recent.overdue()
+        old = self.create_reminder(
+            (self.now - timedelta(days=31)).date(), self.now.time()
+        )
+        old.overdue()
+        content = self.client.get(self.url).content
+        self.assertIn('UID:reminder-%d@' % recent.id, content)
+        self.assertNotIn('UID:reminder-%d@' % old.id, content)
+
+    def test_not_modified(self):
+        response = self.client.get(self.url)
+        with CaptureQueriesContext(connection) as queries:
+            not_modified = self.client.get(
+                self.url, HTTP_IF_NONE_MATCH=response['ETag']
+            )
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(len(queries), 0)
+        not_modified = self.client.get(
+            self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+        )
+        self.assertEqual(not_modified.status_code, 304)
+
+    @freeze_time(FROZEN_TIME)
+    def test_change_invalidates(self):
+        response = self.client.get(self.url)
+        self.create_reminder(self.tomorrow, self.now.time())
+        changed = self.client.get(
+            self.url, HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], response['ETag'])
+        self.assertEqual(changed.content.count('BEGIN:VEVENT'), 2)
+        self.reminder.delete()
+        self.assertEqual(
+            self.client.get(self.url).content.count('BEGIN:VEVENT'), 1
+        )
+
+    @freeze_time(FROZEN_TIME)
+    def test_version_moves_forwards(self):
+        version = feed.version(self.user.id)
+        feed.changed(self.user.id)
+        feed.changed(self.user.id)
+        self.assertEqual(feed.version(self.user.id), version + 2)
+
+    @freeze_time(FROZEN_TIME)
+    def test_version_without_cache(self):
+        dummy = DummyCache('dummy', {})
+        with patch.object(feed, 'cache', dummy):
+            self.assertEqual(
+                feed.version(self.user.id), int(time.time() * 1000)
+            )
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+
+
+class ICalendarTest(BaseTest):
+    """
+    Test reminders are written out as iCalendar events
+    """
+
+    def test_escape(self):
+        self.assertEqual(
+            ical.escape('a,b;c\\d\ne'), 'a\\,b\\;c\\\\d\\ne'
+        )
+
+    def test_fold(self):
+        self.assertEqual(ical.fold('SUMMARY:short'), 'SUMMARY:short\r\n')
+        folded = ical.fold(u'SUMMARY:' + u'\xe9' * 100)
+        lines = folded.split('\r\n')
+        self.assertTrue(all(len(line) <= 75 for line in lines))
+        self.assertTrue(all(line.startswith(' ') for line in lines[1:-1]))
+        # Unfolding gives back the whole line, no character split
+        self.assertEqual(
+            folded.replace('\r\n ', '').decode('utf-8'),
+            u'SUMMARY:' + u'\xe9' * 100 + u'\r\n'
+        )
+
+    @freeze_time(FROZEN_TIME)
+    def test_rrule(self):
+        reminder = self.create_reminder(self.tomorrow, self.now.time())
+        self.assertIsNone(ical.rrule(reminder))
+        reminder.interval_type = 3
+        reminder.interval_value = 2
+        self.assertEqual(ical.rrule(reminder), 'FREQ=DAILY;INTERVAL=2')
+        reminder.max_recurrances = 5
+        self.assertEqual(
+            ical.rrule(reminder), 'FREQ=DAILY;INTERVAL=2;COUNT=5'
+        )
+        reminder.total_reminders = 3
+        self.assertEqual(
+            ical.rrule(reminder), 'FREQ=DAILY;INTERVAL=2;COUNT=2'
+        )
+        reminder.total_reminders = 5
+        self.assertIsNone(ical.rrule(reminder))
+        reminder.total_reminders = 0
+        reminder.max_recurrances = 0
+        reminder.scheduled_end_date = pytz.utc.localize(
+            datetime(2014, 2, 1, 9, 30)
+        )
+        self.assertEqual(
+            ical.rrule(reminder),
+            'FREQ=DAILY;INTERVAL=2;UNTIL=20140201T093000Z'
+        )
+
+    @freeze_time(FROZEN_TIME)
+    def test_recurring_start_in_local_time(self):
+        # Weekly at 09:00 London, across the clocks going forward
+        reminder = self.create_reminder(
+            datetime(2014, 3, 24).date(), datetime(2014, 3, 24, 9).time()
+        )
+        self.assertIn(
+            'DTSTART:20140324T090000Z', ical.event(reminder, 'example.com')
+        )
+        reminder.interval_type = 3
+        reminder.interval_value = 7
+        reminder.save()
+        lines = ical.event(reminder, 'example.com')
+        self.assertIn('DTSTART;TZID=Europe/London:20140324T090000', lines)
+        self.assertIn('RRULE:FREQ=DAILY;INTERVAL=7', lines)
+        # The server fires the next one at 09:00 London too
+        anchor = reminder.full_start_datetime
+        self.assertEqual(
+            reminder.occurrence_time(anchor, 1),
+            pytz.utc.localize(datetime(2014, 3, 31, 8, 0))
+        )
+        self.user.timezone = None
+        self.user.save()
+        reminder = Reminder.objects.get(pk=reminder.pk)
+        self.assertIn(
+            'DTSTART:20140324T090000Z', ical.event(reminder, 'example.com')
+        )
+
+    def test_rrule_after_send(self):
+        with freeze_time(FROZEN_TIME):
+            reminder = self.create_reminder(
+                self.today, datetime(2014, 1, 5, 7, 43).time()
+            )
+            reminder.interval_type = 3
+            reminder.interval_value = 1
+            reminder.max_recurrances = 3
+            reminder.save()
+            reminder.remind()
+        reminder = Reminder.objects.get(pk=reminder.pk)
+        # Two of the three occurrences are left, starting tomorrow
+        self.assertEqual(reminder.start_date, self.tomorrow)
+        self.assertEqual(
+            ical.rrule(reminder), 'FREQ=DAILY;INTERVAL=1;COUNT=2'
+        )
+
+    @freeze_time(FROZEN_TIME)
+    def test_calendar(self):
+        reminder = self.create_reminder(self.tomorrow, self.now.time())
+        content = ''.join(ical.calendar([reminder], 'example.com'))
+        self.assertTrue(content.startswith('BEGIN:VCALENDAR\r\n'))
+        self.assertIn(
+            'UID:reminder-%d@example.com\r\n' % reminder.id, content
+        )
+        self.assertTrue(content.endswith('END:VEVENT\r\nEND:VCALENDAR\r\n'))
+
+
 class ReminderMultiDeleteTest(BaseTest):
     """
     Test deleting 1 or more reminders
@@ -56,6 +56,11 @@ urlpatterns = patterns(
     ),
 
     # External (non logged in) views
+    url(
+        r'^calendar/(?P<token>\w+)\.ics$',
+        'calendar_feed',
+        name='calendar_feed'
+    ),
     url(
         r'^reminder/(?P<hash_digest>.+?)/snooze/$',
         'snooze_external',
@@ -3,17 +3,21 @@ import json
 from random import randint
 import logging
 
-from django.http import HttpResponse, HttpResponseRedirect
+from django.http import Http404, HttpResponse, HttpResponseRedirect
 from django.shortcuts import render_to_response, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.template import RequestContext
 from django.core.urlresolvers import reverse
 from django.contrib import messages
 from django.conf import settings
+from django.views.decorators.http import condition
 
-from .models import Reminder, RemindOn, RemindAt
+from . import feed
+from .models import Reminder, RemindOn, RemindAt, prime_human_readable
 from .forms import BasicReminderForm, ExternalSnoozeForm, QuickReminderForm
-from utils.helpers import get_paginator, get_multiple_reminders
+from utils.helpers import (
+    get_paginator, get_multiple_reminders, encode_cursor, decode_cursor
+)
 
 logger = logging.getLogger(__name__)
 
@@ -61,11 +65,15 @@ def reminder(request, reminder_id):
         id=reminder_id, deleted=False
     )
 
-    history = get_paginator(rem.history(), request.GET.get('page', 1), 10)
+    before = decode_cursor(request.GET.get('before'))
+    history, cursor = rem.history_page(before=before)
+    rem.fill_history(history)
 
     return render_to_response('reminder.html', {
         'reminder': rem,
         'history': history,
+        'older_history': encode_cursor(cursor),
+        'newer_history': before is not None,
     }, context_instance=RequestContext(request))
 
 
@@ -114,20 +122,16 @@ def edit(request, reminder_id):
             reminder = form.save()
             messages.success(request, reminder.edited_message())
 
+            if reminder.content != orig_content:
+                reminder.add_history_entry('Reminder content updated')
+
             new_start = reminder.localised_start()
             if new_start != orig_start:
+                reminder.reset_recurrence()
                 reminder.add_history_entry('Reminder set for {}.'.format(
                     new_start.strftime('%H:%M on %d/%m/%y')
                 ))
 
-            if reminder.content != orig_content:
-                extra = 'Content was:\n%s\n\nAfter update:\n{}'.format(
-                    orig_content, reminder.content
-                )
-                reminder.add_history_entry(
-                    'Reminder content updated', extra=extra
-                )
-
             return HttpResponseRedirect(
                 request.POST.get('next', reverse('reminders'))
             )
@@ -163,6 +167,7 @@ def upcoming(request):
         Reminder.objects.outstanding(user=request.user),
         request.GET.get('page', 1)
     )
+    prime_human_readable(reminders.object_list, request.user)
     return render_to_response('reminders/upcoming.html', {
         'reminders': reminders,
     }, context_instance=RequestContext(request))
@@ -407,3 +412,30 @@ def at_options(request):
     q = request.GET.get('query', '')
     values = [r.name for r in RemindAt.objects.filter(name__icontains=q)]
     return HttpResponse(json.dumps(values), 'application/json; charset=utf8')
+
+
+def _feed_etag(request, token):
+    pk = feed.user_id(token)
+    if pk is not None:
+        return feed.etag(feed.version(pk))
+
+
+def _feed_last_modified(request, token):
+    pk = feed.user_id(token)
+    if pk is not None:
+        return feed.last_modified(feed.version(pk))
+
+
+@condition(etag_func=_feed_etag, last_modified_func=_feed_last_modified)
+def calendar_feed(request, token):
+    """
+    The user's reminders as an iCalendar feed for calendar apps to
+    subscribe to
+    """
+    pk = feed.user_id(token)
+    if pk is None:
+        raise Http404
+    return HttpResponse(
+        feed.render(pk, feed.version(pk)),
+        content_type='text/calendar; charset=utf-8'
+    )
@@ -0,0 +1,92 @@
+"""
+A hierarchical timing wheel.
+
+Keys are scheduled against unix timestamps with one second resolution.
+The first level holds the next minute in one second slots, each further
+level covers a whole turn of the level below it. Keys further away than
+the wheel covers are refused and have to be scheduled again later.
+"""
+import calendar
+
+
+def timestamp(dt):
+    """
+    Seconds since the epoch for an aware datetime
+    """
+    return calendar.timegm(dt.utctimetuple()) + dt.microsecond / 1e6
+
+
+class TimingWheel(object):
+
+    def __init__(self, now, sizes=(60, 60)):
+        self.sizes = sizes
+        self.levels = [[set() for i in range(size)] for size in sizes]
+        self.spans = []
+        span = 1
+        for size in sizes:
+            self.spans.append(span)
+            span *= size
+        self.horizon = span
+        # The next second to be processed by advance
+        self.current = int(now)
+        self.entries = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def schedule(self, key, when):
+        """
+        Schedule `key` to fire at timestamp `when`, replacing any earlier
+        schedule for it. Returns False if `when` is beyond the horizon.
+        """
+        when = max(int(when), self.current)
+        if when - self.current >= self.horizon:
+            self.cancel(key)
+            return False
+        self.entries[key] = when
+        self._place(key, when)
+        return True
+
+    def cancel(self, key):
+        # Slots are cleaned up lazily as the wheel turns
+        self.entries.pop(key, None)
+
+    def _place(self, key, when):
+        delay = when - self.current
+        for level, size in enumerate(self.sizes):
+            span = self.spans[level]
+            if delay < span * size:
+                self.levels[level][(when // span) % size].add(key)
+                return
+
+    def advance(self, now):
+        """
+        Turn the wheel up to timestamp `now` returning the keys now due
+        """
+        due = []
+        while self.current <= int(now):
+            # Move the keys of any higher level slot starting at this second
+            # down the wheel, highest level first
+            for level in range(len(self.sizes) - 1, 0, -1):
+                span = self.spans[level]
+                if self.current % span == 0:
+                    slot = self.levels[level][
+                        (self.current // span) % self.sizes[level]
+                    ]
+                    keys = list(slot)
+                    slot.clear()
+                    for key in keys:
+                        if key in self.entries:
+                            self._place(key, self.entries[key])
+
+            slot = self.levels[0][self.current % self.sizes[0]]
+            for key in slot:
+                if self.entries.get(key) == self.current:
+                    del self.entries[key]
+                    due.append(key)
+            slot.clear()
+            self.current += 1
+        return due
@@ -1,3 +1,7 @@
+from datetime import datetime
+
+import pytz
+
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.shortcuts import get_object_or_404
 
@@ -13,6 +17,29 @@ def get_paginator(reminders, page, limit=20):
         return paginator.page(paginator.num_pages)
 
 
+def encode_cursor(cursor):
+    """
+    Turn a (created, id) keyset cursor into a url safe string
+    """
+    if cursor is None:
+        return None
+    created, pk = cursor
+    created = created.astimezone(pytz.timezone('UTC'))
+    return '%s-%s' % (created.strftime('%Y%m%d%H%M%S%f'), pk)
+
+
+def decode_cursor(value):
+    """
+    Reverse encode_cursor, invalid cursors are treated as no cursor
+    """
+    try:
+        created, pk = value.split('-')
+        created = datetime.strptime(created, '%Y%m%d%H%M%S%f')
+        return created.replace(tzinfo=pytz.timezone('UTC')), int(pk)
+    except (AttributeError, ValueError):
+        return None
+
+
 def get_multiple_reminders(ids, user):
     reminders = []
     for rid in ids:
@@ -0,0 +1,35 @@
+from datetime import datetime
+
+import pytz
+
+from utils.date_parser import match_date
+from utils.time_parser import match_time
+
+
+def parse_reminder(term, usertz):
+    """
+    Work out when a quick add reminder such as 'call mum at 6pm tomorrow'
+    is for in the user's timezone
+
+    Returns the start as a UTC datetime and the content with the date and
+    time removed. Raises ValueError with a message for the user if there is
+    no time or the reminder would be in the past.
+    """
+    time_match = match_time(term)
+    if time_match is None:
+        raise ValueError('Please enter a reminder time')
+    remind_at, content = time_match
+
+    # Try to find a reminder date (fall back to today if none found)
+    date_match = match_date(content)
+    if date_match is None:
+        date_match = [datetime.now(usertz).date(), content]
+    remind_on, content = date_match[0], date_match[1]
+
+    ra = remind_at.split(':')
+    dt = usertz.localize(datetime(
+        remind_on.year, remind_on.month, remind_on.day, int(ra[0]), int(ra[1])
+    ))
+    if dt <= datetime.now(usertz):
+        raise ValueError('Please pick a date in the future')
+    return dt.astimezone(pytz.timezone('UTC')), content
@@ -98,6 +98,8 @@ FILE_UPLOAD_PERMISSIONS = 0664
 WSGI_APPLICATION = 'base.wsgi.application'
 
 MIDDLEWARE_CLASSES = [
+    # First so it compresses what all the others have returned
+    'api.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.locale.LocaleMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -205,10 +207,10 @@ PASSWORD_HASHERS = (
 
 AUTHENTICATION_BACKENDS = (
     # Needed to login by username in Django admin, regardless of `allauth`
-    "django.contrib.auth.backends.ModelBackend",
+    "accounts.backends.CachedModelBackend",
 
     # `allauth` specific authentication methods, such as login by e-mail
-    "allauth.account.auth_backends.AuthenticationBackend",
+    "accounts.backends.CachedAuthenticationBackend",
 )
 
 # Sessions
@@ -216,6 +218,9 @@ AUTHENTICATION_BACKENDS = (
 # By default, be at least somewhat secure with our session cookies.
 SESSION_COOKIE_HTTPONLY = True
 
+# Read sessions from the cache, writing through to the database
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
 # A sample logging configuration. The only tangible logging
 # performed by this configuration is to send an email to
 # the site admins on every HTTP 500 error.
@@ -311,6 +316,96 @@ DEMO_REMINDERS = (
     'Have something to eat lunchtime today',
 )
 
+# Reminder history older than this is moved to the archive table
+REMINDER_HISTORY_ARCHIVE_DAYS = 90
+
+# How reminder history entries are written
+#   'sync' - saved as part of the request (default)
+#   'buffer' - held in memory and bulk inserted after the response is sent
+#   'celery' - queued for the reminders.tasks.write_history task when the
+#              transaction commits, entries are written at least once
+REMINDER_HISTORY_WRITE_MODE = env.str('REMINDER_HISTORY_WRITE_MODE', 'sync')
+REMINDER_HISTORY_BATCH_SIZE = 100
+
+# Number of occurrences of a recurring reminder to precompute at a time
+REMINDER_OCCURRENCE_BATCH = 10
+
+# What finds due reminders
+#   'beat' - the reminders.tasks.scheduler celery beat task, every 10 seconds
+#   'daemon' - the run_scheduler daemon, the beat task is left out of
+#              CELERYBEAT_SCHEDULE so the database isn't polled as well
+REMINDER_SCHEDULER = env.str('REMINDER_SCHEDULER', 'beat')
+
+# The run_scheduler daemon. Changes to reminders are sent on the channel
+# (Postgres only), due times are loaded for the next hour in slices of
+# REFILL seconds and the whole window is reloaded every RESYNC seconds.
+REMINDER_SCHEDULER_CHANNEL = 'reminders_changed'
+# Only send changes when a run_scheduler daemon is there to hear them
+REMINDER_SCHEDULER_NOTIFY = env.bool(
+    'REMINDER_SCHEDULER_NOTIFY', REMINDER_SCHEDULER == 'daemon'
+)
+REMINDER_SCHEDULER_REFILL = 60
+REMINDER_SCHEDULER_RESYNC = 15 * 60
+
+# Reminders are split between scheduler nodes by user_id % SHARDS. Nodes
+# hold leases on their shards for LEASE seconds, renewing them every third
+# of that, so a dead node's shards move to the others within LEASE seconds.
+REMINDER_SCHEDULER_SHARDS = 16
+REMINDER_SCHEDULER_LEASE = 30
+
+# Reminder emails sent per second across all workers, the SES send quota.
+# Counted in the shared cache, see CACHES. Set to None for no limit.
+REMINDER_SEND_RATE = env.int('REMINDER_SEND_RATE', 14)
+
+# Failed sends are retried after BACKOFF seconds, doubling each time up to
+# MAX_BACKOFF, and dead lettered after MAX_ATTEMPTS. Reminders claimed for
+# longer than LEASE seconds are assumed lost and retried.
+REMINDER_DELIVERY_MAX_ATTEMPTS = 5
+REMINDER_DELIVERY_BACKOFF = 60
+REMINDER_DELIVERY_MAX_BACKOFF = 60 * 60
+REMINDER_DELIVERY_LEASE = 5 * 60
+
+# Send a user's reminders due in the same window of this many seconds as
+# one digest email. 0 sends every reminder on its own.
+REMINDER_DIGEST_WINDOW = env.int('REMINDER_DIGEST_WINDOW', 0)
+
+# The run_sender command claims this many reminders at a time and sends
+# them from this many threads
+REMINDER_SENDER_CONCURRENCY = 100
+REMINDER_SENDER_BATCH = 500
+
+# NOTIFY channel used by reminders.broker:Transport to wake idle workers
+BROKER_NOTIFY_CHANNEL = 'kombu_messages'
+
+# Where delivery and scheduler metrics go, see reminders.metrics. None
+# drops them.
+REMINDER_METRICS_SINK = env.str('REMINDER_METRICS_SINK', None)
+REMINDER_STATSD_HOST = env.str('REMINDER_STATSD_HOST', '127.0.0.1')
+REMINDER_STATSD_PORT = env.int('REMINDER_STATSD_PORT', 8125)
+REMINDER_STATSD_PREFIX = 'remindmelatr'
+
+# Reminder exports read this many reminders from the database at a time
+REMINDER_EXPORT_CHUNK_SIZE = 500
+
+# Reminder imports are parsed and written this many lines at a time
+REMINDER_IMPORT_BATCH_SIZE = 500
+
+# How long rendered calendar feeds are cached for, they are rendered again
+# sooner if the user's reminders change
+REMINDER_FEED_CACHE_TIMEOUT = 24 * 60 * 60
+# Overdue reminders older than this are left out of calendar feeds
+REMINDER_FEED_OVERDUE_DAYS = 30
+
+# The cache must be shared by every web, worker and scheduler process.
+# Invalidating cached auth tokens and users only works if all processes
+# see the delete.
+CACHES = {
+    'default': env.cache('CACHE_URL', 'memcache://127.0.0.1:11211'),
+}
+
+# How long looked up auth tokens and users are cached for
+USER_CACHE_TIMEOUT = 5 * 60
+
 # Rest Framework Config
 REST_FRAMEWORK = {
     # Use hyperlinked styles by default.
@@ -325,12 +420,32 @@ REST_FRAMEWORK = {
     ),
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ),
     'DEFAULT_PARSER_CLASSES': (
         'rest_framework.parsers.JSONParser',
         'rest_framework.parsers.FormParser',
         'rest_framework.parsers.MultiPartParser',
     ),
+    # Writes are limited everywhere, views clients poll also limit reads.
+    # Requests are counted in the shared cache, see CACHES and api.throttling
+    'DEFAULT_THROTTLE_CLASSES': (
+        'api.throttling.WriteRateThrottle',
+    ),
+    'DEFAULT_THROTTLE_RATES': {
+        'poll': '60/min',
+        'write': '60/min',
+    },
+    # FastJSONRenderer uses ujson when it is installed
+    'DEFAULT_RENDERER_CLASSES': (
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
     'PAGINATE_BY': 10
 }
+
+# API responses of at least MIN_SIZE bytes are gzipped, or compressed with
+# brotli when it is installed and the client accepts it
+API_COMPRESS_PREFIX = '/api/'
+API_COMPRESS_MIN_SIZE = 1024
+API_COMPRESS_BROTLI_QUALITY = 5
@@ -15,11 +15,9 @@ INSTALLED_APPS = INSTALLED_APPS + ('django_nose',)
 
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
-}
+# Local to each process, so REMINDER_SEND_RATE and the API throttles count
+# per process here. Set CACHE_URL to share them between processes.
+CACHES = {'default': env.cache('CACHE_URL', 'locmemcache://')}
 
 # Is this a development instance? Set this to True on development/master
 # instances and False on stage/prod.
@@ -27,15 +25,27 @@ DEV = True
 
 # Uncomment these to activate and customize Celery:
 BROKER_URL = 'django://'
+if 'postgresql' in DATABASES['default']['ENGINE']:
+    # Workers wait for a notification rather than polling the database
+    BROKER_TRANSPORT = 'reminders.broker:Transport'
 CELERY_RESULT_BACKEND='djcelery.backends.database:DatabaseBackend'
 CELERY_TIMEZONE = 'Europe/London'
 
 CELERYBEAT_SCHEDULE = {
-    'add-every-10-seconds': {
-        'task': 'reminders.tasks.scheduler',
-        'schedule': timedelta(seconds=10),
+    'archive-history-daily': {
+        'task': 'reminders.tasks.archive_history',
+        'schedule': timedelta(days=1),
+    },
+    'reclaim-reminders-every-minute': {
+        'task': 'reminders.tasks.reclaim_reminders',
+        'schedule': timedelta(minutes=1),
     },
 }
+if REMINDER_SCHEDULER == 'beat':
+    CELERYBEAT_SCHEDULE['add-every-10-seconds'] = {
+        'task': 'reminders.tasks.scheduler',
+        'schedule': timedelta(seconds=10),
+    }
 
 ## Log settings
 LOGGING = {
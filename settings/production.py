@@ -11,8 +11,17 @@ SESSION_COOKIE_SECURE = True
 CSRF_COOKIE_SECURE = True
 
 CELERYBEAT_SCHEDULE = {
-    'add-every-10-seconds': {
-        'task': 'reminders.tasks.scheduler',
-        'schedule': timedelta(seconds=10),
+    'archive-history-daily': {
+        'task': 'reminders.tasks.archive_history',
+        'schedule': timedelta(days=1),
+    },
+    'reclaim-reminders-every-minute': {
+        'task': 'reminders.tasks.reclaim_reminders',
+        'schedule': timedelta(minutes=1),
     },
 }
+if REMINDER_SCHEDULER == 'beat':
+    CELERYBEAT_SCHEDULE['add-every-10-seconds'] = {
+        'task': 'reminders.tasks.scheduler',
+        'schedule': timedelta(seconds=10),
+    }
@@ -29,6 +29,26 @@ DATABASES = {
     },
 }
 
+# Tests run in one process, a local cache is shared enough
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+SILENCED_SYSTEM_CHECKS = ['accounts.E001']
+
+# Write history entries as part of the request
+REMINDER_HISTORY_WRITE_MODE = 'sync'
+
+# Tests run the scheduler daemon in process
+REMINDER_SCHEDULER_NOTIFY = True
+
+# No send rate limit unless a test asks for one
+REMINDER_SEND_RATE = None
+
+# No API rate limits unless a test asks for them
+REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'] = {'poll': None, 'write': None}
+
 # Speeds up tests significantly
 PASSWORD_HASHERS = (
     'django.contrib.auth.hashers.MD5PasswordHasher',